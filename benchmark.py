@@ -0,0 +1,264 @@
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from driver_pool import DriverPool
+from fake_driver import FakeDriver
+from gpt_client import GPTClient
+from llm_cache import LLMResponseCache
+from llm_client import AsyncLLMClient
+from llm_stub_server import LLMStubServer, ReplayAnswerProvider
+from profiler import PROFILER, read_jsonl
+from test_executor import TestExecutor
+from test_migrator import TestMigrator
+from transcript import TranscriptWriter
+from ui_wait import UIIdleWaiter
+from util import load_config
+
+
+class BenchmarkGPTClient(GPTClient):
+    LLM_CACHE_MODE = LLMResponseCache.DISABLED
+    # the recorded assets are left untouched
+    WIDGET_LIST_CACHE_MODE = 'memory'
+
+
+@contextmanager
+def zero_sleep():
+    # the fixed sleeps of the actions are skipped, the fake screens do not need to settle
+    sleep = time.sleep
+    time.sleep = lambda seconds: None
+    try:
+        yield
+    finally:
+        time.sleep = sleep
+
+
+def get_transcript_path_list(folder_path: Path, prefix=''):
+    return [path for path in [folder_path / f'{prefix}messages.jsonl', folder_path / f'{prefix}messages.json',
+                              folder_path / f'{prefix}messages_list.json'] if path.exists()]
+
+
+def get_span_total_dict(span_list):
+    span_total_dict = {}
+    for span in span_list:
+        span_total_dict[span['name']] = span_total_dict.get(span['name'], 0.0) + span['duration']
+    return span_total_dict
+
+
+# Runs the trace, intention, migration and oracle stages end to end on the recorded assets, with FakeDriver replaying
+# the recorded screens and a local stub replaying the recorded LLM answers, and reports the throughput of every stage
+class Benchmark:
+    STAGE_LIST = ['trace', 'intention', 'migration', 'oracle']
+
+    def __init__(self, asset_path: Path, output_path: Path):
+        self.trace_path = asset_path / 'Trace'
+        self.gpt_trace_path = asset_path / 'GPT_Trace'
+        self.gpt_guidance_path = asset_path / 'GPT_Guidance'
+        self.intention_path = asset_path / 'Intention'
+        self.oracle_path = asset_path / 'Oracle'
+        self.output_path = output_path
+        self.env_config = load_config('config/env.yaml')['Appium']
+        self.app_config_dict = load_config('config/app.yaml')
+        self.test_executor = TestExecutor()
+        self.test_executor.TRACE_PATH = str(output_path / 'Trace')
+        self.test_executor.ui_idle_waiter = UIIdleWaiter(quiet_period=0, poll_interval=0)
+        # the answers are replaced for every task
+        self.stub_server = LLMStubServer(None)
+
+    def create_driver_pool(self, trace_folder_path):
+        return DriverPool(lambda appium_server_url, desired_caps: FakeDriver(trace_folder_path,
+                                                                             desired_caps['appPackage'],
+                                                                             dict(desired_caps)))
+
+    def create_gpt_client(self):
+        gpt_client = BenchmarkGPTClient()
+        gpt_client.llm_client = AsyncLLMClient(gpt_client.API_KEY, self.stub_server.api_base,
+                                               gpt_client.LLM_MAX_CONCURRENCY, gpt_client.LLM_TIMEOUT)
+        gpt_client.ui_idle_waiter = UIIdleWaiter(quiet_period=0, poll_interval=0)
+        return gpt_client
+
+    def get_migration_task_list(self):
+        # (app tag, functionality tag, target app tag) of the recorded GPT traces
+        migration_task_list = []
+        if not self.gpt_trace_path.exists():
+            return migration_task_list
+        for folder_path in sorted(self.gpt_trace_path.iterdir()):
+            tag_list = folder_path.name.split('_')
+            if folder_path.is_dir() and len(tag_list) == 3:
+                migration_task_list.append(tuple(tag_list))
+        return migration_task_list
+
+    def run_trace_task(self, app_tag, func_tag):
+        # returns (action count, span list, number of questions without a recorded answer)
+        if not self.test_executor.test_case_catalog.has_test_case(app_tag, func_tag):
+            return None
+        self.test_executor.driver_pool = self.create_driver_pool(self.trace_path / app_tag / func_tag)
+        self.test_executor.execute_test_case(app_tag, func_tag)
+        output_folder_path = self.output_path / 'Trace' / app_tag / func_tag
+        with open(output_folder_path / 'action_trace.json', mode='r', encoding='utf-8') as f:
+            action_count = len(json.load(f))
+        return action_count, read_jsonl(output_folder_path / 'profile.jsonl'), 0
+
+    def run_intention_task(self, app_tag, func_tag):
+        if not (self.trace_path / app_tag / func_tag / 'action_trace.json').exists():
+            return None
+        # the runs before the intention transcripts have no recorded answers, the default answer is used
+        answer_provider = ReplayAnswerProvider(
+            get_transcript_path_list(self.intention_path / func_tag, f'{app_tag}_'), '<Intent: replayed>')
+        self.stub_server.answer_provider = answer_provider
+        test_migrator = TestMigrator(self.create_gpt_client())
+        test_migrator.TRACE_PATH = str(self.trace_path)
+        test_migrator.INTENTION_PATH = str(self.output_path / 'Intention')
+        test_migrator.generate_test_intentions(app_tag, func_tag)
+        output_folder_path = self.output_path / 'Intention' / func_tag
+        with open(output_folder_path / f'{app_tag}.txt', mode='r', encoding='utf-8') as f:
+            intention_count = len(f.readlines())
+        span_list = read_jsonl(output_folder_path / f'{app_tag}_profile.jsonl')
+        return intention_count, span_list, answer_provider.miss_count
+
+    def run_migration_task(self, app_tag, func_tag, target_app_tag):
+        task_name = f'{app_tag}_{func_tag}_{target_app_tag}'
+        intention_txt_path = self.intention_path / func_tag / f'{app_tag}.txt'
+        recorded_trace_folder_path = self.gpt_trace_path / task_name
+        if not intention_txt_path.exists():
+            return None
+        with open(intention_txt_path, mode='r', encoding='utf-8') as f:
+            intention_list = [x.strip() for x in f.readlines()]
+        answer_provider = ReplayAnswerProvider(get_transcript_path_list(recorded_trace_folder_path))
+        self.stub_server.answer_provider = answer_provider
+        gpt_client = self.create_gpt_client()
+        gpt_client.GPT_GUIDANCE_PATH = str(self.output_path / 'GPT_Guidance')
+        gpt_client.driver_pool = self.create_driver_pool(recorded_trace_folder_path)
+        desired_caps = self.test_executor.generate_desired_caps(self.app_config_dict[target_app_tag], self.env_config)
+        output_trace_folder_path = self.output_path / 'GPT_Trace' / task_name
+        output_trace_folder_path.mkdir()
+        with PROFILER.context(task=task_name):
+            driver = gpt_client.connect_device(desired_caps)
+            with TranscriptWriter(output_trace_folder_path / 'messages.jsonl') as transcript:
+                action_trace = gpt_client.perform_intention(intention_list, driver, output_trace_folder_path,
+                                                            desired_caps, transcript=transcript)
+        return len(action_trace), PROFILER.pop_task_span_list(task_name), answer_provider.miss_count
+
+    def run_oracle_task(self, app_tag, func_tag, target_app_tag):
+        task_name = f'{app_tag}_{func_tag}_{target_app_tag}'
+        original_trace_folder_path = self.trace_path / app_tag / func_tag
+        if not (original_trace_folder_path / 'action_trace.json').exists() or not (
+                self.gpt_guidance_path / task_name / 'gpt.txt').exists():
+            return None
+        # the recorded trace of the test case holds the test case events
+        with open(original_trace_folder_path / 'action_trace.json', mode='r', encoding='utf-8') as f:
+            test_case = json.load(f)
+        answer_provider = ReplayAnswerProvider(get_transcript_path_list(self.oracle_path / task_name), '<index:-1>')
+        self.stub_server.answer_provider = answer_provider
+        gpt_client = self.create_gpt_client()
+        gpt_client.GPT_GUIDANCE_PATH = str(self.gpt_guidance_path)
+        output_oracle_folder_path = self.output_path / 'Oracle' / task_name
+        output_oracle_folder_path.mkdir()
+        with PROFILER.context(task=task_name):
+            with TranscriptWriter(output_oracle_folder_path / 'messages.jsonl') as transcript:
+                oracle_list = gpt_client.generate_oracle_from_gpt_trace(self.gpt_trace_path / task_name, test_case,
+                                                                        original_trace_folder_path,
+                                                                        output_oracle_folder_path, transcript)
+        return len(oracle_list), PROFILER.pop_task_span_list(task_name), answer_provider.miss_count
+
+    def get_stage_task_list(self, stage):
+        if stage in ['trace', 'intention']:
+            if not self.trace_path.exists():
+                return []
+            return [(app_folder_path.name, func_folder_path.name) for app_folder_path in
+                    sorted(self.trace_path.iterdir()) if app_folder_path.is_dir() for func_folder_path in
+                    sorted(app_folder_path.iterdir()) if (func_folder_path / 'action_trace.json').exists()]
+        return self.get_migration_task_list()
+
+    def run_stage(self, stage):
+        run_task = {'trace': self.run_trace_task, 'intention': self.run_intention_task,
+                    'migration': self.run_migration_task, 'oracle': self.run_oracle_task}[stage]
+        task_count, item_count, replay_miss_count, elapsed_time = 0, 0, 0, 0.0
+        span_list = []
+        for task in self.get_stage_task_list(stage):
+            start_time = time.perf_counter()
+            result = run_task(*task)
+            if result is None:
+                continue
+            elapsed_time += time.perf_counter() - start_time
+            task_count += 1
+            item_count += result[0]
+            span_list.extend(result[1])
+            replay_miss_count += result[2]
+        return {'task_count': task_count,
+                'item_count': item_count,
+                # the prompts changed since the answers were recorded
+                'replay_miss_count': replay_miss_count,
+                'elapsed_time': elapsed_time,
+                'items_per_second': item_count / elapsed_time if elapsed_time > 0 else 0.0,
+                'span_total': get_span_total_dict(span_list)}
+
+    def run(self, stage_list):
+        for folder_name in ['Trace', 'Intention', 'GPT_Trace', 'GPT_Guidance', 'Oracle']:
+            (self.output_path / folder_name).mkdir(parents=True, exist_ok=True)
+        report = {}
+        self.stub_server.start()
+        try:
+            with zero_sleep():
+                for stage in stage_list:
+                    report[stage] = self.run_stage(stage)
+        finally:
+            self.stub_server.stop()
+        return report
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    # returns the stages slower than the baseline by more than the tolerance
+    regressed_stage_list = []
+    for stage, result in report.items():
+        if stage not in baseline or baseline[stage]['items_per_second'] <= 0 or result['task_count'] == 0:
+            continue
+        ratio = result['items_per_second'] / baseline[stage]['items_per_second']
+        print(f'{stage}: {result["items_per_second"]:.2f} items/s, {ratio:.2f}x of the baseline')
+        if ratio < 1 - tolerance:
+            regressed_stage_list.append(stage)
+    return regressed_stage_list
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline offline on the recorded traces')
+    parser.add_argument('--assets', default='assets',
+                        help='folder of Trace, GPT_Trace, GPT_Guidance, Intention and Oracle')
+    parser.add_argument('--stage', nargs='*', choices=Benchmark.STAGE_LIST, default=Benchmark.STAGE_LIST)
+    parser.add_argument('--baseline', default='assets/Result/benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    parser.add_argument('--report', help='also write the report to this json file')
+    args = parser.parse_args()
+
+    output_path = Path(tempfile.mkdtemp(prefix='item_benchmark_'))
+    try:
+        report = Benchmark(Path(args.assets), output_path).run(args.stage)
+    finally:
+        shutil.rmtree(output_path, ignore_errors=True)
+    for stage, result in report.items():
+        print(f'{stage}: {result["task_count"]} tasks, {result["item_count"]} items in {result["elapsed_time"]:.2f}s, '
+              f'{result["items_per_second"]:.2f} items/s, {result["replay_miss_count"]} LLM replay misses')
+        for span_name, span_total in sorted(result['span_total'].items(), key=lambda x: -x[1]):
+            print(f'    {span_name:<20} {span_total:>8.3f}s')
+    if args.report is not None:
+        with open(args.report, mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline stored in {baseline_path}')
+    elif baseline_path.exists():
+        with open(baseline_path, mode='r', encoding='utf-8') as f:
+            regressed_stage_list = compare_with_baseline(report, json.load(f), args.tolerance)
+        if len(regressed_stage_list) > 0:
+            print(f'regression in {regressed_stage_list}')
+            sys.exit(1)
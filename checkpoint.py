@@ -0,0 +1,68 @@
+import re
+
+from util import run_cmd
+
+
+# Device reachable through adb, the console commands are only available on emulators
+class AdbDevice:
+
+    def __init__(self, serial):
+        self.serial = serial
+
+    def adb(self, command):
+        return run_cmd(f'adb -s {self.serial} {command}')
+
+    def emulator_command(self, command):
+        return self.adb(f'emu {command}')
+
+
+# Save the emulator state after each completed intention, restoring the latest checkpoint replaces the replay of
+# all the previous guidance
+class EmulatorSnapshotCheckpointer:
+    SNAPSHOT_PREFIX = 'item'
+
+    def __init__(self, device, task_name):
+        # any object with emulator_command(command) -> output, e.g. AdbDevice
+        self.device = device
+        self.task_name = re.sub(r'[^A-Za-z0-9_]', '_', task_name)
+        # (snapshot name, number of guidance performed when the snapshot was saved)
+        self.latest_checkpoint = None
+
+    def get_snapshot_name(self, guidance_count):
+        return f'{self.SNAPSHOT_PREFIX}_{self.task_name}_{guidance_count}'
+
+    def is_ok(self, output):
+        return output is not None and 'OK' in output and 'KO' not in output
+
+    def save(self, guidance_count):
+        snapshot_name = self.get_snapshot_name(guidance_count)
+        if self.latest_checkpoint is not None and self.latest_checkpoint[0] == snapshot_name:
+            return True
+        output = self.device.emulator_command(f'avd snapshot save {snapshot_name}')
+        if not self.is_ok(output):
+            print(f'fail to save the checkpoint {snapshot_name}: {output}')
+            return False
+        # only the latest checkpoint is kept
+        previous_checkpoint = self.latest_checkpoint
+        self.latest_checkpoint = (snapshot_name, guidance_count)
+        if previous_checkpoint is not None:
+            self.device.emulator_command(f'avd snapshot delete {previous_checkpoint[0]}')
+        print(f'checkpoint saved: {self.latest_checkpoint}')
+        return True
+
+    def restore(self):
+        # returns the number of guidance performed at the checkpoint, -1 if there is no checkpoint to restore
+        if self.latest_checkpoint is None:
+            return -1
+        snapshot_name, guidance_count = self.latest_checkpoint
+        output = self.device.emulator_command(f'avd snapshot load {snapshot_name}')
+        if not self.is_ok(output):
+            print(f'fail to restore the checkpoint {snapshot_name}: {output}')
+            return -1
+        print(f'checkpoint restored: {self.latest_checkpoint}')
+        return guidance_count
+
+    def clear(self):
+        if self.latest_checkpoint is not None:
+            self.device.emulator_command(f'avd snapshot delete {self.latest_checkpoint[0]}')
+            self.latest_checkpoint = None
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from selenium.common import WebDriverException
+
+from profiler import profiled
+from util import parse_focused_package
+
+
+# Hierarchy dump, screenshot and foreground package through the Appium session
+class AppiumDeviceIO:
+
+    def __init__(self, driver, ignore_unimportant_views=False):
+        self.driver = driver
+        if ignore_unimportant_views:
+            # the nodes that are not important for accessibility are removed from the dump, the recorded xml and the
+            # widget indices differ from the full hierarchy
+            self.driver.update_settings({'ignoreUnimportantViews': True})
+
+    def dump_hierarchy(self):
+        return str(self.driver.page_source)
+
+    @profiled('screenshot')
+    def save_screenshot(self, screenshot_path: Path):
+        self.driver.get_screenshot_as_file(str(screenshot_path))
+
+    def get_foreground_package(self):
+        try:
+            return self.driver.current_package
+        except WebDriverException:
+            return ''
+
+
+# Screenshot and foreground package through a persistent adb connection, the hierarchy is still dumped by the Appium
+# session since its UiAutomator2 server holds the only UiAutomation connection of the device
+class AdbDeviceIO(AppiumDeviceIO):
+
+    def __init__(self, driver, serial, ignore_unimportant_views=False):
+        super().__init__(driver, ignore_unimportant_views)
+        import adbutils
+        self.device = adbutils.adb.device(serial)
+
+    @profiled('screenshot')
+    def save_screenshot(self, screenshot_path: Path):
+        # the raw png of screencap, without the base64 transcoding of the Appium screenshot
+        png_bytes = self.device.shell(['screencap', '-p'], encoding=None)
+        with open(screenshot_path, mode='wb') as f:
+            f.write(png_bytes)
+
+    def get_foreground_package(self):
+        output = self.device.shell("dumpsys window windows | grep -E 'mCurrentFocus|mFocusedApp'")
+        return parse_focused_package(output)
+
+
+def create_device_io(backend, driver, ignore_unimportant_views=False):
+    # backend: 'appium' or 'adb'
+    if backend == 'adb':
+        capabilities = driver.capabilities
+        serial = capabilities.get('udid') or capabilities.get('deviceUDID') or capabilities.get('deviceName')
+        return AdbDeviceIO(driver, serial, ignore_unimportant_views)
+    return AppiumDeviceIO(driver, ignore_unimportant_views)
@@ -0,0 +1,118 @@
+import atexit
+import threading
+import time
+
+from appium import webdriver
+from appium.options.android import UiAutomator2Options
+from selenium.common import WebDriverException
+
+
+# Keep the Appium sessions warm, one session per device. A session is reused for the next target app by resetting
+# the app state instead of creating a new session
+class DriverPool:
+
+    def __init__(self, driver_factory=None):
+        # driver_factory(appium server url, desired caps) creates a session, a remote Appium session by default
+        self.driver_factory = driver_factory if driver_factory is not None else self.create_remote_driver
+        self.lock = threading.Lock()
+        # (appium server url, device) -> [driver, app package]
+        self.session_dict = {}
+        self.hit_count = 0
+        self.miss_count = 0
+        self.setup_time_list = []
+        self.reset_time_list = []
+
+    def get_key(self, appium_server_url, desired_caps):
+        device = desired_caps['udid'] if 'udid' in desired_caps else desired_caps['deviceName']
+        return appium_server_url, device
+
+    def acquire(self, appium_server_url, desired_caps, reset_app=True):
+        key = self.get_key(appium_server_url, desired_caps)
+        with self.lock:
+            session = self.session_dict.get(key)
+        if session is not None:
+            driver = session[0]
+            if self.is_healthy(driver):
+                if reset_app:
+                    start_time = time.time()
+                    self.reset_app(driver, desired_caps)
+                    self.reset_time_list.append(time.time() - start_time)
+                with self.lock:
+                    self.hit_count += 1
+                    session[1] = desired_caps['appPackage']
+                return driver
+            print(f'session of {key} is not healthy, create a new one')
+            self.discard(driver)
+
+        start_time = time.time()
+        driver = self.driver_factory(appium_server_url, desired_caps)
+        with self.lock:
+            self.setup_time_list.append(time.time() - start_time)
+            self.miss_count += 1
+            self.session_dict[key] = [driver, desired_caps['appPackage']]
+        return driver
+
+    def create_remote_driver(self, appium_server_url, desired_caps):
+        return webdriver.Remote(appium_server_url, options=UiAutomator2Options().load_capabilities(desired_caps))
+
+    def is_healthy(self, driver):
+        try:
+            driver.current_package
+            return True
+        except WebDriverException:
+            return False
+
+    def reset_app(self, driver, desired_caps):
+        app_package = desired_caps['appPackage']
+        driver.terminate_app(app_package)
+        # a new session without noReset starts with cleared app data and granted permissions
+        if not desired_caps.get('noReset', False):
+            driver.execute_script('mobile: clearApp', {'appId': app_package})
+            if desired_caps.get('autoGrantPermissions', False):
+                try:
+                    driver.execute_script('mobile: changePermissions',
+                                          {'permissions': 'all', 'appPackage': app_package, 'action': 'grant'})
+                except WebDriverException as e:
+                    print(e)
+        app_activity = desired_caps['appActivity']
+        intent = app_activity if '/' in app_activity else f'{app_package}/{app_activity}'
+        try:
+            driver.execute_script('mobile: startActivity', {'intent': intent, 'wait': True})
+        except WebDriverException:
+            driver.activate_app(app_package)
+
+    def discard(self, driver):
+        with self.lock:
+            for key, session in list(self.session_dict.items()):
+                if session[0] is driver:
+                    del self.session_dict[key]
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def quit_all(self):
+        with self.lock:
+            session_list = list(self.session_dict.values())
+            self.session_dict.clear()
+        for driver, _ in session_list:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+    def get_metrics(self):
+        with self.lock:
+            acquire_count = self.hit_count + self.miss_count
+            return {'hit': self.hit_count,
+                    'miss': self.miss_count,
+                    'hit_rate': self.hit_count / acquire_count if acquire_count > 0 else 0.0,
+                    'mean_setup_time': sum(self.setup_time_list) / len(self.setup_time_list)
+                    if self.setup_time_list else 0.0,
+                    'mean_reset_time': sum(self.reset_time_list) / len(self.reset_time_list)
+                    if self.reset_time_list else 0.0}
+
+
+# shared by the executor, the migrator and the gpt client of the process
+DRIVER_POOL = DriverPool()
+atexit.register(DRIVER_POOL.quit_all)
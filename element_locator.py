@@ -0,0 +1,76 @@
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common import NoSuchElementException
+
+# xml attribute -> UiSelector method
+UI_SELECTOR_METHOD_DICT = {
+    'resource-id': 'resourceId',
+    'class': 'className',
+    'text': 'text',
+    'content-desc': 'description',
+}
+
+
+def escape_selector_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def build_ui_selector(criteria, instance=0):
+    ui_selector = 'new UiSelector()'
+    for attrib_name, attrib_value in criteria.items():
+        ui_selector += f'.{UI_SELECTOR_METHOD_DICT[attrib_name]}("{escape_selector_value(attrib_value)}")'
+    if instance > 0:
+        ui_selector += f'.instance({instance})'
+    return ui_selector
+
+
+def is_matching_node(xml_node, criteria):
+    for attrib_name, attrib_value in criteria.items():
+        if xml_node.get(attrib_name, '') != attrib_value:
+            return False
+    return True
+
+
+def rank_candidate_nodes(xml_node_list, rank_xml_node):
+    # rank_xml_node returns (priority, criteria) or None, the lower priority value, the higher priority
+    best_candidate = None
+    for xml_node in xml_node_list:
+        ranked = rank_xml_node(xml_node)
+        if ranked is None:
+            continue
+        priority, criteria = ranked
+        if best_candidate is None or priority < best_candidate[0]:
+            best_candidate = (priority, xml_node, criteria)
+    return best_candidate
+
+
+def get_node_instance(root, xml_node, criteria):
+    # UiSelector counts the instances in the document order of the hierarchy
+    instance = 0
+    for node in root.iter():
+        if node is xml_node:
+            return instance
+        if is_matching_node(node, criteria):
+            instance += 1
+    return 0
+
+
+def locate_ranked_element(driver, screen_snapshot, xml_node_list, rank_xml_node):
+    # rank the candidates locally, only the winner is resolved by the driver
+    best_candidate = rank_candidate_nodes(xml_node_list, rank_xml_node)
+    if best_candidate is None:
+        return None
+    _, xml_node, criteria = best_candidate
+    instance = get_node_instance(screen_snapshot.root, xml_node, criteria)
+    ui_selector = build_ui_selector(criteria, instance)
+    try:
+        return driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
+    except NoSuchElementException:
+        print(f'no element for {ui_selector}, locate it by bounds')
+    bounds = xml_node.get('bounds', '')
+    if bounds == '':
+        return None
+    xpath = f'//*[@class="{xml_node.get("class", "")}" and @bounds="{bounds}"]'
+    try:
+        return driver.find_element(by=AppiumBy.XPATH, value=xpath)
+    except NoSuchElementException:
+        return None
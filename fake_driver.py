@@ -0,0 +1,225 @@
+import json
+import re
+import shutil
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from appium.webdriver.common.appiumby import AppiumBy
+from selenium.common import NoSuchElementException
+
+# xml attribute of each UiSelector method
+UI_SELECTOR_ATTRIB_DICT = {
+    'resourceId': 'resource-id',
+    'className': 'class',
+    'text': 'text',
+    'description': 'content-desc',
+}
+
+
+def unescape_selector_value(value):
+    return value.replace('\\"', '"').replace('\\\\', '\\')
+
+
+def parse_ui_selector(ui_selector):
+    # e.g. new UiSelector().className("a").text("b").instance(1) ---> ({'class': 'a', 'text': 'b'}, 1)
+    criteria = {}
+    instance = 0
+    for method, value in re.findall(r'\.(\w+)\(("(?:[^"\\]|\\.)*"|\d+)\)', ui_selector):
+        if method == 'instance':
+            instance = int(value)
+        elif method in UI_SELECTOR_ATTRIB_DICT:
+            criteria[UI_SELECTOR_ATTRIB_DICT[method]] = unescape_selector_value(value[1:-1])
+    return criteria, instance
+
+
+def parse_xpath(xpath):
+    # only the attribute conditions of //*[@a="x" and @b="y"] are supported
+    return {name: value for name, value in re.findall(r'@([\w-]+)="([^"]*)"', xpath)}, 0
+
+
+def get_trace_screen_list(trace_folder_path: Path):
+    # the screen before the first action, then the screen after every action that changes the screen
+    screen_list = [(trace_folder_path / '0_a.xml', trace_folder_path / '0_a.png')]
+    action_trace_path = trace_folder_path / 'action_trace.json'
+    action_trace = []
+    if action_trace_path.exists():
+        with open(action_trace_path, mode='r', encoding='utf-8') as f:
+            action_trace = json.load(f)
+    action_index = 0
+    while (trace_folder_path / f'{action_index}_b.xml').exists():
+        action = action_trace[action_index] if action_index < len(action_trace) else {}
+        # the oracles and the skipped intentions leave the screen unchanged
+        if action.get('event_type') != 'oracle' and action.get('operation_type') != 'Skip':
+            screen_list.append((trace_folder_path / f'{action_index}_b.xml',
+                                trace_folder_path / f'{action_index}_b.png'))
+        action_index += 1
+    return screen_list
+
+
+# Element of the current FakeDriver screen
+class FakeElement:
+
+    def __init__(self, driver, xml_node, element_id):
+        self.driver = driver
+        self.xml_node = xml_node
+        self.id = element_id
+
+    def get_attribute(self, name):
+        return self.xml_node.get(name)
+
+    @property
+    def rect(self):
+        x1, y1, x2, y2 = map(int, re.findall(r'-?\d+', self.xml_node.get('bounds', '[0,0][0,0]')))
+        return {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}
+
+    def click(self):
+        self.driver.dispatch_action()
+
+    def clear(self):
+        self.driver.dispatch_action()
+
+    def send_keys(self, value):
+        self.driver.dispatch_action()
+
+
+# Stand-in of the Appium driver replaying the screens recorded in a trace folder. Every dispatched action moves to the
+# screen recorded after the next action when the hierarchy is read again, resetting the app goes back to the first
+# screen. Nothing waits
+class FakeDriver:
+
+    def __init__(self, trace_folder_path: Path, app_package='', capabilities=None):
+        self.screen_list = get_trace_screen_list(trace_folder_path)
+        self.app_package = app_package
+        self.capabilities = capabilities if capabilities is not None else {}
+        self.session_id = f'fake-{trace_folder_path.name}'
+        self.screen_index = 0
+        # the actions of one operation (e.g. click, clear and send_keys) lead to one transition
+        self.has_pending_action = False
+        self.xml_cache = {}
+        self.element_count = 0
+        self.action_count = 0
+        self.page_source_count = 0
+        self.current_activity = ''
+        self.is_keyboard_shown = False
+
+    def dispatch_action(self):
+        self.action_count += 1
+        self.has_pending_action = True
+
+    def reset_screen(self):
+        self.screen_index = 0
+        self.has_pending_action = False
+
+    def get_xml(self):
+        if self.has_pending_action:
+            self.screen_index = min(self.screen_index + 1, len(self.screen_list) - 1)
+            self.has_pending_action = False
+        xml_path = self.screen_list[self.screen_index][0]
+        if xml_path not in self.xml_cache:
+            self.xml_cache[xml_path] = xml_path.read_text(encoding='utf-8')
+        return self.xml_cache[xml_path]
+
+    @property
+    def page_source(self):
+        self.page_source_count += 1
+        return self.get_xml()
+
+    @property
+    def current_package(self):
+        return self.app_package
+
+    def find_element(self, by=AppiumBy.ID, value=None):
+        if by == AppiumBy.ANDROID_UIAUTOMATOR:
+            criteria, instance = parse_ui_selector(value)
+        elif by == AppiumBy.XPATH:
+            criteria, instance = parse_xpath(value)
+        elif by == AppiumBy.ID:
+            criteria, instance = {'resource-id': value}, 0
+        else:
+            raise NoSuchElementException(f'{by} is not supported by the fake driver')
+        # the current screen, the pending action has not been applied yet
+        xml_path = self.screen_list[self.screen_index][0]
+        root = ET.fromstring(self.xml_cache.get(xml_path) or xml_path.read_text(encoding='utf-8'))
+        match_count = 0
+        for xml_node in root.iter():
+            if all(xml_node.get(name, '') == value for name, value in criteria.items()):
+                if match_count == instance:
+                    self.element_count += 1
+                    return FakeElement(self, xml_node, f'fake-element-{self.element_count}')
+                match_count += 1
+        raise NoSuchElementException(f'no element for {value}')
+
+    def get_screenshot_as_file(self, filename):
+        screenshot_path = self.screen_list[self.screen_index][1]
+        if screenshot_path.exists():
+            shutil.copyfile(screenshot_path, filename)
+        else:
+            Path(filename).write_bytes(b'')
+        return True
+
+    def execute_script(self, script, *args):
+        if script in ['mobile: clearApp', 'mobile: startActivity']:
+            self.reset_screen()
+        return None
+
+    def execute(self, driver_command, params=None):
+        # the w3c actions of ActionChains
+        self.dispatch_action()
+        return {'value': None}
+
+    def back(self):
+        self.dispatch_action()
+
+    def press_keycode(self, keycode, metastate=None, flags=None):
+        self.dispatch_action()
+
+    def swipe(self, start_x, start_y, end_x, end_y, duration=0):
+        self.dispatch_action()
+
+    def tap(self, positions, duration=None):
+        self.dispatch_action()
+
+    def hide_keyboard(self, key_name=None, key=None, strategy=None):
+        pass
+
+    def activate_app(self, app_id):
+        self.reset_screen()
+
+    def terminate_app(self, app_id, **options):
+        self.reset_screen()
+        return True
+
+    def update_settings(self, settings):
+        pass
+
+    def quit(self):
+        pass
+
+
+# Stand-in for the AdbDevice of an emulator, it keeps the saved snapshots and answers the avd snapshot commands like
+# the emulator console
+class FakeEmulatorDevice:
+
+    def __init__(self, failing_command_list=None):
+        # e.g. ['avd snapshot load'], the commands starting with them fail
+        self.failing_command_list = failing_command_list if failing_command_list is not None else []
+        self.snapshot_set = set()
+        self.command_list = []
+
+    def emulator_command(self, command):
+        self.command_list.append(command)
+        if any(command.startswith(failing_command) for failing_command in self.failing_command_list):
+            return 'KO: command failed'
+        split_list = command.split()
+        if len(split_list) != 4 or split_list[:2] != ['avd', 'snapshot']:
+            return 'KO: unknown command'
+        operation, snapshot_name = split_list[2], split_list[3]
+        if operation == 'save':
+            self.snapshot_set.add(snapshot_name)
+            return 'OK'
+        if operation == 'load':
+            return 'OK' if snapshot_name in self.snapshot_set else f'KO: no snapshot {snapshot_name}'
+        if operation == 'delete':
+            self.snapshot_set.discard(snapshot_name)
+            return 'OK'
+        return 'KO: unknown command'
@@ -1,32 +1,110 @@
 import re
 import shutil
 import time
-import xml.etree.ElementTree as ET
 from pathlib import Path
 
-import openai
 from alive_progress import alive_it
-from appium import webdriver
-from appium.options.android import UiAutomator2Options
 from appium.webdriver.common.appiumby import AppiumBy
 from selenium.common import WebDriverException
 from selenium.webdriver import ActionChains
 
-from threshold import EXPLORATION_LIMIT
-from util import get_current_package_name
-
-
-class GPTClient:
+from checkpoint import AdbDevice, EmulatorSnapshotCheckpointer
+from driver_pool import DRIVER_POOL
+from element_locator import locate_ranked_element
+from guidance_index import GuidanceIndex, create_embedder, tokenize_intention
+from hierarchy import parse_hierarchy_file
+from llm_cache import LLMResponseCache
+from llm_client import AsyncLLMClient
+from profiler import PROFILER, profiled
+from prompt_compaction import count_message_tokens, encode_screen_diff, encode_widget_table, fit_messages
+from screen import ScreenAccessMixin
+from screen_graph import encode_screen_digest, encode_screen_signature, get_screen_graph
+from threshold import EXPLORATION_LIMIT, DEVICE_CONNECT_TIMEOUT, GUIDANCE_SIMILARITY_THRESHOLD, ORACLE_MATCH_THRESHOLD, \
+    ORACLE_MATCH_MARGIN
+from ui_wait import UIIdleWaiter
+from widget import Widget, SCREEN_WIDGET_KEYS, XML_WIDGET_KEYS
+from widget_list_cache import get_widget_list_cache
+from widget_matcher import match_widget
+
+
+class GPTClient(ScreenAccessMixin):
     MODEL = 'gpt-4-turbo'
     # TODO set your api key
     API_KEY = ''
-
+    # any service compatible with the openai chat-completions api
+    API_BASE = 'https://api.openai.com/v1'
+    # the number of LLM requests in flight at the same time
+    LLM_MAX_CONCURRENCY = 4
+    LLM_TIMEOUT = 120
+    # identical prompts are answered from the cache, 'read_write', 'replay_only' or 'disabled'
+    LLM_CACHE_MODE = LLMResponseCache.READ_WRITE
+    LLM_CACHE_PATH = r'assets/LLM_Cache/responses.sqlite'
+    # seconds, None means the cached responses never expire
+    LLM_CACHE_TTL = None
+    LLM_CACHE_MAX_ENTRY_COUNT = 100000
+    # 'sequential': one prompt after another, 'concurrent': all oracle prompts in flight at the same time,
+    # 'batched': the oracles sharing the same new screen are packed into one prompt
+    ORACLE_MIGRATION_MODE = 'concurrent'
+    # the oracle widgets matched by their features with enough confidence are not sent to the LLM
+    ORACLE_PRE_MATCHING = True
+    # None: recover by replaying all the guidance, 'emulator_snapshot': restore the snapshot saved after the latest
+    # completed intention and only replay the guidance after it
+    CHECKPOINT_MODE = None
+    # 'appium': everything through the Appium session, 'adb': screenshots and foreground package through adb
+    DEVICE_IO_BACKEND = 'appium'
+    # remove the nodes that are not important for accessibility from the hierarchy dump, this changes the recorded xml
+    # and the widget indices, the traces recorded with and without it do not match
+    IGNORE_UNIMPORTANT_VIEWS = False
+    # widget lists sent as tables, after screens as diffs, and the older exploration turns omitted to fit the budget
+    PROMPT_COMPACTION = False
+    # tokens counted by the local approximation
+    PROMPT_TOKEN_BUDGET = 6000
+    # 'full': every intention request resends the whole conversation, 'window': the intentions of the earlier events
+    # as a summary plus the last INTENTION_WINDOW_SIZE events, 'batch': all the events in one request
+    INTENTION_CONTEXT_MODE = 'full'
+    INTENTION_WINDOW_SIZE = 3
+    # the LLM may answer an exploration with a plan of several operations, each with the widget expected after it, the
+    # plan is followed without asking again as long as the screens match
+    EXPLORATION_PLAN_MODE = False
+    EXPLORATION_PLAN_MAX_STEP_COUNT = 4
+    # the widget lists of the recorded xml files are parsed once per process (memory) and also kept in an index in
+    # every trace folder (sidecar), None to parse them every time
+    WIDGET_LIST_CACHE_MODE = 'sidecar'
+    # the screens of the target app and the decisions taken on them, None: not kept, 'record': updated but not used,
+    # 'decision': the decision of the same intention on the same screen is reused, 'path': also the known path to such
+    # a screen is followed
+    SCREEN_GRAPH_MODE = 'record'
+    SCREEN_GRAPH_PATH = r'assets/Screen_Graph'
+    # the guidance of a similar intention on the same screen is reused, searched among the decisions of the screen graph
+    # by the embeddings of None: not used, 'tfidf', or the name of a local sentence-transformers model
+    GUIDANCE_INDEX_EMBEDDER = None
+
+    # upper bound of the wait for the screen to be idle after an action
     ACTION_SLEEP_INTERVAL = 20
 
     GPT_GUIDANCE_PATH = r'assets/GPT_Guidance'
 
+    APPIUM_SERVER_URL = 'http://localhost:4723'
+
     def __init__(self):
-        openai.api_key = self.API_KEY
+        self.llm_response_cache = LLMResponseCache(Path(self.LLM_CACHE_PATH), self.LLM_CACHE_MODE, self.LLM_CACHE_TTL,
+                                                   self.LLM_CACHE_MAX_ENTRY_COUNT)
+        self.llm_client = AsyncLLMClient(self.API_KEY, self.API_BASE, self.LLM_MAX_CONCURRENCY, self.LLM_TIMEOUT,
+                                         response_cache=self.llm_response_cache)
+        self.screen_snapshot = None
+        self.ui_idle_waiter = UIIdleWaiter()
+        self.appium_server_url = self.APPIUM_SERVER_URL
+        self.driver_pool = DRIVER_POOL
+        self.device_io = None
+        # the local token count of every request sent
+        self.prompt_token_count_list = []
+        # the answers taken from the screen graph or the guidance index instead of the LLM
+        self.screen_graph_hit_count = 0
+        # the operations taken from a plan instead of asking the LLM again
+        self.plan_step_hit_count = 0
+        # app package -> (decision version of its screen graph, GuidanceIndex)
+        self.guidance_index_dict = {}
+        self.guidance_embedder = None
 
     def generate_gui_event_prompt(self, action_trace, screen_before_path_list, screen_after_path_list):
         gui_event_prompt_list = []
@@ -80,13 +158,8 @@ class GPTClient:
 
     def capture_current_screen_info(self, driver):
         screen_info = []
-        xml_str = str(driver.page_source)
-        root = ET.fromstring(xml_str)
-        xml_node_list = []
-        child_xml_node_list = []
-        self.get_child_node_list(root, child_xml_node_list)
-        xml_node_list.extend(child_xml_node_list)
-        for xml_node in xml_node_list:
+        screen_snapshot = self.get_screen_snapshot(driver)
+        for xml_node in screen_snapshot.child_node_list:
             if 'text' in xml_node.attrib and xml_node.attrib['text'] != '':
                 screen_info.append(xml_node.attrib['text'])
                 continue
@@ -120,7 +193,7 @@ class GPTClient:
         guidance = re.search(r'<[^<>]+>', response_text).group()
         if '<Skip>' in response_text:
             self.record_action(None, action_trace, 'Skip')
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
             return '<Skip>'
         if '(resource-id:' not in guidance:
             # e.g. <Explore, click, 1, Empty>
@@ -182,16 +255,19 @@ class GPTClient:
         print(f'processed input: {result.strip()}')
         return result.strip()
 
+    @profiled('action')
     def perform_gui_action(self, el, operation_type, input_value, driver):
 
         print(f'operation:{operation_type} {input_value}')
         print('================================================')
+        # the screen is going to change, the hierarchy has to be fetched again
+        self.get_screen_snapshot(driver).invalidate()
         if operation_type == 'click':
             if el is None:
                 print('el is None')
             else:
                 el.click()
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'input':
             if el.get_attribute('class') == 'android.widget.TextView':
@@ -202,7 +278,7 @@ class GPTClient:
             el.clear()
             time.sleep(1)
             el.send_keys(input_value)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'input_and_enter':
             if el.get_attribute('class') == 'android.widget.TextView':
@@ -217,7 +293,7 @@ class GPTClient:
                 driver.press_keycode(66)
             except Exception as e:
                 print(e)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'long_click':
             ac = ActionChains(driver)
@@ -225,7 +301,7 @@ class GPTClient:
             ac.w3c_actions.pointer_action.pause(2)
             ac.w3c_actions.pointer_action.release()
             ac.perform()
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'swipe_right':
             # e.g., {'x': 202, 'y': 265, 'width': 878, 'height': 57}
@@ -234,13 +310,13 @@ class GPTClient:
                     driver.swipe(200, 960, 800, 960, 500)
                 except Exception as e:
                     print(e)
-                time.sleep(self.ACTION_SLEEP_INTERVAL)
+                self.wait_for_idle(driver)
             else:
                 rect = el.rect
                 start_x, start_y, end_x, end_y = rect['x'] + rect['width'] / 4, rect['y'] + rect['height'] / 2, \
                                                  rect['x'] + rect['width'] * 3 / 4, rect['y'] + rect['height'] / 2
                 driver.swipe(start_x, start_y, end_x, end_y, 500)
-                time.sleep(self.ACTION_SLEEP_INTERVAL)
+                self.wait_for_idle(driver)
 
         elif operation_type == 'swipe_left':
             # e.g., {'x': 202, 'y': 265, 'width': 878, 'height': 57}
@@ -249,35 +325,35 @@ class GPTClient:
                     driver.swipe(800, 960, 200, 960, 500)
                 except Exception as e:
                     print(e)
-                time.sleep(self.ACTION_SLEEP_INTERVAL)
+                self.wait_for_idle(driver)
             else:
                 rect = el.rect
                 end_x, end_y, start_x, start_y = rect['x'] + rect['width'] * 3 / 4, rect['y'] + rect['height'] / 2, \
                                                  rect['x'] + rect['width'] / 4, rect['y'] + rect['height'] / 2
                 driver.swipe(start_x, start_y, end_x, end_y, 500)
-                time.sleep(self.ACTION_SLEEP_INTERVAL)
+                self.wait_for_idle(driver)
 
         elif operation_type == 'enter':
             driver.press_keycode(66)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'back':
             driver.back()
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'scroll_down':
             try:
                 driver.swipe(500, 1000, 500, 200, 500)
             except Exception as e:
                 print(e)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif operation_type == 'scroll_up':
             try:
                 driver.swipe(500, 200, 500, 1000, 500)
             except Exception as e:
                 print(e)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         else:
             print(f"Unknown action to be performed {operation_type}")
@@ -312,106 +388,68 @@ class GPTClient:
         print('================================================')
         return result_element
 
+    @profiled('element_lookup')
     def find_element(self, element, driver):
-        xml = str(driver.page_source)
+        screen_snapshot = self.get_screen_snapshot(driver)
         id = element['resource-id']
         content_desc = element['content-desc']
         text = element['text']
         clazz = element['class']
-        el = None
-        root = ET.fromstring(xml)
         xml_node_list = []
-        child_xml_node_list = []
-        parent_xml_node_list = []
-        self.get_child_node_list(root, child_xml_node_list)
-        self.get_parent_node_list(root, parent_xml_node_list)
-        xml_node_list.extend(child_xml_node_list)
-        xml_node_list.extend(parent_xml_node_list)
-
-        candidate_elements = {}
-        for xml_node in xml_node_list:
-            node_id = xml_node.attrib['resource-id'] if 'resource-id' in xml_node.attrib else ''
-            node_clazz = xml_node.attrib['class'] if 'class' in xml_node.attrib else ''
-            node_text = xml_node.attrib['text'] if 'text' in xml_node.attrib else ''
-            node_content_desc = xml_node.attrib['content-desc'] if 'content-desc' in xml_node.attrib else ''
-
-            if (id, text) == (node_id, node_text) and id != '' and text != '' and clazz != 'android.widget.EditText':
-                ui_selector = f'new UiSelector().resourceId("{id}").text("{text}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                # set priority, the lower value, the higher priority
-                candidate_elements[el] = 0
-
-            elif (id, clazz) == (node_id, node_clazz) and id != '':
-                ui_selector = f'new UiSelector().resourceId("{id}").className("{clazz}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                candidate_elements[el] = 1
+        xml_node_list.extend(screen_snapshot.child_node_list)
+        xml_node_list.extend(screen_snapshot.parent_node_list)
+        return locate_ranked_element(driver, screen_snapshot, xml_node_list,
+                                     lambda xml_node: self.rank_xml_node(xml_node, id, clazz, text, content_desc))
 
-            elif (id, text) == (node_id, node_text) and id != '' and text != '':
-                ui_selector = f'new UiSelector().resourceId("{id}").text("{text}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                # set priority, the lower value, the higher priority
-                candidate_elements[el] = 0
+    def rank_xml_node(self, xml_node, id, clazz, text, content_desc):
+        node_id = xml_node.attrib['resource-id'] if 'resource-id' in xml_node.attrib else ''
+        node_clazz = xml_node.attrib['class'] if 'class' in xml_node.attrib else ''
+        node_text = xml_node.attrib['text'] if 'text' in xml_node.attrib else ''
+        node_content_desc = xml_node.attrib['content-desc'] if 'content-desc' in xml_node.attrib else ''
 
-            elif (id, clazz) == (node_id, node_clazz) and id == '':
-                if text == node_text and text != '':
-                    ui_selector = f'new UiSelector().className("{clazz}").text("{text}")'
-                    el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                    candidate_elements[el] = 2
+        if (id, text) == (node_id, node_text) and id != '' and text != '' and clazz != 'android.widget.EditText':
+            # set priority, the lower value, the higher priority
+            return 0, {'resource-id': id, 'text': text}
 
-                elif content_desc == node_content_desc and content_desc != '':
-                    ui_selector = f'new UiSelector().className("{clazz}").description("{content_desc}")'
-                    el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                    candidate_elements[el] = 2
+        elif (id, clazz) == (node_id, node_clazz) and id != '':
+            return 1, {'resource-id': id, 'class': clazz}
 
-                elif node_clazz != '':
-                    ui_selector = f'new UiSelector().className("{clazz}")'
-                    el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                    candidate_elements[el] = 3
+        elif (id, text) == (node_id, node_text) and id != '' and text != '':
+            return 0, {'resource-id': id, 'text': text}
 
-        candidate_elements = sorted(candidate_elements.items(), key=lambda x: x[1], reverse=False)
-        for candidate_element in candidate_elements:
-            if candidate_element[0] is not None:
-                el = candidate_element[0]
-                break
-        return el
+        elif (id, clazz) == (node_id, node_clazz) and id == '':
+            if text == node_text and text != '':
+                return 2, {'class': clazz, 'text': text}
 
-    def get_child_to_parent_dict(self, root):
+            elif content_desc == node_content_desc and content_desc != '':
+                return 2, {'class': clazz, 'content-desc': content_desc}
 
-        res = {child_node: parent_node for parent_node in root.iter() for child_node in parent_node}
-        return res
+            elif node_clazz != '':
+                return 3, {'class': clazz}
+        return None
 
     def capture_current_screen_widgets(self, driver):
+        return self.get_screen_widgets(self.get_screen_snapshot(driver))
+
+    def get_screen_widgets(self, hierarchy):
+        # hierarchy: the ScreenSnapshot of the device or the Hierarchy of a recorded xml
         widget_list = []
-        xml_str = str(driver.page_source)
-        root = ET.fromstring(xml_str)
-        child_to_parent_dict = self.get_child_to_parent_dict(root)
-        xml_node_list = []
-        child_xml_node_list = []
-        self.get_child_node_list(root, child_xml_node_list)
-        xml_node_list.extend(child_xml_node_list)
-        node_attrib_list = ['class', 'resource-id', 'content-desc', 'text', 'clickable']
+        widget_tree = hierarchy.widget_tree
         filtered_class_list = ['android.view.View', 'android.widget.RelativeLayout']
-        for xml_node in xml_node_list:
-            widget = {}
-            for node_attrib in node_attrib_list:
-                if node_attrib in xml_node.attrib:
-                    widget[node_attrib] = xml_node.attrib[node_attrib]
-                else:
-                    widget[node_attrib] = ''
+        for node_index, xml_node in zip(hierarchy.child_node_index_list, hierarchy.child_node_list):
+            widget = Widget.from_attrib(SCREEN_WIDGET_KEYS, xml_node.attrib, widget_id=node_index,
+                                        node_index=node_index)
             # clickable transfer
-            parent_node = child_to_parent_dict[xml_node]
-            if parent_node.get('clickable') == 'true':
-                widget['clickable'] = 'true'
+            parent_index = widget_tree.get_parent_index(node_index)
+            if parent_index != -1 and widget_tree.node_clickable_list[parent_index]:
+                widget.clickable = 'true'
 
-            if widget['class'] in filtered_class_list:
+            if widget.clazz in filtered_class_list:
                 continue
 
             widget_list.append(widget)
-            # replace the relationship
-            parent_node = child_to_parent_dict[xml_node]
-            child_to_parent_dict[str(widget)] = parent_node
 
-        return widget_list, child_to_parent_dict
+        return widget_list, widget_tree
 
     def generate_combination_prompt(self, previous_intention_list, intention, before_screen_info, after_screen_info):
         task_prompt = f'Determine whether the current test intention has been achieved. Respond with "Yes" or "No".'
@@ -421,17 +459,26 @@ class GPTClient:
         print(combination_prompt)
         return combination_prompt
 
-    def prompt(self, messages, messages_list):
-        response = openai.ChatCompletion.create(
-            model=self.MODEL,
-            messages=messages,
-        )
-        response_text = response['choices'][0]['message']['content'].strip()
-        messages.append(self.construct_message("assistant", response_text))
-        messages_list.append(messages)
-        print(response_text)
-        print("============================================================================================")
-        return response_text
+    def prompt(self, messages, transcript=None):
+        return self.prompt_batch([messages], transcript)[0]
+
+    def prompt_batch(self, messages_batch, transcript=None):
+        # the conversations are independent, their requests are in flight at the same time
+        if self.PROMPT_COMPACTION:
+            sent_messages_batch = [fit_messages(messages, self.PROMPT_TOKEN_BUDGET) for messages in messages_batch]
+        else:
+            sent_messages_batch = messages_batch
+        for sent_messages in sent_messages_batch:
+            self.prompt_token_count_list.append(count_message_tokens(sent_messages))
+        response_text_list = self.llm_client.complete_many_sync(self.MODEL, sent_messages_batch)
+        response_text_list = [response_text.strip() for response_text in response_text_list]
+        for messages, response_text in zip(messages_batch, response_text_list):
+            messages.append(self.construct_message("assistant", response_text))
+            if transcript is not None:
+                transcript.record(messages)
+            print(response_text)
+            print("============================================================================================")
+        return response_text_list
 
     def construct_message(self, role, content):
         return {"role": role, "content": content}
@@ -444,66 +491,133 @@ class GPTClient:
         return screenshot_before_path, screenshot_after_path, xml_before_path, xml_after_path
 
     def record_screenshot_and_xml(self, screenshot_path: Path, xml_path: Path, driver):
-        driver.get_screenshot_as_file(str(screenshot_path))
-        xml_root_before = ET.fromstring(str(driver.page_source))
-        xml_tree_before = ET.ElementTree(xml_root_before)
-        xml_tree_before.write(xml_path)
+        self.get_device_io(driver).save_screenshot(screenshot_path)
+        self.get_screen_snapshot(driver).write_xml(xml_path)
 
-    def get_interactive_widget_index_list(self, widget_list, child_to_parent_dict):
+    def get_interactive_widget_index_list(self, widget_list, widget_tree):
         interactive_widget_index_list = []
         for index, widget in enumerate(widget_list):
-            if widget['clickable'] == 'true':
-                for child_node in widget:
-                    if child_node in widget_list:
-                        interactive_widget_index_list.append(widget_list.index(child_node))
+            if widget.clickable == 'true':
                 interactive_widget_index_list.append(index)
 
         # handle sidebar
-        sidebar_item_index_list = self.handle_sidebar(widget_list, child_to_parent_dict)
+        sidebar_item_index_list = self.handle_sidebar(widget_list, widget_tree)
         interactive_widget_index_list.extend(sidebar_item_index_list)
         interactive_widget_list = [widget_list[x] for x in interactive_widget_index_list]
         print(interactive_widget_index_list)
         print(interactive_widget_list)
         return sorted(interactive_widget_index_list)
 
-    def get_parent_to_child_dict(self, child_to_parent_dict):
-        # {parent:[child_list]}
-        parent_to_child_dict = {}
-        for child_widget_str, parent_node in child_to_parent_dict.items():
-            if parent_node not in parent_to_child_dict.keys():
-                parent_to_child_dict[parent_node] = [child_widget_str]
-            else:
-                parent_to_child_dict[parent_node].append(child_widget_str)
-        return parent_to_child_dict
-
-    def handle_sidebar(self, widget_list, child_to_parent_dict):
+    def handle_sidebar(self, widget_list, widget_tree):
+        # TextView in ListView > LinearLayout > RelativeLayout/LinearLayout
         sidebar_item_index_list = []
         for index, widget in enumerate(widget_list):
-            if widget['class'] != 'android.widget.TextView':
+            if widget.clazz != 'android.widget.TextView':
+                continue
+            parent_index = widget_tree.get_parent_index(widget.node_index)
+            if widget_tree.get_node_class(parent_index) not in ['android.widget.RelativeLayout',
+                                                                'android.widget.LinearLayout']:
+                continue
+            parent_index = widget_tree.get_parent_index(parent_index)
+            if widget_tree.get_node_class(parent_index) != 'android.widget.LinearLayout':
                 continue
-            parent_node = child_to_parent_dict[str(widget)]
-            if parent_node is not None and 'class' in parent_node.attrib and (parent_node.attrib[
-                                                                                  'class'] == 'android.widget.RelativeLayout' or
-                                                                              parent_node.attrib[
-                                                                                  'class'] == 'android.widget.LinearLayout'):
-                parent_node = child_to_parent_dict[parent_node] if parent_node in child_to_parent_dict.keys() else None
-                if parent_node is not None and 'class' in parent_node.attrib and parent_node.attrib[
-                    'class'] == 'android.widget.LinearLayout':
-                    parent_node = child_to_parent_dict[
-                        parent_node] if parent_node in child_to_parent_dict.keys() else None
-                    if parent_node is not None and 'class' in parent_node.attrib and parent_node.attrib[
-                        'class'] == 'android.widget.ListView':
-                        sidebar_item_index_list.append(index)
-                        widget['clickable'] = True
+            parent_index = widget_tree.get_parent_index(parent_index)
+            if widget_tree.get_node_class(parent_index) == 'android.widget.ListView':
+                sidebar_item_index_list.append(index)
+                widget['clickable'] = True
         return sidebar_item_index_list
 
-    def generate_exploration_prompt(self, intention, current_screen_widgets, child_to_parent_node_dict):
+    def get_screen_signature(self, app_package, widget_list, widget_tree):
+        return encode_screen_signature(app_package, widget_list,
+                                       self.get_interactive_widget_index_list(widget_list, widget_tree))
+
+    def load_screen_digest_from_xml(self, xml_path):
+        widget_list, widget_tree = self.get_screen_widgets(parse_hierarchy_file(xml_path))
+        return encode_screen_digest(widget_list, self.get_interactive_widget_index_list(widget_list, widget_tree))
+
+    def get_screen_signature_from_xml(self, app_package, xml_path):
+        if self.WIDGET_LIST_CACHE_MODE is None:
+            return f'{app_package}:{self.load_screen_digest_from_xml(xml_path)}'
+        screen_digest = get_widget_list_cache().get(xml_path, 'screen_digest', self.load_screen_digest_from_xml,
+                                                    self.WIDGET_LIST_CACHE_MODE == 'sidecar')
+        return f'{app_package}:{screen_digest}'
+
+    def is_guidance_widget_present(self, guidance, widget_list):
+        # the widget of the guidance is on the screen, the texts are compared as far as the guidance keeps them
+        element = self.parse_element(guidance)
+        if all(value == '' for value in element.values()):
+            return True
+        for widget in widget_list:
+            if all(str(widget[key]).split(',')[0].strip() == value for key, value in element.items()):
+                return True
+        return False
+
+    def get_guidance_index(self, screen_graph, app_package):
+        # rebuilt when the decisions of the screen graph changed
+        if self.guidance_embedder is None:
+            self.guidance_embedder = create_embedder(self.GUIDANCE_INDEX_EMBEDDER)
+        entry = self.guidance_index_dict.get(app_package)
+        if entry is None or entry[0] != screen_graph.decision_version:
+            guidance_index = GuidanceIndex(self.guidance_embedder)
+            decision_version = screen_graph.decision_version
+            guidance_index.build(screen_graph.get_decision_list())
+            entry = (decision_version, guidance_index)
+            self.guidance_index_dict[app_package] = entry
+        return entry[1]
+
+    def is_guidance_input_in_intention(self, guidance, intention):
+        # the input of the guidance of another intention must be the one asked by this intention
+        fixed_parts = self.parse_fixed_parts(guidance)
+        if fixed_parts is None or fixed_parts['action'] not in ['input', 'input_and_enter']:
+            return True
+        return self.process_input(fixed_parts['additional_info']).lower() in intention.lower()
+
+    def is_guidance_widget_in_intention(self, guidance, intention):
+        # the text or content-desc of the widget of the guidance of another intention must be named by this intention,
+        # e.g. not "Sign In" for <Intent: click the "Sign Up" button>
+        element = self.parse_element(guidance)
+        label = element['text'] if element['text'] != '' else element['content-desc']
+        intention_token_set = set(tokenize_intention(intention))
+        return all(token in intention_token_set for token in tokenize_intention(label))
+
+    def answer_from_known_guidance(self, screen_graph, intention, app_package, widget_list, widget_tree, messages):
+        # the guidance known for the intention, or a similar one, on this screen, None if the LLM has to be asked
+        if screen_graph is None or (self.SCREEN_GRAPH_MODE not in ['decision', 'path'] and
+                                    self.GUIDANCE_INDEX_EMBEDDER is None):
+            return None
+        signature = self.get_screen_signature(app_package, widget_list, widget_tree)
+        guidance = None
+        if self.SCREEN_GRAPH_MODE in ['decision', 'path']:
+            guidance = screen_graph.get_decision(signature, intention)
+        if guidance is None and self.GUIDANCE_INDEX_EMBEDDER is not None:
+            result = self.get_guidance_index(screen_graph, app_package).query(intention, signature,
+                                                                              GUIDANCE_SIMILARITY_THRESHOLD)
+            if result is not None and self.is_guidance_input_in_intention(result[0], intention) and \
+                    self.is_guidance_widget_in_intention(result[0], intention):
+                print(f'guidance index: {result[2]} ({result[1]:.2f})')
+                guidance = result[0]
+        if guidance is None and self.SCREEN_GRAPH_MODE == 'path':
+            path_guidance_list = screen_graph.find_path(signature, intention)
+            if path_guidance_list is not None and len(path_guidance_list) > 0:
+                guidance = path_guidance_list[0]
+        if guidance is None or not self.is_guidance_widget_present(guidance, widget_list):
+            return None
+        print(f'known guidance: {guidance}')
+        self.screen_graph_hit_count += 1
+        messages.append(self.construct_message('assistant', guidance))
+        return guidance
+
+    def generate_exploration_prompt(self, intention, current_screen_widgets, widget_tree):
         task_prompt = ('I have some test intentions to execute on an Android app. I will provide each intention one at '
                        'a time, and I need your assistance to complete these tests by answering my questions.')
 
         interactive_widget_index_list = self.get_interactive_widget_index_list(current_screen_widgets,
-                                                                               child_to_parent_node_dict)
-        current_screen_prompt = f'The current screen contains some widgets, listed as: {current_screen_widgets}.'
+                                                                               widget_tree)
+        if self.PROMPT_COMPACTION:
+            current_screen_prompt = (f'The current screen contains some widgets, listed as a table:\n'
+                                     f'{encode_widget_table(current_screen_widgets)}\n')
+        else:
+            current_screen_prompt = f'The current screen contains some widgets, listed as: {current_screen_widgets}.'
         intention_prompt = (
             f'Determine the necessary operation to fulfill the test intention: {intention}. '
             'If the intention cannot be achieved in a single step, feel free to explore the application further. '
@@ -514,15 +628,106 @@ class GPTClient:
             'Please limit your answer to one operation per response in the format <{Explore/Exact}, {Operation Type}, {Widget Index}, {InputValue/Empty}>. '
             'Example: <Explore, input, 3, YES>, <Exact, click, 0, Empty>, <Exact, back, -1, Empty>')
         exploration_prompt = f'{task_prompt} {current_screen_prompt} {intention_prompt}'
+        if self.EXPLORATION_PLAN_MODE:
+            exploration_prompt = f'{exploration_prompt} {self.generate_plan_prompt()}'
         return exploration_prompt
 
-    def perform_intention(self, intention_list, driver, current_migration_task_trace, desired_caps):
+    def generate_plan_prompt(self):
+        return ('Instead of a single operation, you may answer with a plan of up to '
+                f'{self.EXPLORATION_PLAN_MAX_STEP_COUNT} operations, one per line, if you can foresee the next screens. '
+                'Only the first operation uses the widget index, a later operation denotes its widget by the text, '
+                'content-desc or resource-id the widget will show, in quotes. '
+                'Follow every operation but the last by the text, content-desc or resource-id expected on the screen '
+                'after it, in the format [expect: "{Expected}"]. '
+                'Example: <Explore, click, 2, Empty> [expect: "Settings"]\n'
+                '<Explore, click, "Settings", Empty> [expect: "Dark mode"]\n<Exact, click, "Dark mode", Empty>')
+
+    def parse_exploration_plan(self, answer):
+        # e.g. <Explore, click, 2, Empty> [expect: "Settings"]\n<Exact, click, "Settings", Empty> --->
+        # [{guidance_type, operation_type, widget: '2', input_value, expect: 'Settings'}, {..., widget: '"Settings"'}]
+        plan_step_list = []
+        step_pattern = r'<\s*(\w+)\s*,\s*(\w+)\s*,\s*("[^"]*"|-?\d+)\s*,([^<>]*)>\s*(?:\[expect:\s*"?([^"\]]*)"?\s*\])?'
+        for match in re.finditer(step_pattern, answer):
+            plan_step_list.append({'guidance_type': match.group(1),
+                                   'operation_type': match.group(2),
+                                   'widget': match.group(3),
+                                   'input_value': match.group(4).strip(),
+                                   'expect': match.group(5).strip() if match.group(5) is not None else ''})
+        return plan_step_list[:self.EXPLORATION_PLAN_MAX_STEP_COUNT]
+
+    def find_widget_index(self, description, widget_list):
+        # the widget showing the text, content-desc or resource-id, -1 if there is none
+        description = description.strip().lower()
+        for index, widget in enumerate(widget_list):
+            resource_id = widget['resource-id'].lower()
+            if description in [widget['text'].strip().lower(), widget['content-desc'].strip().lower(), resource_id,
+                               resource_id.split('/')[-1]]:
+                return index
+        return -1
+
+    def is_plan_expectation_met(self, expect, widget_list):
+        expect = expect.lower()
+        return expect == '' or any(expect in f'{widget["text"]} {widget["content-desc"]} {widget["resource-id"]}'.lower()
+                                   for widget in widget_list)
+
+    def resolve_plan_step(self, plan_step, widget_list, is_first_step):
+        # the step in the single operation format with the widget index on the screen, None if its widget is not there
+        widget = plan_step['widget']
+        if widget.startswith('"'):
+            widget_index = self.find_widget_index(widget[1:-1], widget_list)
+            if widget_index == -1:
+                return None
+        else:
+            widget_index = int(widget)
+            # the index of a later step was given without seeing its screen
+            if not is_first_step and widget_index != -1:
+                return None
+        return f'<{plan_step["guidance_type"]}, {plan_step["operation_type"]}, {widget_index}, ' \
+               f'{plan_step["input_value"]}>'
+
+    def start_exploration_plan(self, exploration_answer, widget_list):
+        # (the answer to be performed now, the remaining steps of the plan)
+        plan_step_list = self.parse_exploration_plan(exploration_answer) if self.EXPLORATION_PLAN_MODE else []
+        if len(plan_step_list) == 0:
+            return exploration_answer, []
+        first_step_answer = self.resolve_plan_step(plan_step_list[0], widget_list, True)
+        if first_step_answer is None:
+            # the widget of the first step is unknown, it is left to the index based parsing
+            first_step_answer = f'<{plan_step_list[0]["guidance_type"]}, {plan_step_list[0]["operation_type"]}, -1, ' \
+                                f'{plan_step_list[0]["input_value"]}>'
+        return first_step_answer, plan_step_list
+
+    def follow_exploration_plan(self, plan_step_list, widget_list):
+        # (the answer of the next step, the reason the plan stops), plan_step_list starts with the step just performed
+        performed_step = plan_step_list.pop(0)
+        if not self.is_plan_expectation_met(performed_step['expect'], widget_list):
+            return None, f'"{performed_step["expect"]}" was expected on the screen after the operation but is not there.'
+        if len(plan_step_list) == 0:
+            return None, ''
+        next_step_answer = self.resolve_plan_step(plan_step_list[0], widget_list, False)
+        if next_step_answer is None:
+            return None, f'the widget {plan_step_list[0]["widget"]} of the next operation of your plan is not on the screen.'
+        return next_step_answer, ''
+
+    def perform_intention(self, intention_list, driver, current_migration_task_trace, desired_caps, checkpointer=None,
+                          transcript=None):
         start_time = time.time()
+        start_wait_time = self.ui_idle_waiter.get_total_wait_time()
+        start_prompt_index = len(self.prompt_token_count_list)
+        if checkpointer is None:
+            checkpointer = self.create_checkpointer(desired_caps, current_migration_task_trace.stem)
+        start_screen_graph_hit_count = self.screen_graph_hit_count
+        start_plan_step_hit_count = self.plan_step_hit_count
+        target_app_package = desired_caps['appPackage']
+        screen_graph = None
+        if self.SCREEN_GRAPH_MODE is not None:
+            screen_graph = get_screen_graph(self.SCREEN_GRAPH_PATH, target_app_package)
 
         gpt_guidance_path = Path(self.GPT_GUIDANCE_PATH)
         current_migration_gpt_guidance_path = gpt_guidance_path / current_migration_task_trace.stem
         guidance_txt_path = current_migration_gpt_guidance_path / 'gpt.txt'
         time_txt_path = current_migration_gpt_guidance_path / 'time.txt'
+        token_txt_path = current_migration_gpt_guidance_path / 'token.txt'
         if not current_migration_gpt_guidance_path.exists():
             current_migration_gpt_guidance_path.mkdir()
         if not guidance_txt_path.exists():
@@ -534,8 +739,6 @@ class GPTClient:
         exact_num = 0
         action_trace = []
         action_index = 0
-        # store the messages interacting with LLM
-        messages_list = []
         role_prompt = "You are an expert in Android."
         role_message = self.construct_message("system", role_prompt)
 
@@ -545,6 +748,7 @@ class GPTClient:
         for guidance in guidance_list:
             screenshot_before_path, screenshot_after_path, xml_before_path, xml_after_path = self.generate_screenshot_and_xml_path(
                 current_migration_task_trace, action_index)
+            PROFILER.set_context(step=action_index)
             action_index += 1
             current_widget_list, _ = self.capture_current_screen_widgets(driver)
             self.record_screenshot_and_xml(screenshot_before_path, xml_before_path, driver)
@@ -553,37 +757,56 @@ class GPTClient:
 
             if 'Exact' in guidance:
                 exact_num += 1
+        if checkpointer is not None:
+            checkpointer.save(len(guidance_list))
 
         # the guidance returned this time, corresponding to intention_list[exact_num:]
         additional_guidance_list = []
         recover_count = 0
         for intention_index, intention in enumerate(intention_list[exact_num:]):
+            PROFILER.set_context(intention=exact_num + intention_index)
 
             # exploration reasoning prompt
-            current_screen_widgets, child_to_parent_node_dict = self.capture_current_screen_widgets(driver)
+            current_screen_widgets, widget_tree = self.capture_current_screen_widgets(driver)
             exploration_prompt = self.generate_exploration_prompt(intention, current_screen_widgets,
-                                                                  child_to_parent_node_dict)
+                                                                  widget_tree)
             messages = [role_message, self.construct_message('user', exploration_prompt)]
-            exploration_answer = self.prompt(messages, messages_list)
+            exploration_answer = self.answer_from_known_guidance(screen_graph, intention, target_app_package,
+                                                                 current_screen_widgets, widget_tree, messages)
+            if exploration_answer is None:
+                exploration_answer = self.prompt(messages, transcript)
+            exploration_answer, plan_step_list = self.start_exploration_plan(exploration_answer,
+                                                                             current_screen_widgets)
             exploration_count = EXPLORATION_LIMIT
             current_exploration_guidance_list = []
-            app_package = get_current_package_name()
+            # (screen signature, guidance) of the steps, they become the decisions once the intention is complete
+            intention_decision_list = []
+            app_package = self.get_device_io(driver).get_foreground_package()
             while exploration_count != 0:
                 screenshot_before_path, screenshot_after_path, xml_before_path, xml_after_path = self.generate_screenshot_and_xml_path(
                     current_migration_task_trace, action_index)
+                PROFILER.set_context(step=action_index)
                 action_index += 1
-                before_screen_widget_list, _ = self.capture_current_screen_widgets(driver)
+                before_screen_widget_list, before_widget_tree = self.capture_current_screen_widgets(driver)
                 self.record_screenshot_and_xml(screenshot_before_path, xml_before_path, driver)
                 current_exploration_guidance = self.parse_and_perform_gpt_guidance(exploration_answer, driver,
                                                                                    action_trace,
                                                                                    before_screen_widget_list)
                 messages.append(self.construct_message('assistant', current_exploration_guidance))
                 current_exploration_guidance_list.append(current_exploration_guidance)
-                after_screen_widget_list, child_to_parent_node_dict = self.capture_current_screen_widgets(driver)
+                after_screen_widget_list, widget_tree = self.capture_current_screen_widgets(driver)
                 self.record_screenshot_and_xml(screenshot_after_path, xml_after_path, driver)
+                if screen_graph is not None:
+                    before_signature = self.get_screen_signature(target_app_package, before_screen_widget_list,
+                                                                 before_widget_tree)
+                    after_signature = self.get_screen_signature(target_app_package, after_screen_widget_list,
+                                                                widget_tree)
+                    screen_graph.add_edge(before_signature, action_trace[-1], current_exploration_guidance,
+                                          after_signature)
+                    intention_decision_list.append((before_signature, current_exploration_guidance))
 
                 # go out of the app, stop explore, kill intention, and recover
-                current_package = get_current_package_name()
+                current_package = self.get_device_io(driver).get_foreground_package()
                 if current_package == '':
                     current_package = app_package
                 if app_package != current_package:
@@ -596,37 +819,78 @@ class GPTClient:
                 if is_current_intention_complete:
                     break
 
+                # the next step of the plan while the screen is the expected one
+                plan_stop_reason = ''
+                if len(plan_step_list) > 0:
+                    exploration_answer, plan_stop_reason = self.follow_exploration_plan(plan_step_list,
+                                                                                        after_screen_widget_list)
+                    if exploration_answer is not None:
+                        self.plan_step_hit_count += 1
+                        exploration_count -= 1
+                        continue
+                    plan_step_list = []
+
                 # ask for more steps for exploration to complete the test intention
                 more_exploration_prompt = self.generate_more_exploration_prompt(before_screen_widget_list,
                                                                                 after_screen_widget_list,
-                                                                                child_to_parent_node_dict)
+                                                                                widget_tree, plan_stop_reason)
                 messages.append(self.construct_message("user", more_exploration_prompt))
-                exploration_answer = self.prompt(messages, messages_list)
+                exploration_answer = self.answer_from_known_guidance(screen_graph, intention, target_app_package,
+                                                                     after_screen_widget_list, widget_tree,
+                                                                     messages)
+                if exploration_answer is None:
+                    exploration_answer = self.prompt(messages, transcript)
+                exploration_answer, plan_step_list = self.start_exploration_plan(exploration_answer,
+                                                                                 after_screen_widget_list)
                 exploration_count -= 1
 
             # exploration exceed the limit number, recover the original steps
             if exploration_count == 0:
+                # the decisions that led here are not reused
+                if screen_graph is not None:
+                    for decision_signature, _ in intention_decision_list:
+                        screen_graph.remove_decision(decision_signature, intention)
                 recovered_guidance_list = guidance_list.copy()
                 recovered_guidance_list.extend(additional_guidance_list)
                 driver, action_index = self.recover_app(recovered_guidance_list, driver, desired_caps, action_index,
-                                                        current_migration_task_trace, action_trace)
+                                                        current_migration_task_trace, action_trace, checkpointer)
                 recover_count += 1
                 additional_guidance_list.extend(['<Skip>'])
                 continue
 
             additional_guidance_list.extend(current_exploration_guidance_list)
-
+            if screen_graph is not None:
+                for decision_signature, decision_guidance in intention_decision_list:
+                    screen_graph.add_decision(decision_signature, intention, decision_guidance)
+            if checkpointer is not None:
+                checkpointer.save(len(guidance_list) + len(additional_guidance_list))
+
+        PROFILER.set_context(intention=None, step=None)
+        if checkpointer is not None:
+            checkpointer.clear()
         end_time = time.time()
         execution_time = end_time - start_time
-        # minus sleep time
-        execution_time -= (action_index * self.ACTION_SLEEP_INTERVAL)
         with open(time_txt_path, mode='w', encoding='utf-8') as f:
             f.write(str(execution_time))
+        # the prompt tokens of the requests sent by this task
+        prompt_token_count = sum(self.prompt_token_count_list[start_prompt_index:])
+        with open(token_txt_path, mode='w', encoding='utf-8') as f:
+            f.write(str(prompt_token_count))
+        print(f'prompt tokens: {prompt_token_count}')
+        # part of the execution time, the wait is as long as the screen needs
+        print(f'wait for idle in total: {self.ui_idle_waiter.get_total_wait_time() - start_wait_time:.2f}s')
+        print(f'LLM cache: {self.llm_response_cache.get_stats()}')
+        if self.EXPLORATION_PLAN_MODE:
+            print(f'plan steps followed without LLM: {self.plan_step_hit_count - start_plan_step_hit_count}')
+        if screen_graph is not None:
+            screen_graph.store()
+            print(f'screen graph: {screen_graph.get_stats()}, '
+                  f'{self.screen_graph_hit_count - start_screen_graph_hit_count} answers reused')
         # store the additional guidance produced this time
         with open(guidance_txt_path, mode='a', encoding='utf-8') as f:
             for additional_guidance in additional_guidance_list:
                 f.write(additional_guidance + '\n')
-        return action_trace, messages_list
+        return action_trace
 
     def perform_gpt_guidance(self, driver, current_task_gpt_trace_folder_path):
         gpt_guidance_path = Path(self.GPT_GUIDANCE_PATH)
@@ -666,7 +930,8 @@ class GPTClient:
         return xml_before_path_list, xml_after_path_list
 
     def generate_oracle_from_gpt_trace(self, current_task_gpt_trace_folder_path, test_case,
-                                       current_task_original_trace_folder_path, current_task_oracle_folder_path):
+                                       current_task_original_trace_folder_path, current_task_oracle_folder_path,
+                                       transcript=None):
 
         old_xml_before_path_list, old_xml_after_path_list = self.get_trace_xml_path_list(
             current_task_original_trace_folder_path)
@@ -682,8 +947,6 @@ class GPTClient:
         with open(guidance_txt_path, mode='r', encoding='utf-8') as f:
             guidance_list = f.readlines()
 
-        # store the messages interacting with LLM
-        messages_list = []
 
         # perform all the guidance to get the action trace, skip will also be performed
         print(f'guidance_list: {guidance_list}')
@@ -696,7 +959,12 @@ class GPTClient:
                 executed_gui_event_index_list.append(index)
 
         start_time = time.time()
+        start_prompt_index = len(self.prompt_token_count_list)
         oracle_list = []
+        # the widget-relevant oracles to be migrated with the LLM
+        oracle_job_list = []
+        # precompute the widget list of every referenced screen once
+        xml_path_to_widget_list = {}
         # recognize the position of oracle events, perform oracles
         gui_event_index = -1
         print(f'test_case: {test_case}')
@@ -708,10 +976,10 @@ class GPTClient:
                 continue
             if event_type != 'oracle':
                 continue
-            resource_id = event['resource-id']
-            content_desc = event['content-desc']
-            text = event['text']
             oracle_type, oracle_time, oracle_locator_type, oracle_locator = action
+            oracle_list.append(f'<{oracle_type},{oracle_time},{oracle_locator_type},{oracle_locator}>')
+            if not self.is_widget_relevant_oracle(action):
+                continue
 
             # old trace contains oracle event while the gpt trace does not
             if index == 0:
@@ -721,35 +989,139 @@ class GPTClient:
                 old_xml_path = old_xml_after_path_list[index]
                 executed_gui_event_index = executed_gui_event_index_list[gui_event_index]
                 new_xml_path = new_xml_after_path_list[executed_gui_event_index]
-            oracle_prompt, new_widget_list = self.generate_oracle_prompt(old_xml_path, new_xml_path, action,
-                                                                         resource_id, content_desc, text)
+            for xml_path in [old_xml_path, new_xml_path]:
+                if xml_path not in xml_path_to_widget_list:
+                    xml_path_to_widget_list[xml_path] = self.get_widget_list_from_xml(xml_path)
+            oracle_job_list.append({'oracle_index': len(oracle_list) - 1,
+                                    'event': event,
+                                    'old_xml_path': old_xml_path,
+                                    'new_xml_path': new_xml_path})
+
+        # the widgets matched confidently by their features, the others are left to the LLM
+        llm_oracle_job_list = []
+        for oracle_job in oracle_job_list:
+            widget_index, confidence = None, 0.0
+            if self.ORACLE_PRE_MATCHING:
+                widget_index, confidence = match_widget(oracle_job['event'],
+                                                        xml_path_to_widget_list[oracle_job['old_xml_path']],
+                                                        xml_path_to_widget_list[oracle_job['new_xml_path']],
+                                                        ORACLE_MATCH_THRESHOLD, ORACLE_MATCH_MARGIN)
+            oracle_job['widget_index'] = widget_index
+            # the source of the answer, e.g. [matcher:0.97] or [llm]
+            oracle_job['answer_source'] = f'[matcher:{confidence:.2f}]'
+            if widget_index is None:
+                oracle_job['answer_source'] = '[llm]'
+                llm_oracle_job_list.append(oracle_job)
+        print(f'{len(oracle_job_list) - len(llm_oracle_job_list)} of {len(oracle_job_list)} oracles matched without LLM')
+
+        # widget-relevant, the answer should be the index
+        if self.ORACLE_MIGRATION_MODE == 'batched':
+            widget_index_list = self.migrate_oracles_in_batch(llm_oracle_job_list, xml_path_to_widget_list,
+                                                              role_message, transcript)
+        else:
+            messages_batch = []
+            for oracle_job in llm_oracle_job_list:
+                event = oracle_job['event']
+                oracle_prompt = self.generate_oracle_prompt(xml_path_to_widget_list[oracle_job['old_xml_path']],
+                                                            xml_path_to_widget_list[oracle_job['new_xml_path']],
+                                                            event['action'], event['resource-id'],
+                                                            event['content-desc'], event['text'])
+                messages_batch.append([role_message, self.construct_message('user', oracle_prompt)])
+            if self.ORACLE_MIGRATION_MODE == 'concurrent':
+                oracle_answer_list = self.prompt_batch(messages_batch, transcript)
+            else:
+                oracle_answer_list = [self.prompt(messages, transcript) for messages in messages_batch]
+            widget_index_list = [self.parse_oracle_answer(oracle_answer) for oracle_answer in oracle_answer_list]
+        for oracle_job, widget_index in zip(llm_oracle_job_list, widget_index_list):
+            oracle_job['widget_index'] = widget_index
+
+        for oracle_job in oracle_job_list:
+            widget_index = oracle_job['widget_index']
+            new_widget_list = xml_path_to_widget_list[oracle_job['new_xml_path']]
             print(f'new_widget_list: {new_widget_list}')
-
-            oracle_answer = ''
-            oracle = f'<{oracle_type},{oracle_time},{oracle_locator_type},{oracle_locator}>'
-            # widget-relevant, the answer should be the index
-            if oracle_prompt != '':
-                messages = [role_message, self.construct_message('user', oracle_prompt)]
-                oracle_answer = self.prompt(messages, messages_list)
-                widget_index = self.parse_oracle_answer(oracle_answer)
-                if widget_index != -1:
-                    new_widget = new_widget_list[widget_index]
-                else:
-                    new_widget = ''
-                # store in the oracle folder
-                oracle = f'<{oracle_type},{oracle_time},{new_widget}>'
-
-            oracle_list.append(oracle)
+            if 0 <= widget_index < len(new_widget_list):
+                new_widget = new_widget_list[widget_index]
+            else:
+                new_widget = ''
+            oracle_type, oracle_time, _, _ = oracle_job['event']['action']
+            # store in the oracle folder
+            oracle_list[oracle_job['oracle_index']] = (f'<{oracle_type},{oracle_time},{new_widget}> '
+                                                       f'{oracle_job["answer_source"]}')
 
         end_time = time.time()
         execution_time = end_time - start_time
         time_txt_path = current_task_oracle_folder_path / 'time.txt'
         if not time_txt_path.exists():
             time_txt_path.touch()
+        token_txt_path = current_task_oracle_folder_path / 'token.txt'
         with open(time_txt_path, mode='w', encoding='utf-8') as f:
             f.write(str(execution_time))
-
-        return oracle_list, messages_list
+        # the prompt tokens of the requests sent by this task
+        prompt_token_count = sum(self.prompt_token_count_list[start_prompt_index:])
+        with open(token_txt_path, mode='w', encoding='utf-8') as f:
+            f.write(str(prompt_token_count))
+        print(f'prompt tokens: {prompt_token_count}')
+        print(f'LLM cache: {self.llm_response_cache.get_stats()}')
+        self.store_widget_list_cache()
+
+        return oracle_list
+
+    def migrate_oracles_in_batch(self, oracle_job_list, xml_path_to_widget_list, role_message, transcript):
+        # the oracles sharing the same new screen are packed into one prompt, the prompts are sent concurrently
+        new_xml_path_to_oracle_job_index_list = {}
+        for oracle_job_index, oracle_job in enumerate(oracle_job_list):
+            new_xml_path_to_oracle_job_index_list.setdefault(oracle_job['new_xml_path'], []).append(oracle_job_index)
+
+        messages_batch = []
+        for new_xml_path, oracle_job_index_list in new_xml_path_to_oracle_job_index_list.items():
+            job_list = [oracle_job_list[x] for x in oracle_job_index_list]
+            if len(job_list) == 1:
+                event = job_list[0]['event']
+                oracle_prompt = self.generate_oracle_prompt(xml_path_to_widget_list[job_list[0]['old_xml_path']],
+                                                            xml_path_to_widget_list[new_xml_path], event['action'],
+                                                            event['resource-id'], event['content-desc'],
+                                                            event['text'])
+            else:
+                oracle_prompt = self.generate_batched_oracle_prompt(job_list, xml_path_to_widget_list)
+            messages_batch.append([role_message, self.construct_message('user', oracle_prompt)])
+        oracle_answer_list = self.prompt_batch(messages_batch, transcript)
+
+        widget_index_list = [-1] * len(oracle_job_list)
+        # the oracles of the batched answers without an answer for every assertion are asked one by one
+        fallback_oracle_job_index_list = []
+        for oracle_job_index_list, oracle_answer in zip(new_xml_path_to_oracle_job_index_list.values(),
+                                                        oracle_answer_list):
+            if len(oracle_job_index_list) == 1:
+                answer_index_list = [self.parse_oracle_answer(oracle_answer)]
+            else:
+                answer_index_list = self.parse_batched_oracle_answer(oracle_answer, len(oracle_job_index_list))
+            if answer_index_list is None:
+                print(f'expect an answer for each of the {len(oracle_job_index_list)} assertions, ask them one by one')
+                fallback_oracle_job_index_list.extend(oracle_job_index_list)
+                continue
+            for oracle_job_index, widget_index in zip(oracle_job_index_list, answer_index_list):
+                widget_index_list[oracle_job_index] = widget_index
+
+        if len(fallback_oracle_job_index_list) == 0:
+            return widget_index_list
+        messages_batch = []
+        for oracle_job_index in fallback_oracle_job_index_list:
+            oracle_job = oracle_job_list[oracle_job_index]
+            event = oracle_job['event']
+            oracle_prompt = self.generate_oracle_prompt(xml_path_to_widget_list[oracle_job['old_xml_path']],
+                                                        xml_path_to_widget_list[oracle_job['new_xml_path']],
+                                                        event['action'], event['resource-id'], event['content-desc'],
+                                                        event['text'])
+            messages_batch.append([role_message, self.construct_message('user', oracle_prompt)])
+        for oracle_job_index, oracle_answer in zip(fallback_oracle_job_index_list,
+                                                   self.prompt_batch(messages_batch, transcript)):
+            widget_index_list[oracle_job_index] = self.parse_oracle_answer(oracle_answer)
+        return widget_index_list
+
+    def is_widget_relevant_oracle(self, action):
+        oracle_type = action[0]
+        # text-related oracles are kept as they are
+        return oracle_type not in ['wait_until_text_presence', 'wait_until_text_invisible']
 
     def parse_oracle_answer(self, oracle_answer):
         if '<index:-1>' in oracle_answer or '<index:>' in oracle_answer:
@@ -758,19 +1130,45 @@ class GPTClient:
         oracle_answer = re.search(pattern, oracle_answer).group().replace('<', '').replace('>', '')
         return int(oracle_answer.split(':')[1].strip())
 
-    def generate_oracle_prompt(self, old_xml_path, new_xml_path, action, resource_id, content_desc, text):
-        oracle_type, oracle_time, oracle_locator_type, oracle_locator = action
-        # Handling text-related oracles directly
-        if oracle_type in ['wait_until_text_presence', 'wait_until_text_invisible']:
-            return '', []
+    def parse_batched_oracle_answer(self, oracle_answer, assertion_count):
+        # e.g. <assertion 1, index:3> <assertion 2, index:-1> <assertion 3, index:> ---> [3, -1, -1], None unless
+        # every assertion has an answer
+        answer_dict = {}
+        for number, answer in re.findall(r'<\s*assertion\s*(\d+)\s*,\s*index:\s*(-?\d*)\s*>', oracle_answer,
+                                         re.IGNORECASE):
+            # the reasoning comes first, the last answer of an assertion is the final one
+            answer_dict[int(number)] = int(answer) if answer != '' else -1
+        if sorted(answer_dict) != list(range(1, assertion_count + 1)):
+            return None
+        return [answer_dict[number] for number in range(1, assertion_count + 1)]
+
+    def generate_batched_oracle_prompt(self, oracle_job_list, xml_path_to_widget_list):
+        task_prompt = 'Assist in transferring several test assertions from one app to another based on the provided details.'
+        old_oracle_prompt = 'Each original assertion checks for the presence of a GUI element.'
+        old_element_prompt_list = []
+        for oracle_job_index, oracle_job in enumerate(oracle_job_list):
+            event = oracle_job['event']
+            old_widget_list = xml_path_to_widget_list[oracle_job['old_xml_path']]
+            old_element_prompt_list.append(
+                f'Assertion {oracle_job_index + 1}: the original element is identified by <resource-id:{event["resource-id"]}, '
+                f'content-desc:{event["content-desc"]}, text:{event["text"]}> within a GUI containing: {old_widget_list}')
+        new_widget_list = xml_path_to_widget_list[oracle_job_list[0]['new_xml_path']]
+        new_question_prompt = f'For each assertion, identify a corresponding element in the new GUI that fulfills a similar role. The new GUI contains: {new_widget_list}'
+        answer_prompt = (f"Let's think step by step. Provide the index of the matching element from the new widget list for each of the {len(oracle_job_list)} assertions. "
+                         "The index starts from 0. If there is no matching widget, return -1. "
+                         "The format of each answer should be <assertion {Assertion Number}, index:{Index}>, e.g. "
+                         "<assertion 1, index:0> <assertion 2, index:-1> <assertion 3, index:5>")
+        prompt = f"{task_prompt} {old_oracle_prompt} {' '.join(old_element_prompt_list)} {new_question_prompt} {answer_prompt}"
+        print(prompt)
+        print('================================================================================')
+        return prompt
 
+    def generate_oracle_prompt(self, old_widget_list, new_widget_list, action, resource_id, content_desc, text):
         # Task description for transferring test assertions between apps
         task_prompt = 'Assist in transferring a test assertion from one app to another based on the provided details.'
 
         # Describing the original oracle and task for element presence
         old_oracle_prompt = 'Original assertion checks for the presence of a GUI element.'
-        old_widget_list = self.get_widget_list_from_xml(old_xml_path)
-        new_widget_list = self.get_widget_list_from_xml(new_xml_path)
 
         # Constructing the prompts for old and new elements
         old_element_prompt = f'This original element is identified by <resource-id:{resource_id}, content-desc:{content_desc}, text:{text}> within a GUI containing: {old_widget_list}'
@@ -784,31 +1182,28 @@ class GPTClient:
         print(prompt)
         print('================================================================================')
 
-        return prompt, new_widget_list
+        return prompt
 
     def get_widget_list_from_xml(self, xml_path):
+        if self.WIDGET_LIST_CACHE_MODE is None:
+            return self.load_widget_list_from_xml(xml_path)
+        # the widgets are shared with the other users of the cache, the list is not
+        return list(get_widget_list_cache().get(xml_path, 'widget_list', self.load_widget_list_from_xml,
+                                                self.WIDGET_LIST_CACHE_MODE == 'sidecar'))
+
+    def store_widget_list_cache(self):
+        if self.WIDGET_LIST_CACHE_MODE == 'sidecar':
+            get_widget_list_cache().flush()
+        if self.WIDGET_LIST_CACHE_MODE is not None:
+            print(f'widget list cache: {get_widget_list_cache().get_stats()}')
+
+    def load_widget_list_from_xml(self, xml_path):
         widget_list = []
-        tree = ET.ElementTree(file=xml_path)
-        root = tree.getroot()
-        xml_node_list = []
-        child_xml_node_list = []
-        self.get_child_node_list(root, child_xml_node_list)
-        xml_node_list.extend(child_xml_node_list)
-        node_attrib_list = ['class', 'resource-id', 'content-desc', 'text']
-        for xml_node in xml_node_list:
-            widget = {}
-            for node_attrib in node_attrib_list:
-                if node_attrib in xml_node.attrib:
-                    widget[node_attrib] = xml_node.attrib[node_attrib]
-                else:
-                    widget[node_attrib] = ''
+        for widget in parse_hierarchy_file(xml_path).get_leaf_widget_list(XML_WIDGET_KEYS):
             if self.is_empty_widget(widget):
                 continue
+            widget.index = len(widget_list)
             widget_list.append(widget)
-
-        # add index into the list
-        for index, widget in enumerate(widget_list):
-            widget['index'] = index
         return widget_list
 
     def is_empty_widget(self, widget):
@@ -818,10 +1213,12 @@ class GPTClient:
             return True
         return False
 
-    def connect_device(self, desired_caps):
-        appium_server_url = 'http://localhost:4723'
-        driver = webdriver.Remote(appium_server_url, options=UiAutomator2Options().load_capabilities(desired_caps))
-        time.sleep(15)
+    @profiled('connect')
+    def connect_device(self, desired_caps, reset_app=True):
+        # a warm session of the device is reused, the app state is reset instead
+        driver = self.driver_pool.acquire(self.appium_server_url, desired_caps, reset_app)
+        self.invalidate_screen_snapshot()
+        self.wait_for_idle(driver, DEVICE_CONNECT_TIMEOUT)
         return driver
 
     def hide_keyboard(self, driver):
@@ -831,13 +1228,39 @@ class GPTClient:
             except WebDriverException:
                 pass
 
+    def create_checkpointer(self, desired_caps, task_name):
+        if self.CHECKPOINT_MODE == 'emulator_snapshot':
+            serial = desired_caps['udid'] if 'udid' in desired_caps else desired_caps['deviceName']
+            return EmulatorSnapshotCheckpointer(AdbDevice(serial), task_name)
+        return None
+
+    def reattach_device(self, driver, desired_caps):
+        # the restored device may have dropped the session
+        try:
+            self.get_screen_snapshot(driver).refresh()
+            return driver
+        except WebDriverException:
+            pass
+        self.driver_pool.discard(driver)
+        # the new session must neither reset nor relaunch the restored app
+        reattach_caps = dict(desired_caps)
+        reattach_caps['noReset'] = True
+        reattach_caps['autoLaunch'] = False
+        reattach_caps.pop('autoGrantPermissions', None)
+        return self.connect_device(reattach_caps, reset_app=False)
+
     def recover_app(self, recovered_guidance_list, driver, desired_caps, action_index, current_migration_task_trace,
-                    action_trace):
+                    action_trace, checkpointer=None):
         self.hide_keyboard(driver)
-        driver.quit()
-        time.sleep(1)
+        checkpoint_guidance_count = checkpointer.restore() if checkpointer is not None else -1
+        if checkpoint_guidance_count >= 0:
+            # only the guidance performed after the checkpoint is replayed
+            new_driver = self.reattach_device(driver, desired_caps)
+            recovered_guidance_list = recovered_guidance_list[checkpoint_guidance_count:]
+        else:
+            # the pooled session is kept, the app is reset and relaunched
+            new_driver = self.connect_device(desired_caps)
         print(recovered_guidance_list)
-        new_driver = self.connect_device(desired_caps)
         for guidance in recovered_guidance_list:
             screenshot_before_path, screenshot_after_path, xml_before_path, xml_after_path = self.generate_screenshot_and_xml_path(
                 current_migration_task_trace, action_index)
@@ -849,35 +1272,28 @@ class GPTClient:
             self.record_screenshot_and_xml(screenshot_after_path, xml_after_path, new_driver)
         return new_driver, action_index
 
-    def generate_more_exploration_prompt(self, before_screen_info, after_screen_info, child_to_parent_node_dict):
+    def generate_more_exploration_prompt(self, before_screen_info, after_screen_info, widget_tree, plan_stop_reason=''):
         interactive_widget_index_list = self.get_interactive_widget_index_list(after_screen_info,
-                                                                               child_to_parent_node_dict)
+                                                                               widget_tree)
 
+        if self.PROMPT_COMPACTION:
+            screen_prompt = (f'Before the operation, the GUI screen displayed these widgets:\n'
+                             f'{encode_widget_table(before_screen_info)}\nAfter the operation, the current screen '
+                             f'displays {encode_screen_diff(before_screen_info, after_screen_info)}\n')
+        else:
+            screen_prompt = (f'Before the operation, the GUI screen displayed: {before_screen_info}. After the '
+                             f'operation, the current screen displays: {after_screen_info}.')
         more_prompt = (
-            f'Before the operation, the GUI screen displayed: {before_screen_info}. After the operation, '
-            f'the current screen displays: {after_screen_info}. Since your are exploring the app, please give '
+            f'{screen_prompt} Since your are exploring the app, please give '
             'me one more operation in the format <{Explore/Exact}, {Operation Type}, {Widget Index}, {InputValue/Empty}>. '
             'Please think step by step. '
             f'For widgets, you have these indexes to choose from: {interactive_widget_index_list}.')
+        if plan_stop_reason != '':
+            more_prompt = f'Your plan is stopped since {plan_stop_reason} {more_prompt}'
+        if self.EXPLORATION_PLAN_MODE:
+            more_prompt = f'{more_prompt} {self.generate_plan_prompt()}'
         return more_prompt
 
-    def get_child_node_list(self, root, child_node_list):
-        has_child = False
-        for child in root:
-            has_child = True
-            self.get_child_node_list(child, child_node_list)
-
-        if not has_child:
-            child_node_list.append(root)
-
-    def get_parent_node_list(self, root, parent_node_list):
-        has_child = False
-        for child in root:
-            has_child = True
-            self.get_parent_node_list(child, parent_node_list)
-        if has_child:
-            parent_node_list.append(root)
-
     def generate_gui_script(self, action_trace):
         gui_event_script_list = []
 
@@ -911,7 +1327,7 @@ class GPTClient:
 
         return gui_event_script_list
 
-    def generate_test_intention(self, action_trace, screen_before_path_list, screen_after_path_list):
+    def generate_test_intention(self, action_trace, screen_before_path_list, screen_after_path_list, transcript=None):
         start_time = time.time()
         task_prompt = ('I have an execution trace of a test script for an Android app. Your task is to analyze the '
                        'trace and identify the test intention behind each test action of the trace. For each action, your response should include any '
@@ -924,6 +1340,7 @@ class GPTClient:
         example_prompt_3 = '<Intent: navigate from the current web page back to the previous web page>'
         gui_event_prompt_list = self.generate_gui_event_prompt(action_trace, screen_before_path_list,
                                                                screen_after_path_list)
+        self.store_widget_list_cache()
 
         print(f'{task_prompt} {requirement_prompt}')
 
@@ -934,22 +1351,76 @@ class GPTClient:
             print('=============================================================================')
             print()
 
-        responses = []
         role_message = self.construct_message('system', "You are an expert in Android.")
-        messages = [role_message]
-        messages.append(self.construct_message('user',
-                                               f'{task_prompt} {requirement_prompt} {example_prompt_1} {example_prompt_2} {example_prompt_3}'))
+        task_message = self.construct_message('user',
+                                              f'{task_prompt} {requirement_prompt} {example_prompt_1} {example_prompt_2} {example_prompt_3}')
 
-        for gui_event_prompt in alive_it(gui_event_prompt_list, force_tty=True, total=len(gui_event_prompt_list),
-                                         title='GUI Event Prompt'):
-            messages.append(self.construct_message('user', f'{gui_event_prompt}'))
-            response = openai.ChatCompletion.create(
-                model=self.MODEL,
-                messages=messages,
-            )
-            response_text = response['choices'][0]['message']['content'].strip()
-            responses.append(response_text)
-            messages.append({"role": "assistant", "content": response_text})
+        if self.INTENTION_CONTEXT_MODE == 'full':
+            responses = self.generate_test_intention_in_full(gui_event_prompt_list, role_message, task_message,
+                                                             transcript)
+        else:
+            responses = None
+            if self.INTENTION_CONTEXT_MODE == 'batch':
+                responses = self.generate_test_intention_in_batch(gui_event_prompt_list, role_message, task_message,
+                                                                  transcript)
+            # the batched answer falls back to the window
+            if responses is None:
+                responses = self.generate_test_intention_in_window(gui_event_prompt_list, role_message,
+                                                                   task_message, transcript)
         end_time = time.time()
         execution_time = end_time - start_time
         return responses, execution_time
+
+    def generate_test_intention_in_full(self, gui_event_prompt_list, role_message, task_message, transcript=None):
+        responses = []
+        messages = [role_message, task_message]
+        for gui_event_prompt in alive_it(gui_event_prompt_list, force_tty=True, total=len(gui_event_prompt_list),
+                                         title='GUI Event Prompt'):
+            messages.append(self.construct_message('user', f'{gui_event_prompt}'))
+            responses.append(self.prompt(messages, transcript))
+        return responses
+
+    def generate_test_intention_in_window(self, gui_event_prompt_list, role_message, task_message, transcript=None):
+        # only the last events are sent in full, the earlier ones are represented by their intentions
+        responses = []
+        for event_index, gui_event_prompt in alive_it(enumerate(gui_event_prompt_list), force_tty=True,
+                                                      total=len(gui_event_prompt_list), title='GUI Event Prompt'):
+            window_start = max(0, event_index - self.INTENTION_WINDOW_SIZE)
+            messages = [role_message, task_message]
+            if window_start > 0:
+                summary_prompt = (f'The intentions of the first {window_start} test actions are: '
+                                  f'{self.summarize_intention_list(responses[:window_start])}')
+                messages.append(self.construct_message('user', summary_prompt))
+            for previous_index in range(window_start, event_index):
+                messages.append(self.construct_message('user', gui_event_prompt_list[previous_index]))
+                messages.append(self.construct_message('assistant', responses[previous_index]))
+            messages.append(self.construct_message('user', gui_event_prompt))
+            responses.append(self.prompt(messages, transcript))
+        return responses
+
+    def summarize_intention_list(self, response_list):
+        intention_list = []
+        for response in response_list:
+            intention = re.search(r'<Intent:[^<>]*>', response)
+            intention_list.append(intention.group() if intention is not None else response)
+        return ' '.join(f'{index + 1}. {intention}' for index, intention in enumerate(intention_list))
+
+    def generate_test_intention_in_batch(self, gui_event_prompt_list, role_message, task_message, transcript=None):
+        # None if the answer does not contain one intention per event
+        messages = [role_message, task_message,
+                    self.construct_message('user', self.generate_batched_intention_prompt(gui_event_prompt_list))]
+        responses = self.parse_batched_intention_answer(self.prompt(messages, transcript))
+        if len(responses) != len(gui_event_prompt_list):
+            print(f'{len(responses)} intentions for {len(gui_event_prompt_list)} test actions, ask them one by one')
+            return None
+        return responses
+
+    def generate_batched_intention_prompt(self, gui_event_prompt_list):
+        event_prompt_list = [f'Test action {index + 1}: {gui_event_prompt}' for index, gui_event_prompt in
+                             enumerate(gui_event_prompt_list)]
+        answer_prompt = (f'Give the test intention of each of the {len(gui_event_prompt_list)} test actions in the '
+                         f'order of the actions, one <Intent: {{Your answer}}> per action.')
+        return f"{' '.join(event_prompt_list)} {answer_prompt}"
+
+    def parse_batched_intention_answer(self, intention_answer):
+        return re.findall(r'<Intent:[^<>]*>', intention_answer)
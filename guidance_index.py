@@ -0,0 +1,110 @@
+import math
+import re
+
+import numpy as np
+
+INTENTION_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize_intention(intention):
+    # e.g. <Intent: click the "Sign In" button> ---> ['click', 'the', 'sign', 'in', 'button']
+    return INTENTION_TOKEN_PATTERN.findall(intention.lower().replace('<intent:', ''))
+
+
+def normalize_rows(matrix):
+    norm = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norm[norm == 0] = 1
+    return matrix / norm
+
+
+# TF-IDF vectors of the intentions, fitted on the indexed intentions, the words never indexed are left out of a query
+class TfidfEmbedder:
+
+    def __init__(self):
+        # word -> column
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+
+    def fit(self, text_list):
+        document_frequency = {}
+        for text in text_list:
+            for token in set(tokenize_intention(text)):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.vocabulary = {token: column for column, token in enumerate(sorted(document_frequency))}
+        # the smoothed idf, a word in every intention still counts a little
+        self.idf = np.array([math.log((1 + len(text_list)) / (1 + document_frequency[token])) + 1
+                             for token in sorted(document_frequency)], dtype=np.float32)
+
+    def embed(self, text_list):
+        matrix = np.zeros((len(text_list), len(self.vocabulary)), dtype=np.float32)
+        # the words never indexed have no column, they still count in the norm at the highest idf so that a query
+        # differing in its key word, e.g. "Sign Up" for "Sign In", scores lower
+        unseen_count_list = [{} for _ in text_list]
+        for row, text in enumerate(text_list):
+            for token in tokenize_intention(text):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    matrix[row, column] += 1
+                else:
+                    unseen_count_list[row][token] = unseen_count_list[row].get(token, 0) + 1
+        matrix = matrix * self.idf
+        max_idf = float(self.idf.max()) if len(self.idf) > 0 else 1.0
+        unseen_square_array = np.array([sum((count * max_idf) ** 2 for count in unseen_count.values())
+                                        for unseen_count in unseen_count_list], dtype=np.float32)
+        norm = np.sqrt((matrix ** 2).sum(axis=1) + unseen_square_array)
+        norm[norm == 0] = 1
+        return matrix / norm[:, None]
+
+
+# Embeddings of a local sentence-transformers model, e.g. all-MiniLM-L6-v2
+class SentenceTransformerEmbedder:
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def fit(self, text_list):
+        pass
+
+    def embed(self, text_list):
+        return normalize_rows(np.asarray(self.model.encode(text_list), dtype=np.float32))
+
+
+def create_embedder(name):
+    # 'tfidf' or the name of a sentence-transformers model
+    if name == 'tfidf':
+        return TfidfEmbedder()
+    return SentenceTransformerEmbedder(name)
+
+
+# Brute-force cosine search over the intentions of the guidance that completed an intention, only the guidance
+# given on the same screen is a candidate
+class GuidanceIndex:
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.signature_array = np.zeros(0, dtype=object)
+        self.intention_list = []
+        self.guidance_list = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def build(self, decision_list):
+        # decision_list: [(signature, intention, guidance)], e.g. the decisions of the screen graph
+        self.signature_array = np.array([signature for signature, _, _ in decision_list], dtype=object)
+        self.intention_list = [intention for _, intention, _ in decision_list]
+        self.guidance_list = [guidance for _, _, guidance in decision_list]
+        self.embedder.fit(self.intention_list)
+        self.matrix = self.embedder.embed(self.intention_list) if len(decision_list) > 0 else self.matrix
+
+    def query(self, intention, signature, threshold):
+        # (guidance, similarity, indexed intention) of the most similar intention on the screen, None if below the
+        # threshold
+        row_array = np.flatnonzero(self.signature_array == signature)
+        if len(row_array) == 0:
+            return None
+        similarity_array = self.matrix[row_array] @ self.embedder.embed([intention])[0]
+        best = int(np.argmax(similarity_array))
+        if similarity_array[best] < threshold:
+            return None
+        row = int(row_array[best])
+        return self.guidance_list[row], float(similarity_array[best]), self.intention_list[row]
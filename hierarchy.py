@@ -0,0 +1,109 @@
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from widget import Widget, WidgetTree
+
+
+# The parsed GUI hierarchy, the leaves, the parents and the parent links are collected in one streaming pass over the
+# xml instead of walking the built tree recursively
+class Hierarchy:
+
+    def __init__(self):
+        self.root = None
+        # the element of a node is element_list[node_index], in the document order
+        self.element_list = []
+        self.widget_tree = WidgetTree()
+        # the leaves in the document order
+        self.child_node_index_list = []
+        self.child_node_list = []
+        # the nodes having children, in the post order
+        self.parent_node_list = []
+
+    def feed_events(self, event_iter):
+        node_index_stack = []
+        for event, element in event_iter:
+            if event == 'start':
+                parent_index = node_index_stack[-1] if node_index_stack else -1
+                node_index = self.widget_tree.add_node(element.attrib, parent_index)
+                self.element_list.append(element)
+                node_index_stack.append(node_index)
+                if self.root is None:
+                    self.root = element
+            else:
+                node_index = node_index_stack.pop()
+                # the end event of a node comes after all of its children
+                if self.widget_tree.is_leaf(node_index):
+                    self.child_node_index_list.append(node_index)
+                    self.child_node_list.append(element)
+                else:
+                    self.parent_node_list.append(element)
+        return self
+
+    def get_leaf_widget_list(self, keys):
+        return [Widget.from_attrib(keys, self.element_list[node_index].attrib, widget_id=node_index,
+                                   node_index=node_index) for node_index in self.child_node_index_list]
+
+
+def parse_hierarchy(xml: str):
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    parser.feed(xml)
+    parser.close()
+    return Hierarchy().feed_events(parser.read_events())
+
+
+def parse_hierarchy_file(xml_path):
+    return Hierarchy().feed_events(ET.iterparse(xml_path, events=('start', 'end')))
+
+
+# the recursive implementation used before, kept for the benchmark
+def parse_hierarchy_recursively(xml: str):
+    def get_child_node_list(root, child_node_list):
+        has_child = False
+        for child in root:
+            has_child = True
+            get_child_node_list(child, child_node_list)
+        if not has_child:
+            child_node_list.append(root)
+
+    def get_parent_node_list(root, parent_node_list):
+        has_child = False
+        for child in root:
+            has_child = True
+            get_parent_node_list(child, parent_node_list)
+        if has_child:
+            parent_node_list.append(root)
+
+    root = ET.fromstring(xml)
+    child_node_list = []
+    parent_node_list = []
+    get_child_node_list(root, child_node_list)
+    get_parent_node_list(root, parent_node_list)
+    child_to_parent_dict = {child_node: parent_node for parent_node in root.iter() for child_node in parent_node}
+    return root, child_node_list, parent_node_list, child_to_parent_dict
+
+
+def benchmark(trace_path, repeat_count=5):
+    xml_list = [xml_path.read_text(encoding='utf-8') for xml_path in sorted(Path(trace_path).rglob('*.xml'))]
+    if len(xml_list) == 0:
+        print(f'no xml in {trace_path}')
+        return
+    for xml in xml_list:
+        hierarchy = parse_hierarchy(xml)
+        _, child_node_list, parent_node_list, _ = parse_hierarchy_recursively(xml)
+        assert [node.attrib for node in hierarchy.child_node_list] == [node.attrib for node in child_node_list]
+        assert [node.attrib for node in hierarchy.parent_node_list] == [node.attrib for node in parent_node_list]
+
+    for name, parse in [('recursive', parse_hierarchy_recursively), ('streaming', parse_hierarchy)]:
+        start_time = time.perf_counter()
+        for _ in range(repeat_count):
+            for xml in xml_list:
+                parse(xml)
+        elapsed_time = (time.perf_counter() - start_time) / repeat_count
+        print(f'{name}: {len(xml_list)} xml, {elapsed_time:.3f}s, {elapsed_time / len(xml_list) * 1000:.2f}ms per xml')
+
+
+if __name__ == '__main__':
+    # python hierarchy.py [trace_path]
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'assets/Trace')
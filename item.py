@@ -0,0 +1,133 @@
+import argparse
+from fnmatch import fnmatch
+from pathlib import Path
+
+from migration_scheduler import PipelineScheduler, PipelineTask
+from test_case_catalog import get_test_case_catalog
+from test_executor import TestExecutor
+from test_migrator import TestMigrator
+from util import load_config
+
+# the last stage run by each command, the missing outputs of the stages before it are produced as well
+COMMAND_STAGE_DICT = {
+    'trace': PipelineTask.TRACE,
+    'intentions': PipelineTask.INTENTION,
+    'migrate': PipelineTask.MIGRATION,
+    'oracles': PipelineTask.ORACLE,
+}
+
+
+def is_category_selected(test_case_catalog, app_tag, category):
+    # e.g. a1 or a1-browser
+    return category is None or category in [app_tag[:2], test_case_catalog.get_category(app_tag)]
+
+
+def select_task_list(test_case_catalog, app_config, args, with_target):
+    # (source app, functionality, target app) of the selected migrations, the target app is None for the stages of
+    # the source app
+    task_list = []
+    if with_target:
+        pair_list = test_case_catalog.get_migration_pair_list()
+    else:
+        pair_list = [(app_tag, func_tag, None) for app_tag in sorted(test_case_catalog.index)
+                     for func_tag in sorted(test_case_catalog.index[app_tag])]
+    for app_tag, func_tag, target_app_tag in pair_list:
+        if not is_category_selected(test_case_catalog, app_tag, args.category) or not fnmatch(func_tag, args.func) \
+                or not fnmatch(app_tag, args.source) or app_tag not in app_config:
+            continue
+        if target_app_tag is not None and (not fnmatch(target_app_tag, args.target) or target_app_tag not in app_config):
+            continue
+        task_list.append((app_tag, func_tag, target_app_tag))
+    return task_list
+
+
+def has_output(stage, app_tag, func_tag, target_app_tag):
+    if stage == PipelineTask.TRACE:
+        return (Path(TestExecutor.TRACE_PATH) / app_tag / func_tag / 'action_trace.json').exists()
+    if stage == PipelineTask.INTENTION:
+        return (Path(TestMigrator.INTENTION_PATH) / func_tag / f'{app_tag}.txt').exists()
+    if stage == PipelineTask.MIGRATION:
+        return (Path(TestMigrator.GPT_TRACE_PATH) / f'{app_tag}_{func_tag}_{target_app_tag}' /
+                'action_trace.json').exists()
+    return (Path(TestMigrator.ORACLE_PATH) / f'{app_tag}_{func_tag}_{target_app_tag}' / 'oracle.txt').exists()
+
+
+# Build the DAG of the stages of the selected migrations, the trace and the intentions of a source test are shared by
+# all its target apps
+class PipelineBuilder:
+
+    def __init__(self, category_platform_version_dict, oracle_execution):
+        self.category_platform_version_dict = category_platform_version_dict
+        self.oracle_execution = oracle_execution
+        # task id -> task, in the order they are added
+        self.task_dict = {}
+
+    def get_platform_version(self, stage, app_tag, target_app_tag):
+        # None for the stages that do not need a device
+        if stage == PipelineTask.TRACE:
+            return str(self.category_platform_version_dict[app_tag[:2]])
+        if stage == PipelineTask.MIGRATION or (stage == PipelineTask.ORACLE and self.oracle_execution):
+            return str(self.category_platform_version_dict[target_app_tag[:2]])
+        return None
+
+    def add_task(self, stage, app_tag, func_tag, target_app_tag, is_selected=True):
+        # the stages before the selected one are only run if their output is missing
+        if not is_selected and has_output(stage, app_tag, func_tag, target_app_tag):
+            return None
+        if stage in [PipelineTask.TRACE, PipelineTask.INTENTION]:
+            target_app_tag = None
+        task = PipelineTask(stage, app_tag, func_tag, target_app_tag,
+                            self.get_platform_version(stage, app_tag, target_app_tag))
+        if task.task_id in self.task_dict:
+            return self.task_dict[task.task_id]
+        stage_index = PipelineTask.STAGE_LIST.index(stage)
+        if stage_index > 0:
+            upstream_task = self.add_task(PipelineTask.STAGE_LIST[stage_index - 1], app_tag, func_tag,
+                                          target_app_tag, False)
+            if upstream_task is not None:
+                task.upstream_task_list.append(upstream_task)
+        self.task_dict[task.task_id] = task
+        return task
+
+    def build(self, stage, task_list):
+        for app_tag, func_tag, target_app_tag in task_list:
+            self.add_task(stage, app_tag, func_tag, target_app_tag)
+        return list(self.task_dict.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the stages of ITeM on the selected tests')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    command_help_dict = {'trace': 'record the traces of the source tests',
+                         'intentions': 'generate the test intentions of the source tests',
+                         'migrate': 'migrate the intentions on the target apps',
+                         'oracles': 'migrate the oracles on the target apps'}
+    for command, command_help in command_help_dict.items():
+        subparser = subparsers.add_parser(command, help=command_help)
+        subparser.add_argument('--category', help='e.g. a1 or a1-browser')
+        subparser.add_argument('--func', default='*', help='functionality glob, e.g. b1*')
+        subparser.add_argument('--source', default='*', help='source app glob, e.g. a11')
+        if command in ['migrate', 'oracles']:
+            subparser.add_argument('--target', default='*', help='target app glob, e.g. a1[2-5]')
+        if command == 'oracles':
+            subparser.add_argument('--execution', action='store_true', help='perform the GPT trace again first')
+        subparser.add_argument('--jobs', type=int, help='stages run at the same time, one per device by default')
+        subparser.add_argument('--resume', action='store_true', help='skip the stages done in the previous run')
+        subparser.add_argument('--dry-run', action='store_true', help='only print the stages to be run')
+    args = parser.parse_args()
+
+    test_case_catalog = get_test_case_catalog(TestMigrator.ITeM_PATH)
+    app_config = load_config('config/app.yaml')
+    category_platform_version_dict = load_config('config/env.yaml')['CategoryPlatformVersion']
+    stage = COMMAND_STAGE_DICT[args.command]
+    selected_task_list = select_task_list(test_case_catalog, app_config, args,
+                                          args.command in ['migrate', 'oracles'])
+    oracle_execution = getattr(args, 'execution', False)
+    pipeline_task_list = PipelineBuilder(category_platform_version_dict, oracle_execution).build(
+        stage, selected_task_list)
+    if args.dry_run:
+        for pipeline_task in pipeline_task_list:
+            print(f'{pipeline_task} after {pipeline_task.upstream_task_list}')
+    else:
+        scheduler = PipelineScheduler.from_config(job_count=args.jobs, oracle_execution=oracle_execution)
+        scheduler.run(pipeline_task_list, args.resume)
@@ -0,0 +1,133 @@
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class LLMCacheMissError(Exception):
+    pass
+
+
+# Persistent cache of the LLM responses, keyed on the model and the normalized messages
+class LLMResponseCache:
+    READ_WRITE = 'read_write'
+    # only replay the cached responses, a miss is an error
+    REPLAY_ONLY = 'replay_only'
+    DISABLED = 'disabled'
+
+    # the access times of the hits are written together, not on every hit
+    ACCESS_FLUSH_COUNT = 64
+
+    def __init__(self, cache_path: Path, mode=READ_WRITE, ttl=None, max_entry_count=100000,
+                 max_total_size=1024 * 1024 * 1024):
+        self.cache_path = cache_path
+        self.mode = mode
+        # seconds, None means the responses never expire
+        self.ttl = ttl
+        self.max_entry_count = max_entry_count
+        # bytes of the stored responses
+        self.max_total_size = max_total_size
+        self.hit_count = 0
+        self.miss_count = 0
+        self.lock = threading.Lock()
+        # {key: accessed_at} of the hits not written yet
+        self.pending_access_dict = {}
+        self.connection = None
+        if mode != self.DISABLED:
+            if not cache_path.parent.exists():
+                cache_path.parent.mkdir(parents=True)
+            self.connection = sqlite3.connect(str(cache_path), check_same_thread=False)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS response ('
+                                    'key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, '
+                                    'created_at REAL, accessed_at REAL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS response_accessed_at ON response (accessed_at)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS response_created_at ON response (created_at)')
+            self.connection.commit()
+            atexit.register(self.close)
+
+    @staticmethod
+    def normalize_messages(messages):
+        return [{'role': message['role'], 'content': message['content'].strip()} for message in messages]
+
+    def get_key(self, model, messages):
+        content = json.dumps([model, self.normalize_messages(messages)], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, model, messages):
+        if self.mode == self.DISABLED:
+            return None
+        key = self.get_key(model, messages)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT response, created_at FROM response WHERE key = ?',
+                                          (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self.connection.execute('DELETE FROM response WHERE key = ?', (key,))
+                self.connection.commit()
+                row = None
+            if row is None:
+                self.miss_count += 1
+            else:
+                self.hit_count += 1
+                self.pending_access_dict[key] = now
+                if len(self.pending_access_dict) >= self.ACCESS_FLUSH_COUNT:
+                    self.flush_access()
+                    self.connection.commit()
+        if row is None and self.mode == self.REPLAY_ONLY:
+            raise LLMCacheMissError(f'no cached response for {key}')
+        return None if row is None else row[0]
+
+    def put(self, model, messages, response):
+        if self.mode != self.READ_WRITE:
+            return
+        key = self.get_key(model, messages)
+        now = time.time()
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?)',
+                                    (key, model, response, len(response.encode('utf-8')), now, now))
+            self.pending_access_dict.pop(key, None)
+            self.flush_access()
+            self.evict()
+            self.connection.commit()
+
+    def flush_access(self):
+        if len(self.pending_access_dict) == 0:
+            return
+        self.connection.executemany('UPDATE response SET accessed_at = ? WHERE key = ?',
+                                    [(accessed_at, key) for key, accessed_at in self.pending_access_dict.items()])
+        self.pending_access_dict = {}
+
+    def evict(self):
+        if self.ttl is not None:
+            self.connection.execute('DELETE FROM response WHERE created_at < ?', (time.time() - self.ttl,))
+        entry_count, total_size = self.connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response').fetchone()
+        if entry_count <= self.max_entry_count and total_size <= self.max_total_size:
+            return
+        # the least recently used responses are evicted first, only the rows to evict are read
+        evict_count = max(entry_count - self.max_entry_count, 0)
+        excess_size = total_size - self.max_total_size
+        if excess_size > 0:
+            size_evict_count = 0
+            for (size,) in self.connection.execute('SELECT size FROM response ORDER BY accessed_at'):
+                if excess_size <= 0:
+                    break
+                excess_size -= size
+                size_evict_count += 1
+            evict_count = max(evict_count, size_evict_count)
+        self.connection.execute('DELETE FROM response WHERE key IN '
+                                '(SELECT key FROM response ORDER BY accessed_at LIMIT ?)', (evict_count,))
+
+    def get_stats(self):
+        return {'hit': self.hit_count, 'miss': self.miss_count}
+
+    def close(self):
+        if self.connection is not None:
+            with self.lock:
+                self.flush_access()
+                self.connection.commit()
+            self.connection.close()
+            self.connection = None
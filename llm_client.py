@@ -0,0 +1,215 @@
+import asyncio
+import atexit
+import random
+import threading
+import time
+from collections import deque
+
+import aiohttp
+
+from profiler import PROFILER
+
+
+class LLMRequestError(Exception):
+    pass
+
+
+# the event loop and the session of every thread, shared by all the clients so that the connections are reused
+# across the calls
+thread_state = threading.local()
+# the loop states of all the threads, closed at exit
+loop_state_list = []
+loop_state_lock = threading.Lock()
+
+
+def get_thread_loop_state():
+    if getattr(thread_state, 'loop_state', None) is None:
+        thread_state.loop_state = {'loop': asyncio.new_event_loop(), 'session': None}
+        with loop_state_lock:
+            loop_state_list.append(thread_state.loop_state)
+    return thread_state.loop_state
+
+
+def get_thread_session():
+    # created in the running loop of the thread, a session can only be used in the loop it was created in
+    loop_state = get_thread_loop_state()
+    if loop_state['session'] is None:
+        loop_state['session'] = aiohttp.ClientSession()
+    return loop_state['session']
+
+
+@atexit.register
+def close_thread_loops():
+    # the loops are not running anymore, the loops of the finished threads are closed from here as well
+    with loop_state_lock:
+        closed_loop_state_list = list(loop_state_list)
+        loop_state_list.clear()
+    for loop_state in closed_loop_state_list:
+        loop = loop_state['loop']
+        if loop.is_closed() or loop.is_running():
+            continue
+        if loop_state['session'] is not None:
+            loop.run_until_complete(loop_state['session'].close())
+        loop.close()
+
+
+# Concurrency limit shared by the event loops of all the threads, a waiting request is woken up by a release instead
+# of polling
+class SlotLimiter:
+
+    def __init__(self, slot_count):
+        self.slot_count = slot_count
+        self.used_count = 0
+        self.lock = threading.Lock()
+        # (event loop, future) of the waiting requests, the first one gets the next free slot
+        self.waiter_deque = deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.used_count < self.slot_count:
+                self.used_count += 1
+                return
+            future = loop.create_future()
+            self.waiter_deque.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                if (loop, future) in self.waiter_deque:
+                    self.waiter_deque.remove((loop, future))
+                    raise
+            # the slot was handed over before the cancellation, it is passed on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self.lock:
+            if len(self.waiter_deque) == 0:
+                self.used_count -= 1
+                return
+            # the slot goes to the waiter without becoming free
+            loop, future = self.waiter_deque.popleft()
+        loop.call_soon_threadsafe(self.hand_over, future)
+
+    def hand_over(self, future):
+        # run in the loop of the waiter, a cancelled waiter passes the slot on
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+slot_limiter_dict = {}
+slot_limiter_lock = threading.Lock()
+
+
+def get_slot_limiter(api_base, slot_count):
+    # one limit per endpoint is shared by all the clients of the process, e.g. by the migrators of all the scheduler
+    # workers, the first client sets its size
+    with slot_limiter_lock:
+        if api_base not in slot_limiter_dict:
+            slot_limiter_dict[api_base] = SlotLimiter(slot_count)
+        return slot_limiter_dict[api_base]
+
+
+# Asynchronous requests to the chat-completions endpoint, with bounded concurrency, timeouts and retries
+class AsyncLLMClient:
+    # rate limit and server errors are retried
+    RETRY_STATUS_SET = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self, api_key, api_base, max_concurrency=4, timeout=120, max_retry_count=5, backoff_base=1.0,
+                 backoff_max=30.0, response_cache=None):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retry_count = max_retry_count
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # the requests of all the clients of the process to the same endpoint share the concurrency limit
+        self.slot_limiter = get_slot_limiter(self.api_base, max_concurrency)
+        # LLMResponseCache or None
+        self.response_cache = response_cache
+
+    @property
+    def chat_completions_url(self):
+        return f'{self.api_base}/chat/completions'
+
+    def get_backoff_time(self, retry_index, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        # full jitter, the clients retrying at the same time do not hit the rate limit together again
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry_index))
+
+    async def complete(self, session, model, messages):
+        if self.response_cache is not None:
+            cached_response = self.response_cache.get(model, messages)
+            if cached_response is not None:
+                PROFILER.add_span('llm.cache_hit', time.time(), 0.0)
+                return cached_response
+        response = await self.request(session, model, messages)
+        if self.response_cache is not None:
+            self.response_cache.put(model, messages, response)
+        return response
+
+    async def request(self, session, model, messages):
+        payload = {'model': model, 'messages': messages}
+        headers = {'Authorization': f'Bearer {self.api_key}'}
+        last_error = None
+        for retry_index in range(self.max_retry_count + 1):
+            retry_after = None
+            queue_start = time.time()
+            await self.slot_limiter.acquire()
+            network_start = time.time()
+            PROFILER.add_span('llm.queue', queue_start, network_start - queue_start)
+            status = None
+            try:
+                async with session.post(self.chat_completions_url, json=payload, headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    status = response.status
+                    if response.status == 200:
+                        response_json = await response.json()
+                        return response_json['choices'][0]['message']['content']
+                    response_text = await response.text()
+                    last_error = LLMRequestError(f'{response.status}: {response_text}')
+                    if response.status not in self.RETRY_STATUS_SET:
+                        raise last_error
+                    if 'Retry-After' in response.headers:
+                        try:
+                            retry_after = float(response.headers['Retry-After'])
+                        except ValueError:
+                            retry_after = None
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                last_error = LLMRequestError(repr(e))
+            finally:
+                self.slot_limiter.release()
+                PROFILER.add_span('llm.network', network_start, time.time() - network_start, status=status,
+                                  retry_index=retry_index)
+            if retry_index < self.max_retry_count:
+                backoff_time = self.get_backoff_time(retry_index, retry_after)
+                print(f'LLM request failed ({last_error}), retry in {backoff_time:.2f}s')
+                PROFILER.add_span('llm.backoff', time.time(), backoff_time)
+                await asyncio.sleep(backoff_time)
+        raise last_error
+
+    async def complete_many(self, model, messages_batch):
+        session = get_thread_session()
+        task_list = [asyncio.create_task(self.complete(session, model, messages)) for messages in messages_batch]
+        try:
+            return await asyncio.gather(*task_list)
+        except BaseException:
+            # one request failed or the batch is cancelled, the other requests are not needed anymore
+            for task in task_list:
+                task.cancel()
+            await asyncio.gather(*task_list, return_exceptions=True)
+            raise
+
+    def complete_sync(self, model, messages):
+        return self.complete_many_sync(model, [messages])[0]
+
+    def complete_many_sync(self, model, messages_batch):
+        if len(messages_batch) == 0:
+            return []
+        return get_thread_loop_state()['loop'].run_until_complete(self.complete_many(model, messages_batch))
@@ -0,0 +1,153 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from transcript import read_transcript
+
+
+# Local stand-in of the chat-completions endpoint, answers every request with answer_provider(messages)
+class LLMStubServer:
+
+    def __init__(self, answer_provider, host='127.0.0.1', port=0, delay=0.0, rate_limit_count=0):
+        self.answer_provider = answer_provider
+        self.delay = delay
+        # the first requests are answered with 429 to exercise the retries
+        self.rate_limit_count = rate_limit_count
+        self.request_count = 0
+        self.in_flight_count = 0
+        self.max_in_flight_count = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.create_handler_class())
+        self.thread = None
+
+    @property
+    def api_base(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def create_handler_class(self):
+        stub_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                content_length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(content_length).decode('utf-8'))
+                status, body = stub_server.handle(payload)
+                response = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, payload):
+        with self.lock:
+            self.request_count += 1
+            if self.request_count <= self.rate_limit_count:
+                return 429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}}
+            self.in_flight_count += 1
+            self.max_in_flight_count = max(self.max_in_flight_count, self.in_flight_count)
+        try:
+            time.sleep(self.delay)
+            answer = self.answer_provider(payload['messages'])
+        finally:
+            with self.lock:
+                self.in_flight_count -= 1
+        return 200, {'id': f'chatcmpl-stub-{self.request_count}',
+                     'object': 'chat.completion',
+                     'model': payload.get('model', ''),
+                     'choices': [{'index': 0,
+                                  'message': {'role': 'assistant', 'content': answer},
+                                  'finish_reason': 'stop'}]}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.api_base
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Answers with the responses recorded in messages.jsonl transcripts (or the messages.json and messages_list.json of
+# older runs). A question asked before gets its recorded answer, any other question gets the next recorded answer not
+# handed out yet, then the default answer
+class ReplayAnswerProvider:
+
+    def __init__(self, transcript_path_list, default_answer='<Exact, back, -1, Empty>'):
+        self.default_answer = default_answer
+        # question -> [answer], the answers of a repeated question are handed out in order
+        self.question_to_answer_list = {}
+        self.answer_list = []
+        self.used_answer_index_set = set()
+        self.next_answer_index = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self.lock = threading.Lock()
+        for transcript_path in transcript_path_list:
+            for messages in self.read_conversation_list(Path(transcript_path)):
+                for message, next_message in zip(messages, messages[1:]):
+                    if message['role'] == 'user' and next_message['role'] == 'assistant':
+                        self.question_to_answer_list.setdefault(message['content'], []).append(len(self.answer_list))
+                        self.answer_list.append(next_message['content'])
+
+    def read_conversation_list(self, transcript_path: Path):
+        if transcript_path.suffix == '.jsonl':
+            return read_transcript(transcript_path)
+        with open(transcript_path, mode='r', encoding='utf-8') as f:
+            content = f.read()
+        conversation_list = []
+        key_set = set()
+        # the old files repeat a conversation once per request
+        for messages in (json.loads(content) if content.strip() != '' else []):
+            key = json.dumps(messages)
+            if key not in key_set:
+                key_set.add(key)
+                conversation_list.append(messages)
+        return conversation_list
+
+    def __call__(self, messages):
+        with self.lock:
+            for answer_index in self.question_to_answer_list.get(messages[-1]['content'], []):
+                if answer_index not in self.used_answer_index_set:
+                    self.used_answer_index_set.add(answer_index)
+                    self.hit_count += 1
+                    return self.answer_list[answer_index]
+            self.miss_count += 1
+            while self.next_answer_index < len(self.answer_list):
+                answer_index = self.next_answer_index
+                self.next_answer_index += 1
+                if answer_index not in self.used_answer_index_set:
+                    self.used_answer_index_set.add(answer_index)
+                    return self.answer_list[answer_index]
+            return self.default_answer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fixed answer on a local chat-completions endpoint')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--answer', default='<Exact, back, -1, Empty>')
+    parser.add_argument('--replay', nargs='*', help='answer with the responses recorded in these messages.jsonl files')
+    parser.add_argument('--delay', type=float, default=0.0)
+    parser.add_argument('--rate-limit-count', type=int, default=0)
+    args = parser.parse_args()
+    if args.replay:
+        answer_provider = ReplayAnswerProvider(args.replay, args.answer)
+    else:
+        answer_provider = lambda messages: args.answer
+    stub_server = LLMStubServer(answer_provider, port=args.port, delay=args.delay,
+                                rate_limit_count=args.rate_limit_count)
+    print(f'serving on {stub_server.api_base}, set GPTClient.API_BASE to it')
+    stub_server.server.serve_forever()
@@ -1,5 +0,0 @@
-from test_executor import TestExecutor
-
-if __name__ == '__main__':
-    executor = TestExecutor()
-    executor.execute_test_case('a11', 'b11')
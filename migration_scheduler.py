@@ -0,0 +1,358 @@
+import json
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from util import load_config
+
+
+class Device:
+
+    def __init__(self, udid, appium_port, platform_version, system_port=None):
+        self.udid = udid
+        self.appium_port = appium_port
+        self.platform_version = platform_version
+        self.system_port = system_port
+
+    @property
+    def appium_server_url(self):
+        return f'http://localhost:{self.appium_port}'
+
+    def apply_to(self, desired_caps):
+        # the device leased from the device pool overrides the default device
+        desired_caps['deviceName'] = self.udid
+        desired_caps['udid'] = self.udid
+        desired_caps['platformVersion'] = self.platform_version
+        if self.system_port is not None:
+            desired_caps['systemPort'] = self.system_port
+        return desired_caps
+
+    def __repr__(self):
+        return f'Device({self.udid}, {self.appium_server_url}, Android {self.platform_version})'
+
+
+class MigrationTask:
+
+    def __init__(self, app_tag, func_tag, target_app_tag, platform_version):
+        self.app_tag = app_tag
+        self.func_tag = func_tag
+        self.target_app_tag = target_app_tag
+        self.platform_version = platform_version
+        self.attempt_count = 0
+
+    @property
+    def task_id(self):
+        return f'{self.app_tag}_{self.func_tag}_{self.target_app_tag}'
+
+    def __repr__(self):
+        return f'MigrationTask({self.task_id}, Android {self.platform_version})'
+
+
+# One stage of a migration, run after its upstream stages, e.g. the intentions of a11_b11 after the trace of a11_b11
+class PipelineTask(MigrationTask):
+    TRACE = 'trace'
+    INTENTION = 'intention'
+    MIGRATION = 'migration'
+    ORACLE = 'oracle'
+
+    # the stages in the order they depend on each other
+    STAGE_LIST = [TRACE, INTENTION, MIGRATION, ORACLE]
+
+    def __init__(self, stage, app_tag, func_tag, target_app_tag=None, platform_version=None, upstream_task_list=None):
+        # the platform version is None for the stages that do not need a device
+        super().__init__(app_tag, func_tag, target_app_tag, platform_version)
+        self.stage = stage
+        self.upstream_task_list = upstream_task_list if upstream_task_list is not None else []
+
+    @property
+    def task_id(self):
+        if self.target_app_tag is None:
+            return f'{self.stage}_{self.app_tag}_{self.func_tag}'
+        return f'{self.stage}_{self.app_tag}_{self.func_tag}_{self.target_app_tag}'
+
+    def __repr__(self):
+        if self.platform_version is None:
+            return f'PipelineTask({self.task_id})'
+        return f'PipelineTask({self.task_id}, Android {self.platform_version})'
+
+
+# Progress of the scheduled tasks, stored after every change so that an interrupted batch can be resumed
+class ProgressLedger:
+    DONE = 'done'
+    FAILED = 'failed'
+    RUNNING = 'running'
+
+    def __init__(self, ledger_path: Path):
+        self.ledger_path = ledger_path
+        self.lock = threading.Lock()
+        # {task_id:{status, attempt_count, device, time, error}}
+        self.records = {}
+        if ledger_path.exists():
+            with open(ledger_path, mode='r', encoding='utf-8') as f:
+                self.records = json.load(f)
+
+    def is_done(self, task_id):
+        with self.lock:
+            return task_id in self.records and self.records[task_id]['status'] == self.DONE
+
+    def get_attempt_count(self, task_id):
+        with self.lock:
+            return self.records[task_id]['attempt_count'] if task_id in self.records else 0
+
+    def update(self, task, status, device, execution_time=0.0, error=''):
+        with self.lock:
+            self.records[task.task_id] = {'status': status,
+                                          'attempt_count': task.attempt_count,
+                                          'device': device.udid if device is not None else '',
+                                          'time': execution_time,
+                                          'error': error}
+            self.store()
+
+    def store(self):
+        if not self.ledger_path.parent.exists():
+            self.ledger_path.parent.mkdir(parents=True)
+        # write to a temporary file first, an interrupted write should not corrupt the ledger
+        temp_path = self.ledger_path.with_suffix('.tmp')
+        with open(temp_path, mode='w', encoding='utf-8') as f:
+            json.dump(self.records, f, indent=2)
+        temp_path.replace(self.ledger_path)
+
+
+# Run the migration tasks concurrently, one task per device of the device pool
+class MigrationScheduler:
+    LEDGER_PATH = r'assets/Result/schedule_ledger.json'
+
+    MAX_ATTEMPT_COUNT = 3
+
+    def __init__(self, device_list, ledger, migrator_factory=None, max_attempt_count=MAX_ATTEMPT_COUNT):
+        self.device_list = device_list
+        self.ledger = ledger
+        # device -> TestMigrator, replaceable, e.g. by a migrator whose driver is a fake one
+        self.migrator_factory = migrator_factory if migrator_factory is not None else self.create_migrator
+        self.max_attempt_count = max_attempt_count
+        self.pending_task_list = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, env_config_path='config/env.yaml', migrator_factory=None, **kwargs):
+        device_pool_config = load_config(env_config_path)['DevicePool']
+        device_list = [Device(device_config['udid'], device_config['appium_port'],
+                              str(device_config['platformVersion']), device_config.get('system_port'))
+                       for device_config in device_pool_config]
+        return cls(device_list, ProgressLedger(Path(cls.LEDGER_PATH)), migrator_factory, **kwargs)
+
+    def create_migrator(self, device):
+        from test_migrator import TestMigrator
+        migrator = TestMigrator()
+        if device is not None:
+            migrator.use_device(device)
+        return migrator
+
+    def restore_attempt_count(self, task):
+        # the attempts of the previous runs count, a task that used them all up is not run again
+        task.attempt_count = self.ledger.get_attempt_count(task.task_id)
+        if task.attempt_count >= self.max_attempt_count:
+            print(f'{task} failed {task.attempt_count} times, remove it from {self.ledger.ledger_path} to retry it')
+            return False
+        return True
+
+    def run(self, task_list):
+        with self.lock:
+            self.pending_task_list = [task for task in task_list if not self.ledger.is_done(task.task_id) and
+                                      self.restore_attempt_count(task)]
+        print(f'{len(self.pending_task_list)} of {len(task_list)} tasks to be run on {self.device_list}')
+        platform_version_set = {device.platform_version for device in self.device_list}
+        for task in self.pending_task_list:
+            if task.platform_version not in platform_version_set:
+                print(f'no device in the device pool for {task}')
+
+        worker_list = [threading.Thread(target=self.run_device_worker, args=(device,), name=device.udid)
+                       for device in self.device_list]
+        for worker in worker_list:
+            worker.start()
+        for worker in worker_list:
+            worker.join()
+        return self.ledger.records
+
+    def take_task(self, device):
+        # a device only takes the tasks of its Android version
+        with self.lock:
+            for index, task in enumerate(self.pending_task_list):
+                if task.platform_version == device.platform_version:
+                    return self.pending_task_list.pop(index)
+        return None
+
+    def run_device_worker(self, device):
+        migrator = None
+        while True:
+            task = self.take_task(device)
+            if task is None:
+                break
+            task.attempt_count += 1
+            self.ledger.update(task, ProgressLedger.RUNNING, device)
+            start_time = time.time()
+            try:
+                if migrator is None:
+                    migrator = self.migrator_factory(device)
+                self.run_task(migrator, task)
+                self.ledger.update(task, ProgressLedger.DONE, device, time.time() - start_time)
+            except Exception as e:
+                traceback.print_exc()
+                self.ledger.update(task, ProgressLedger.FAILED, device, time.time() - start_time, repr(e))
+                # the migrator may hold a broken state, a new one is created for the next task
+                migrator = None
+                if task.attempt_count < self.max_attempt_count:
+                    with self.lock:
+                        self.pending_task_list.append(task)
+
+    def run_task(self, migrator, task):
+        print(f'{threading.current_thread().name}: {task}')
+        migrator.perform_test_intentions(task.app_tag, task.func_tag, task.target_app_tag)
+        migrator.migration_test_oracles(task.app_tag, task.func_tag, task.target_app_tag, False)
+
+
+# Run the stages of the migrations as a DAG, a stage starts as soon as its upstream stages are done so that the stages
+# of different migrations overlap, e.g. the intentions of one migration are generated while another one is migrated.
+# The stages needing a device lease a free device of their Android version
+class PipelineScheduler(MigrationScheduler):
+    LEDGER_PATH = r'assets/Result/pipeline_ledger.json'
+
+    def __init__(self, device_list, ledger, migrator_factory=None,
+                 max_attempt_count=MigrationScheduler.MAX_ATTEMPT_COUNT, job_count=None, executor_factory=None,
+                 oracle_execution=False):
+        super().__init__(device_list, ledger, migrator_factory, max_attempt_count)
+        # the number of the stages run at the same time, one per device by default
+        self.job_count = job_count if job_count is not None else max(len(device_list), 1)
+        self.executor_factory = executor_factory if executor_factory is not None else self.create_executor
+        # perform the GPT trace again before migrating the oracles
+        self.oracle_execution = oracle_execution
+        self.condition = threading.Condition(self.lock)
+        self.free_device_list = []
+        self.done_task_id_set = set()
+        self.failed_task_id_set = set()
+        self.running_count = 0
+
+    def create_executor(self):
+        from test_executor import TestExecutor
+        return TestExecutor()
+
+    def run(self, task_list, resume=False):
+        # with resume, the stages done in a previous run are skipped
+        platform_version_set = {device.platform_version for device in self.device_list}
+        with self.lock:
+            self.free_device_list = list(self.device_list)
+            self.done_task_id_set = set()
+            self.failed_task_id_set = set()
+            self.running_count = 0
+            self.pending_task_list = []
+            for task in task_list:
+                if resume and self.ledger.is_done(task.task_id):
+                    self.done_task_id_set.add(task.task_id)
+                elif resume and not self.restore_attempt_count(task):
+                    self.failed_task_id_set.add(task.task_id)
+                elif task.platform_version is not None and task.platform_version not in platform_version_set:
+                    print(f'no device in the device pool for {task}')
+                    self.failed_task_id_set.add(task.task_id)
+                else:
+                    self.pending_task_list.append(task)
+        print(f'{len(self.pending_task_list)} of {len(task_list)} stages to be run by {self.job_count} workers on '
+              f'{self.device_list}')
+
+        worker_list = [threading.Thread(target=self.run_pipeline_worker, name=f'worker-{index}')
+                       for index in range(self.job_count)]
+        for worker in worker_list:
+            worker.start()
+        for worker in worker_list:
+            worker.join()
+        return self.ledger.records
+
+    def take_ready_task(self):
+        # (task, device), the device is None for the stages without device, (None, None) when all stages are finished
+        with self.condition:
+            while True:
+                for index, task in enumerate(self.pending_task_list):
+                    upstream_task_id_list = [upstream_task.task_id for upstream_task in task.upstream_task_list]
+                    if any(task_id in self.failed_task_id_set for task_id in upstream_task_id_list):
+                        # the downstream stages of a failed stage are given up as well
+                        self.pending_task_list.pop(index)
+                        self.failed_task_id_set.add(task.task_id)
+                        self.ledger.update(task, ProgressLedger.FAILED, None, error='upstream stage failed')
+                        self.condition.notify_all()
+                        break
+                    if not all(task_id in self.done_task_id_set for task_id in upstream_task_id_list):
+                        continue
+                    device = None
+                    if task.platform_version is not None:
+                        device = next((device for device in self.free_device_list
+                                       if device.platform_version == task.platform_version), None)
+                        if device is None:
+                            continue
+                        self.free_device_list.remove(device)
+                    self.pending_task_list.pop(index)
+                    self.running_count += 1
+                    return task, device
+                else:
+                    if len(self.pending_task_list) == 0 and self.running_count == 0:
+                        return None, None
+                    self.condition.wait()
+
+    def finish_task(self, task, device, is_done):
+        with self.condition:
+            self.running_count -= 1
+            if device is not None:
+                self.free_device_list.append(device)
+            if is_done:
+                self.done_task_id_set.add(task.task_id)
+            elif task.attempt_count < self.max_attempt_count:
+                self.pending_task_list.append(task)
+            else:
+                self.failed_task_id_set.add(task.task_id)
+            self.condition.notify_all()
+
+    def run_pipeline_worker(self):
+        migrator = None
+        executor = None
+        while True:
+            task, device = self.take_ready_task()
+            if task is None:
+                break
+            task.attempt_count += 1
+            self.ledger.update(task, ProgressLedger.RUNNING, device)
+            start_time = time.time()
+            is_done = False
+            try:
+                if task.stage == PipelineTask.TRACE:
+                    if executor is None:
+                        executor = self.executor_factory()
+                    self.run_trace_task(executor, task, device)
+                else:
+                    if migrator is None:
+                        migrator = self.migrator_factory(device)
+                    self.run_task(migrator, task, device)
+                self.ledger.update(task, ProgressLedger.DONE, device, time.time() - start_time)
+                is_done = True
+            except Exception as e:
+                traceback.print_exc()
+                self.ledger.update(task, ProgressLedger.FAILED, device, time.time() - start_time, repr(e))
+                # the migrator and the executor may hold a broken state
+                migrator = None
+                executor = None
+            finally:
+                self.finish_task(task, device, is_done)
+
+    def run_trace_task(self, executor, task, device):
+        print(f'{threading.current_thread().name}: {task} on {device}')
+        executor.use_device(device)
+        executor.execute_test_case(task.app_tag, task.func_tag)
+
+    def run_task(self, migrator, task, device=None):
+        print(f'{threading.current_thread().name}: {task} on {device}')
+        if device is not None:
+            migrator.use_device(device)
+        if task.stage == PipelineTask.INTENTION:
+            migrator.generate_test_intentions(task.app_tag, task.func_tag)
+        elif task.stage == PipelineTask.MIGRATION:
+            migrator.perform_test_intentions(task.app_tag, task.func_tag, task.target_app_tag)
+        elif task.stage == PipelineTask.ORACLE:
+            migrator.migration_test_oracles(task.app_tag, task.func_tag, task.target_app_tag, self.oracle_execution)
@@ -0,0 +1,160 @@
+import argparse
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Timed spans of the migration phases, each span is attributed to the task, intention and step of the thread that
+# recorded it, e.g. {"name": "llm.network", "start": ..., "duration": 1.2, "task": "a11_b11_a12", "intention": 2, ...}
+class Profiler:
+    CONTEXT_KEY_LIST = ['task', 'intention', 'step']
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # task -> spans of the task, the spans recorded outside a task are dropped, nothing would ever take them out
+        self.task_span_dict = {}
+        self.lock = threading.Lock()
+        # task, intention and step of every thread
+        self.local = threading.local()
+
+    def get_context(self):
+        if not hasattr(self.local, 'context'):
+            self.local.context = {}
+        return self.local.context
+
+    def set_context(self, **context):
+        # None removes the key
+        current_context = self.get_context()
+        for key, value in context.items():
+            if value is None:
+                current_context.pop(key, None)
+            else:
+                current_context[key] = value
+
+    @contextmanager
+    def context(self, **context):
+        previous_context = dict(self.get_context())
+        self.set_context(**context)
+        try:
+            yield
+        finally:
+            self.local.context = previous_context
+
+    def add_span(self, name, start, duration, **attributes):
+        if not self.enabled:
+            return
+        context = self.get_context()
+        if 'task' not in context:
+            return
+        span = {'name': name, 'start': start, 'duration': duration, 'thread': threading.get_ident()}
+        span.update(context)
+        span.update(attributes)
+        with self.lock:
+            self.task_span_dict.setdefault(span['task'], []).append(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        start = time.time()
+        start_counter = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start_counter, **attributes)
+
+    @contextmanager
+    def task(self, task, jsonl_path: Path, chrome_trace_path: Path = None):
+        # the spans recorded in the block are attributed to the task and written out at its end, even if it fails
+        try:
+            with self.context(task=task):
+                yield
+        finally:
+            self.export_task(task, jsonl_path, chrome_trace_path)
+
+    def pop_task_span_list(self, task):
+        # the spans of the task are taken out, the other tasks running in parallel are kept
+        with self.lock:
+            return self.task_span_dict.pop(task, [])
+
+    def export_task(self, task, jsonl_path: Path, chrome_trace_path: Path = None):
+        task_span_list = self.pop_task_span_list(task)
+        export_jsonl(task_span_list, jsonl_path)
+        if chrome_trace_path is not None:
+            export_chrome_trace(task_span_list, chrome_trace_path)
+        return task_span_list
+
+
+def export_jsonl(span_list, jsonl_path: Path):
+    with open(jsonl_path, mode='w', encoding='utf-8') as f:
+        for span in span_list:
+            f.write(json.dumps(span, ensure_ascii=False) + '\n')
+
+
+def export_chrome_trace(span_list, chrome_trace_path: Path):
+    # complete events of the trace event format, open with chrome://tracing or https://ui.perfetto.dev
+    event_list = []
+    for span in span_list:
+        args = {key: value for key, value in span.items() if key not in ['name', 'start', 'duration', 'thread']}
+        event_list.append({'name': span['name'], 'ph': 'X', 'ts': span['start'] * 1e6, 'dur': span['duration'] * 1e6,
+                           'pid': str(span.get('task', '')), 'tid': span['thread'], 'args': args})
+    with open(chrome_trace_path, mode='w', encoding='utf-8') as f:
+        json.dump({'traceEvents': event_list}, f)
+
+
+def read_jsonl(jsonl_path: Path):
+    with open(jsonl_path, mode='r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip() != '']
+
+
+def summarize(span_list, group_key=None):
+    # (group, name) -> [count, total duration, max duration]
+    summary = {}
+    for span in span_list:
+        group = span.get(group_key, '') if group_key is not None else ''
+        entry = summary.setdefault((group, span['name']), [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += span['duration']
+        entry[2] = max(entry[2], span['duration'])
+    return summary
+
+
+def print_summary(summary):
+    print(f'{"group":<24} {"span":<20} {"count":>7} {"total(s)":>10} {"mean(ms)":>10} {"max(ms)":>10}')
+    for (group, name), (count, total_duration, max_duration) in sorted(summary.items(),
+                                                                      key=lambda x: (str(x[0][0]), -x[1][1])):
+        print(f'{str(group):<24} {name:<20} {count:>7} {total_duration:>10.2f} '
+              f'{total_duration / count * 1000:>10.1f} {max_duration * 1000:>10.1f}')
+
+
+PROFILER = Profiler()
+
+
+def profiled(name):
+    # records every call of the decorated function as a span
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with PROFILER.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize the recorded profile.jsonl files')
+    parser.add_argument('path_list', nargs='+', help='profile.jsonl files or folders searched for them')
+    parser.add_argument('--by', choices=Profiler.CONTEXT_KEY_LIST, help='group the spans by task, intention or step')
+    parser.add_argument('--chrome-trace', help='also write all the spans in the chrome trace format')
+    args = parser.parse_args()
+    all_span_list = []
+    for path in map(Path, args.path_list):
+        jsonl_path_list = sorted(path.rglob('*profile.jsonl')) if path.is_dir() else [path]
+        for jsonl_path in jsonl_path_list:
+            all_span_list.extend(read_jsonl(jsonl_path))
+    print_summary(summarize(all_span_list, args.by))
+    if args.chrome_trace is not None:
+        export_chrome_trace(all_span_list, Path(args.chrome_trace))
@@ -0,0 +1,136 @@
+import difflib
+import math
+import re
+
+# rough local approximation of a BPE tokenizer: words split into pieces of about 5 letters, numbers into pieces of up
+# to 3 digits, every punctuation character is one token
+TOKEN_PATTERN = re.compile(r' ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]|\s+')
+WORD_PIECE_LENGTH = 5
+
+WIDGET_TABLE_HEADER = 'index|class|resource-id|content-desc|text|clickable'
+# the class prefixes left out of the table
+CLASS_PREFIX_LIST = ['android.widget.', 'android.view.']
+
+
+def count_tokens(text):
+    token_count = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        piece = match.group().strip()
+        if piece.isalpha():
+            token_count += math.ceil(len(piece) / WORD_PIECE_LENGTH)
+        else:
+            token_count += 1
+    return token_count
+
+
+def count_message_tokens(messages):
+    # a few tokens of framing per message
+    return sum(count_tokens(message['content']) + 4 for message in messages)
+
+
+def shorten_class(clazz):
+    for class_prefix in CLASS_PREFIX_LIST:
+        if clazz.startswith(class_prefix):
+            return clazz[len(class_prefix):]
+    return clazz
+
+
+def escape_cell(value):
+    return str(value).replace('|', '/').replace('\n', ' ')
+
+
+def encode_widget_row(index, widget):
+    clickable = 'y' if widget.get('clickable') in ['true', True] else ''
+    return '|'.join([str(index), shorten_class(widget['class']), escape_cell(widget['resource-id']),
+                     escape_cell(widget['content-desc']), escape_cell(widget['text']), clickable])
+
+
+def encode_widget_table(widget_list, index_list=None):
+    # one row per widget, the index is the position of the widget in the widget list
+    if index_list is None:
+        index_list = range(len(widget_list))
+    return '\n'.join([WIDGET_TABLE_HEADER] + [encode_widget_row(index, widget_list[index]) for index in index_list])
+
+
+def get_widget_key(widget):
+    return (widget['class'], widget['resource-id'], widget['content-desc'], widget['text'],
+            widget.get('clickable') in ['true', True])
+
+
+def encode_index_range(start, end):
+    return str(start) if end - start == 1 else f'{start}-{end - 1}'
+
+
+def encode_screen_diff(before_widget_list, after_widget_list):
+    # the after screen described by the widgets kept from the before screen and the rows of the new widgets, the full
+    # table is used when the diff is not shorter
+    matcher = difflib.SequenceMatcher(None, [get_widget_key(widget) for widget in before_widget_list],
+                                      [get_widget_key(widget) for widget in after_widget_list], autojunk=False)
+    kept_range_list = []
+    added_index_list = []
+    removed_count = 0
+    for tag, before_start, before_end, after_start, after_end in matcher.get_opcodes():
+        if tag == 'equal':
+            kept_range_list.append(
+                f'{encode_index_range(after_start, after_end)} (was {encode_index_range(before_start, before_end)})')
+            continue
+        added_index_list.extend(range(after_start, after_end))
+        removed_count += before_end - before_start
+
+    full_table = encode_widget_table(after_widget_list)
+    if len(kept_range_list) == 0:
+        return f'a new screen with these widgets:\n{full_table}'
+    if len(added_index_list) == 0 and removed_count == 0:
+        return 'the same widgets as before the operation'
+    diff = (f'the widgets before the operation, now at these indexes: {", ".join(kept_range_list)}; '
+            f'{removed_count} widgets removed; ')
+    if len(added_index_list) == 0:
+        diff += 'no new widgets'
+    else:
+        diff += f'new widgets:\n{encode_widget_table(after_widget_list, added_index_list)}'
+    if count_tokens(diff) >= count_tokens(full_table):
+        return f'these widgets:\n{full_table}'
+    return diff
+
+
+def get_operation_list(omitted_message_list, next_message):
+    operation_list = []
+    next_message_list = omitted_message_list[1:] + [next_message]
+    for message, next_message in zip(omitted_message_list, next_message_list):
+        # the answer is followed by the performed operation, only the latter is kept
+        if message['role'] == 'assistant' and next_message['role'] != 'assistant':
+            operation_list.extend(re.findall(r'<[^<>]+>', message['content'])[:1])
+    return operation_list
+
+
+def create_summary_message(omitted_count, operation_list, operation_count):
+    operation_prompt = 'the operations' if len(operation_list) == operation_count \
+        else f'the last {len(operation_list)} of the {operation_count} operations'
+    return {'role': 'user',
+            'content': f'({omitted_count} earlier messages are omitted, {operation_prompt} performed in them: '
+                       f'{operation_list})'}
+
+
+def fit_messages(messages, token_budget):
+    # keep the system prompt, the first question and the latest messages, the oldest turns in between are replaced by
+    # the operations performed in them. The summary counts towards the budget, only the last message is always kept
+    if count_message_tokens(messages) <= token_budget or len(messages) <= 3:
+        return messages
+    head_message_list = messages[:2]
+    tail_message_list = list(messages[2:])
+    omitted_message_list = []
+    while True:
+        omitted_message_list.append(tail_message_list.pop(0))
+        operation_list = get_operation_list(omitted_message_list, tail_message_list[0])
+        fitted_message_list = head_message_list + [
+            create_summary_message(len(omitted_message_list), operation_list, len(operation_list))] + tail_message_list
+        if count_message_tokens(fitted_message_list) <= token_budget:
+            return fitted_message_list
+        if len(tail_message_list) == 1:
+            break
+    # the oldest operations are left out of the summary as well
+    operation_count = len(operation_list)
+    while len(operation_list) > 0 and count_message_tokens(fitted_message_list) > token_budget:
+        operation_list = operation_list[1:]
+        fitted_message_list[2] = create_summary_message(len(omitted_message_list), operation_list, operation_count)
+    return fitted_message_list
@@ -0,0 +1,96 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from device_io import create_device_io
+from hierarchy import parse_hierarchy
+from profiler import PROFILER, profiled
+from widget import WidgetTree
+
+
+# Snapshot of the current GUI screen, the hierarchy is fetched from the driver once and shared by the widget capture,
+# the trace recording and the element lookup until an action invalidates it
+class ScreenSnapshot:
+
+    def __init__(self, driver, device_io=None):
+        self.driver = driver
+        # AppiumDeviceIO or AdbDeviceIO, None to dump through the driver directly
+        self.device_io = device_io
+        self.valid = False
+        self.xml = None
+        self.root = None
+        self.child_node_list = []
+        self.parent_node_list = []
+        # parent and child relationship of the nodes, the element of a node is element_list[node_index]
+        self.widget_tree = WidgetTree()
+        self.element_list = []
+        # node index of each element in child_node_list
+        self.child_node_index_list = []
+
+    def refresh(self):
+        with PROFILER.span('page_source'):
+            if self.device_io is not None:
+                xml = self.device_io.dump_hierarchy()
+            else:
+                xml = str(self.driver.page_source)
+        self.load(xml)
+
+    @profiled('hierarchy.parse')
+    def load(self, xml):
+        self.xml = xml
+        hierarchy = parse_hierarchy(xml)
+        self.root = hierarchy.root
+        self.widget_tree = hierarchy.widget_tree
+        self.element_list = hierarchy.element_list
+        self.child_node_index_list = hierarchy.child_node_index_list
+        self.child_node_list = hierarchy.child_node_list
+        self.parent_node_list = hierarchy.parent_node_list
+        self.valid = True
+
+    def ensure(self):
+        if not self.valid:
+            self.refresh()
+        return self
+
+    def invalidate(self):
+        self.valid = False
+
+    @profiled('file_io.xml')
+    def write_xml(self, xml_path: Path):
+        self.ensure()
+        xml_tree = ET.ElementTree(self.root)
+        xml_tree.write(xml_path)
+
+
+# The snapshot, the device io and the idle wait of the current driver, shared by TestExecutor and GPTClient. The class
+# sets DEVICE_IO_BACKEND, IGNORE_UNIMPORTANT_VIEWS and ACTION_SLEEP_INTERVAL, and screen_snapshot, device_io and
+# ui_idle_waiter in its __init__
+class ScreenAccessMixin:
+
+    def attach_screen_snapshot(self, driver):
+        # a new driver means a new session, the old snapshot can not be reused
+        if self.screen_snapshot is None or self.screen_snapshot.driver is not driver:
+            self.screen_snapshot = ScreenSnapshot(driver, self.get_device_io(driver))
+        return self.screen_snapshot
+
+    def get_screen_snapshot(self, driver):
+        return self.attach_screen_snapshot(driver).ensure()
+
+    def get_device_io(self, driver):
+        if self.device_io is None or self.device_io.driver is not driver:
+            self.device_io = create_device_io(self.DEVICE_IO_BACKEND, driver, self.IGNORE_UNIMPORTANT_VIEWS)
+        return self.device_io
+
+    def invalidate_screen_snapshot(self):
+        if self.screen_snapshot is not None:
+            self.screen_snapshot.invalidate()
+
+    @profiled('ui_wait')
+    def wait_for_idle(self, driver, timeout=None):
+        if timeout is None:
+            timeout = self.ACTION_SLEEP_INTERVAL
+        wait_time, xml = self.ui_idle_waiter.wait(driver, timeout)
+        print(f'wait for idle: {wait_time:.2f}s')
+        if xml is not None:
+            # the last polled hierarchy is the idle screen, reuse it as the snapshot
+            self.attach_screen_snapshot(driver).load(xml)
+        return wait_time
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import json
+import re
+import threading
+from collections import deque
+from pathlib import Path
+
+# the operations that only move between screens, a known path is made of them
+NAVIGATION_OPERATION_LIST = ['click', 'long_click', 'back', 'scroll_up', 'scroll_down', 'swipe_left', 'swipe_right']
+
+
+def encode_screen_digest(widget_list, interactive_widget_index_list):
+    # the structure of the interactive widgets, their texts change with the content and are left out
+    structure = '\n'.join(f'{widget["class"]}|{widget["resource-id"]}|{widget["content-desc"]}'
+                          for widget in [widget_list[index] for index in interactive_widget_index_list])
+    return hashlib.sha1(structure.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_screen_signature(app_package, widget_list, interactive_widget_index_list):
+    return f'{app_package}:{encode_screen_digest(widget_list, interactive_widget_index_list)}'
+
+
+def get_action_key(action):
+    # e.g. {'operation_type': 'click', 'resource-id': 'id/menu', 'text': 'Menu'} ---> click|id/menu||Menu
+    return '|'.join([action.get('operation_type', ''), action.get('resource-id', ''), action.get('content-desc', ''),
+                     action.get('text', '')])
+
+
+def get_guidance_operation(guidance):
+    # e.g. <Explore, click, (resource-id:..., class:..., content-desc:..., text:...), Empty> ---> click
+    if '<Skip>' in guidance:
+        return 'Skip'
+    split_list = guidance.strip().lstrip('<').split(',')
+    return split_list[1].strip() if len(split_list) > 1 else ''
+
+
+# Screens of one app and the transitions between them, shared by all the migrations to the app. A screen is identified
+# by its signature, the edges are the actions performed on it and the decisions are the guidance the LLM gave on it
+# for an intention
+class ScreenGraph:
+    # the longest known path followed to reach a screen with a decision
+    MAX_PATH_LENGTH = 4
+
+    def __init__(self, graph_path: Path):
+        self.graph_path = graph_path
+        self.lock = threading.Lock()
+        # {signature:{action key:{guidance, next:{signature:count}}}}
+        self.edge_dict = {}
+        # {signature:{intention:guidance}}
+        self.decision_dict = {}
+        # increased by every change of the decisions
+        self.decision_version = 0
+        if graph_path.exists():
+            with open(graph_path, mode='r', encoding='utf-8') as f:
+                graph_json = json.load(f)
+            self.edge_dict = graph_json['edges']
+            self.decision_dict = graph_json['decisions']
+
+    def add_edge(self, signature, action, guidance, next_signature):
+        if action.get('operation_type') not in NAVIGATION_OPERATION_LIST:
+            return
+        # a step of a path explores, it does not complete an intention
+        guidance = re.sub(r'^<\s*Exact\s*,', '<Explore,', guidance.strip())
+        with self.lock:
+            edge = self.edge_dict.setdefault(signature, {}).setdefault(get_action_key(action),
+                                                                       {'guidance': guidance, 'next': {}})
+            edge['guidance'] = guidance
+            edge['next'][next_signature] = edge['next'].get(next_signature, 0) + 1
+
+    def add_decision(self, signature, intention, guidance):
+        with self.lock:
+            self.decision_dict.setdefault(signature, {})[intention] = guidance.strip()
+            self.decision_version += 1
+
+    def remove_decision(self, signature, intention):
+        with self.lock:
+            if self.decision_dict.get(signature, {}).pop(intention, None) is not None:
+                self.decision_version += 1
+
+    def get_decision(self, signature, intention):
+        with self.lock:
+            return self.decision_dict.get(signature, {}).get(intention)
+
+    def get_decision_list(self):
+        # [(signature, intention, guidance)]
+        with self.lock:
+            return [(signature, intention, guidance) for signature, decision in self.decision_dict.items()
+                    for intention, guidance in decision.items()]
+
+    def find_path(self, signature, intention):
+        # the guidance of the shortest known path to a screen with a decision for the intention, None if unknown
+        with self.lock:
+            target_signature_set = {target_signature for target_signature, decision in self.decision_dict.items()
+                                    if intention in decision}
+            if len(target_signature_set) == 0:
+                return None
+            # signature -> (previous signature, guidance)
+            previous_dict = {signature: None}
+            queue = deque([(signature, 0)])
+            while len(queue) > 0:
+                current_signature, length = queue.popleft()
+                if current_signature in target_signature_set:
+                    guidance_list = []
+                    while previous_dict[current_signature] is not None:
+                        current_signature, guidance = previous_dict[current_signature]
+                        guidance_list.insert(0, guidance)
+                    return guidance_list
+                if length == self.MAX_PATH_LENGTH:
+                    continue
+                for edge in self.edge_dict.get(current_signature, {}).values():
+                    # the screen the action most often led to
+                    next_signature = max(edge['next'].items(), key=lambda x: x[1])[0]
+                    if next_signature not in previous_dict:
+                        previous_dict[next_signature] = (current_signature, edge['guidance'])
+                        queue.append((next_signature, length + 1))
+        return None
+
+    def get_stats(self):
+        with self.lock:
+            return {'screen_count': len(set(self.edge_dict) | set(self.decision_dict)),
+                    'edge_count': sum(len(edges) for edges in self.edge_dict.values()),
+                    'decision_count': sum(len(decision) for decision in self.decision_dict.values())}
+
+    def store(self):
+        with self.lock:
+            if not self.graph_path.parent.exists():
+                self.graph_path.parent.mkdir(parents=True)
+            # write to a temporary file first, an interrupted write should not corrupt the graph
+            temp_path = self.graph_path.with_suffix('.tmp')
+            with open(temp_path, mode='w', encoding='utf-8') as f:
+                json.dump({'edges': self.edge_dict, 'decisions': self.decision_dict}, f)
+            temp_path.replace(self.graph_path)
+
+
+screen_graph_dict = {}
+screen_graph_lock = threading.Lock()
+
+
+def get_screen_graph(graph_folder_path, app_package):
+    # one graph per app is shared by the whole process
+    with screen_graph_lock:
+        graph_path = Path(graph_folder_path) / f'{app_package}.json'
+        key = str(graph_path)
+        if key not in screen_graph_dict:
+            screen_graph_dict[key] = ScreenGraph(graph_path)
+        return screen_graph_dict[key]
+
+
+def build_screen_graph(gpt_client, gpt_trace_folder_path: Path, intention_path: Path, app_package):
+    # add the screens of a recorded GPT trace, the decisions are only known if the trace holds exactly the actions of
+    # the guidance, i.e. no intention was recovered
+    screen_graph = get_screen_graph(gpt_client.SCREEN_GRAPH_PATH, app_package)
+    with open(gpt_trace_folder_path / 'action_trace.json', mode='r', encoding='utf-8') as f:
+        action_trace = json.load(f)
+    guidance_txt_path = Path(gpt_client.GPT_GUIDANCE_PATH) / gpt_trace_folder_path.name / 'gpt.txt'
+    guidance_list = []
+    if guidance_txt_path.exists():
+        with open(guidance_txt_path, mode='r', encoding='utf-8') as f:
+            guidance_list = [x.strip() for x in f.readlines() if x.strip() != '']
+    is_guidance_trace = [get_guidance_operation(guidance) for guidance in guidance_list] == [
+        action['operation_type'] for action in action_trace]
+
+    signature_list = []
+    for action_index, action in enumerate(action_trace):
+        xml_before_path = gpt_trace_folder_path / f'{action_index}_a.xml'
+        xml_after_path = gpt_trace_folder_path / f'{action_index}_b.xml'
+        if not xml_before_path.exists() or not xml_after_path.exists():
+            break
+        signature = gpt_client.get_screen_signature_from_xml(app_package, xml_before_path)
+        signature_list.append(signature)
+        if is_guidance_trace:
+            screen_graph.add_edge(signature, action, guidance_list[action_index],
+                                  gpt_client.get_screen_signature_from_xml(app_package, xml_after_path))
+    if not is_guidance_trace or not intention_path.exists():
+        return screen_graph
+
+    with open(intention_path, mode='r', encoding='utf-8') as f:
+        intention_list = [x.strip() for x in f.readlines()]
+    # the guidance of an intention explores until the exact one, a skipped intention has no decision
+    intention_index = 0
+    intention_decision_list = []
+    for signature, guidance in zip(signature_list, guidance_list):
+        if intention_index >= len(intention_list):
+            break
+        if '<Skip>' in guidance:
+            intention_decision_list = []
+            intention_index += 1
+            continue
+        intention_decision_list.append((signature, guidance))
+        if 'Exact' in guidance:
+            for decision_signature, decision_guidance in intention_decision_list:
+                screen_graph.add_decision(decision_signature, intention_list[intention_index], decision_guidance)
+            intention_decision_list = []
+            intention_index += 1
+    return screen_graph
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the screen graphs of the target apps from the GPT traces')
+    parser.add_argument('--gpt-trace', default='assets/GPT_Trace')
+    parser.add_argument('--intention', default='assets/Intention')
+    args = parser.parse_args()
+
+    from gpt_client import GPTClient
+    from util import load_config
+
+    app_config = load_config('config/app.yaml')
+    gpt_client = GPTClient()
+    screen_graph_set = set()
+    for task_folder_path in sorted(Path(args.gpt_trace).iterdir()):
+        tag_list = task_folder_path.name.split('_')
+        if len(tag_list) != 3 or tag_list[2] not in app_config or not (
+                task_folder_path / 'action_trace.json').exists():
+            continue
+        app_tag, func_tag, target_app_tag = tag_list
+        screen_graph_set.add(build_screen_graph(gpt_client, task_folder_path,
+                                                Path(args.intention) / func_tag / f'{app_tag}.txt',
+                                                app_config[target_app_tag]['appPackage']))
+    gpt_client.store_widget_list_cache()
+    for screen_graph in screen_graph_set:
+        screen_graph.store()
+        print(f'{screen_graph.graph_path}: {screen_graph.get_stats()}')
@@ -0,0 +1,179 @@
+import json
+import threading
+from pathlib import Path
+
+
+# Index of the test cases of the dataset, a test case is only loaded when it is needed
+class TestCaseCatalog:
+    # not a test class of pytest
+    __test__ = False
+
+    INDEX_FILE_NAME = 'test_cases_index.json'
+
+    TEST_CASES_FILE_NAME = 'test_cases.json'
+
+    def __init__(self, item_path: Path):
+        self.item_path = item_path
+        # {app_tag:{functionality_tag:{category, path, mtime}}}
+        self.index = {}
+        # {folder path: mtime}, a test case added or removed changes the mtime of its folder
+        self.folder_mtime_dict = {}
+        # {(app_tag, functionality_tag):[{test_action},{},{}]}
+        self.test_case_dict = {}
+        self.lock = threading.Lock()
+        self.store_lock = threading.Lock()
+        self.load_index()
+
+    def get_functionality_path_list(self):
+        # [(category path, functionality path)], the apks of a category are kept in its subject_apps folder
+        functionality_path_list = []
+        for category_path in self.item_path.glob('*'):
+            if not category_path.is_dir():
+                continue
+            for functionality_path in category_path.glob('*'):
+                if functionality_path.name == 'subject_apps' or not functionality_path.is_dir():
+                    continue
+                functionality_path_list.append((category_path, functionality_path))
+        return functionality_path_list
+
+    def get_folder_path_list(self):
+        folder_path_list = [self.item_path]
+        for category_path, functionality_path in self.get_functionality_path_list():
+            if category_path not in folder_path_list:
+                folder_path_list.append(category_path)
+            folder_path_list.append(functionality_path)
+            base_folder_path = functionality_path / 'base'
+            if base_folder_path.exists():
+                folder_path_list.append(base_folder_path)
+        return folder_path_list
+
+    def is_index_valid(self):
+        if len(self.folder_mtime_dict) == 0:
+            return False
+        for folder_path_str, mtime in self.folder_mtime_dict.items():
+            folder_path = Path(folder_path_str)
+            if not folder_path.exists() or folder_path.stat().st_mtime != mtime:
+                return False
+        return True
+
+    def load_index(self):
+        index_path = self.item_path / self.INDEX_FILE_NAME
+        if index_path.exists():
+            with open(index_path, mode='r', encoding='utf-8') as f:
+                index_json = json.load(f)
+            self.index = index_json['index']
+            self.folder_mtime_dict = index_json['folder_mtime']
+            if self.is_index_valid():
+                return
+        self.build_index()
+
+    def build_index(self):
+        print(f'build the test case index of {self.item_path}')
+        self.index = {}
+        self.folder_mtime_dict = {}
+        for category_path, functionality_path in self.get_functionality_path_list():
+            functionality_tag = functionality_path.stem
+            base_folder_path = functionality_path / 'base'
+            for json_path in base_folder_path.glob('*.json'):
+                app_tag = json_path.stem
+                self.index.setdefault(app_tag, {})[functionality_tag] = {
+                    'category': category_path.name,
+                    'path': str(json_path),
+                    'mtime': json_path.stat().st_mtime}
+        if not self.item_path.exists():
+            return
+        # the dataset changed, the aggregated test cases are stored again
+        self.store_test_cases()
+        self.store_index()
+        # creating the files above changes the mtime of the dataset folder, overwriting the index does not
+        for folder_path in self.get_folder_path_list():
+            self.folder_mtime_dict[str(folder_path)] = folder_path.stat().st_mtime
+        self.store_index()
+
+    def store_index(self):
+        with open(self.item_path / self.INDEX_FILE_NAME, mode='w', encoding='utf-8') as f:
+            json.dump({'index': self.index, 'folder_mtime': self.folder_mtime_dict}, f)
+
+    def store_test_cases(self):
+        test_cases = {}
+        for app_tag, app_index in self.index.items():
+            test_cases[app_tag] = {}
+            for functionality_tag in app_index.keys():
+                test_cases[app_tag][functionality_tag] = self.load_test_case(app_tag, functionality_tag)[0]
+        with open(self.item_path / self.TEST_CASES_FILE_NAME, mode='w', encoding='utf-8') as f:
+            json.dump(test_cases, f)
+
+    def has_test_case(self, app_tag, functionality_tag):
+        return app_tag in self.index and functionality_tag in self.index[app_tag]
+
+    def get_test_case(self, app_tag, functionality_tag):
+        test_case, modified = self.load_test_case(app_tag, functionality_tag)
+        if modified:
+            # a test case edited in place does not change the mtime of its folder, the stored files are updated here
+            with self.store_lock:
+                self.store_test_cases()
+                self.store_index()
+        return test_case
+
+    def load_test_case(self, app_tag, functionality_tag):
+        # returns (test case, whether the json file is modified since it was indexed)
+        entry = self.index[app_tag][functionality_tag]
+        key = (app_tag, functionality_tag)
+        with self.lock:
+            test_case_entry = self.test_case_dict.get(key)
+            json_path = Path(entry['path'])
+            mtime = json_path.stat().st_mtime
+            # the json file is modified after it was loaded
+            if test_case_entry is None or test_case_entry[0] != mtime:
+                with open(json_path, mode='r', encoding='utf-8') as f:
+                    test_case_entry = (mtime, json.load(f))
+                self.test_case_dict[key] = test_case_entry
+            modified = entry['mtime'] != mtime
+            entry['mtime'] = mtime
+        return test_case_entry[1], modified
+
+    def get_category(self, app_tag):
+        for entry in self.index.get(app_tag, {}).values():
+            return entry['category']
+        return ''
+
+    def get_app_tag_list(self, functionality_tag):
+        # all the apps having the test of the functionality
+        return sorted(app_tag for app_tag, app_index in self.index.items() if functionality_tag in app_index)
+
+    def get_functionality_tag_list(self, category=None):
+        functionality_tag_set = set()
+        for app_index in self.index.values():
+            for functionality_tag, entry in app_index.items():
+                if category is None or entry['category'] == category:
+                    functionality_tag_set.add(functionality_tag)
+        return sorted(functionality_tag_set)
+
+    def get_migration_pair_list(self, functionality_tag=None):
+        # (source app, functionality, target app), both apps belong to the same category and have the test
+        migration_pair_list = []
+        functionality_tag_list = [functionality_tag] if functionality_tag is not None \
+            else self.get_functionality_tag_list()
+        for current_functionality_tag in functionality_tag_list:
+            app_tag_list = self.get_app_tag_list(current_functionality_tag)
+            for app_tag in app_tag_list:
+                category = self.index[app_tag][current_functionality_tag]['category']
+                for target_app_tag in app_tag_list:
+                    if target_app_tag == app_tag or \
+                            self.index[target_app_tag][current_functionality_tag]['category'] != category:
+                        continue
+                    migration_pair_list.append((app_tag, current_functionality_tag, target_app_tag))
+        return migration_pair_list
+
+
+test_case_catalog_dict = {}
+test_case_catalog_lock = threading.Lock()
+
+
+def get_test_case_catalog(item_path):
+    # one catalog per dataset path is shared by the whole process
+    with test_case_catalog_lock:
+        key = str(item_path)
+        if key not in test_case_catalog_dict:
+            test_case_catalog_dict[key] = TestCaseCatalog(Path(item_path))
+        return test_case_catalog_dict[key]
@@ -1,74 +1,83 @@
 import json
 import shutil
 import time
-import xml.etree.ElementTree as ET
 from pathlib import Path
 
-from appium import webdriver
-from appium.options.android import UiAutomator2Options
 from appium.webdriver.common.appiumby import AppiumBy
-from omegaconf import OmegaConf
 from selenium.common import WebDriverException
 from selenium.webdriver import ActionChains
 
+from driver_pool import DRIVER_POOL
+from element_locator import locate_ranked_element
+from profiler import PROFILER, profiled
+from screen import ScreenAccessMixin
+from test_case_catalog import get_test_case_catalog
+from threshold import DEVICE_CONNECT_TIMEOUT, APP_LAUNCH_TIMEOUT
+from ui_wait import UIIdleWaiter
+from util import load_config
+
 
 # Run the test case, capture the necessary data to build the trace
-class TestExecutor:
+class TestExecutor(ScreenAccessMixin):
+    # not a test class of pytest
+    __test__ = False
+
     ITeM_PATH = r'ITeM_Dataset'
 
     TRACE_PATH = r'assets/Trace'
 
+    APPIUM_SERVER_URL = 'http://localhost:4723'
+
+    # upper bound of the wait for the screen to be idle after an action
     ACTION_SLEEP_INTERVAL = 5
 
+    # 'appium': everything through the Appium session, 'adb': screenshots through adb
+    DEVICE_IO_BACKEND = 'appium'
+    # see GPTClient.IGNORE_UNIMPORTANT_VIEWS
+    IGNORE_UNIMPORTANT_VIEWS = False
+
     def __init__(self):
-        # {app_tag:{functionality_tag:[{test_action},{},{}]}}
-        self.test_cases = {}
-        self.load_test_cases()
-
-    def load_test_cases(self):
-        item_path = Path(self.ITeM_PATH)
-        for category_json_path in item_path.glob('*'):
-            for functionality_path in category_json_path.glob('*'):
-                functionality_tag = functionality_path.stem
-                if functionality_tag == 'subject_apps' or not functionality_path.is_dir():
-                    continue
-                base_folder_path = functionality_path / 'base'
-                for json_path in base_folder_path.glob('*'):
-                    app_tag = json_path.stem
-                    if app_tag not in self.test_cases.keys():
-                        self.test_cases[app_tag] = {}
-                    app_test_cases = self.test_cases[app_tag]
-                    with open(json_path, mode='r', encoding='utf-8') as f:
-                        app_test_cases[functionality_tag] = json.load(f)
-        test_cases_json_path = item_path / 'test_cases.json'
-        if not test_cases_json_path.exists():
-            test_cases_json_path.touch()
-        with open(test_cases_json_path, mode='w', encoding='utf-8') as f:
-            json.dump(self.test_cases, f)
+        # the test cases are loaded lazily, {app_tag:{functionality_tag:[{test_action},{},{}]}}
+        self.test_case_catalog = get_test_case_catalog(self.ITeM_PATH)
+        self.screen_snapshot = None
+        self.ui_idle_waiter = UIIdleWaiter()
+        self.appium_server_url = self.APPIUM_SERVER_URL
+        self.driver_pool = DRIVER_POOL
+        self.device_io = None
+        # the device of the device pool, None for the default device in config/env.yaml
+        self.device = None
+
+    def use_device(self, device):
+        self.device = device
+        self.appium_server_url = device.appium_server_url
 
     def execute_test_case(self, app_tag, functionality_tag):
-        test_case = self.test_cases[app_tag][functionality_tag]
-        app_config = OmegaConf.load('config/app.yaml')[app_tag]
-        env_config = OmegaConf.load('config/env.yaml')['Appium']
-        desired_caps = self.generate_desired_caps(app_config, env_config)
+        test_case = self.test_case_catalog.get_test_case(app_tag, functionality_tag)
+        app_config = load_config('config/app.yaml')[app_tag]
+        env_config = load_config('config/env.yaml')['Appium']
+        desired_caps = self.generate_desired_caps(app_config, env_config, self.device)
         trace_path = Path(self.TRACE_PATH)
 
         # create trace folders
         app_trace_folder = trace_path / app_tag
-        if not app_trace_folder.exists():
-            app_trace_folder.mkdir()
+        # the tasks running at the same time may create it as well
+        app_trace_folder.mkdir(exist_ok=True)
         app_func_trace_folder = app_trace_folder / functionality_tag
         if app_func_trace_folder.exists():
             shutil.rmtree(app_func_trace_folder)
         app_func_trace_folder.mkdir()
 
         action_trace = []
-        driver = self.connect_device(desired_caps)
-        for action_index, test_action in enumerate(test_case):
-            self.execute_test_action(driver, test_action, app_func_trace_folder, action_index, action_trace)
-        driver.quit()
-        self.store_action_trace(action_trace, app_func_trace_folder)
-
+        with PROFILER.task(f'{app_tag}_{functionality_tag}', app_func_trace_folder / 'profile.jsonl'):
+            driver = self.connect_device(desired_caps)
+            for action_index, test_action in enumerate(test_case):
+                PROFILER.set_context(step=action_index)
+                self.execute_test_action(driver, test_action, app_func_trace_folder, action_index, action_trace)
+            # the session stays in the driver pool for the next test case
+            print(f'driver pool: {self.driver_pool.get_metrics()}')
+            self.store_action_trace(action_trace, app_func_trace_folder)
+
+    @profiled('file_io.json')
     def store_action_trace(self, action_trace, app_func_trace_folder):
         action_trace_path = app_func_trace_folder / 'action_trace.json'
         if not action_trace_path.exists():
@@ -84,38 +93,38 @@ class TestExecutor:
 
         print(test_action)
         event_type = test_action['event_type']
-        current_screen_xml = str(driver.page_source)
+        screen_snapshot = self.get_screen_snapshot(driver)
 
-        driver.get_screenshot_as_file(str(screenshot_before_path))
-        xml_root_before = ET.fromstring(str(driver.page_source))
-        xml_tree_before = ET.ElementTree(xml_root_before)
-        xml_tree_before.write(xml_before_path)
+        self.get_device_io(driver).save_screenshot(screenshot_before_path)
+        screen_snapshot.write_xml(xml_before_path)
         match event_type:
             case 'gui':
                 id = test_action['resource-id']
                 content_desc = test_action['content-desc']
                 text = test_action['text']
                 clazz = test_action['class']
-                el = self.find_element(id, clazz, text, content_desc, current_screen_xml, driver)
+                el = self.find_element(id, clazz, text, content_desc, screen_snapshot, driver)
                 self.record_action(el, action_trace, test_action)
+                screen_snapshot.invalidate()
                 self.perform_gui_action(el, test_action['action'], driver)
 
             case 'SYS_EVENT':
                 self.record_action(None, action_trace, test_action)
+                screen_snapshot.invalidate()
                 self.perform_sys_event(test_action['action'], driver)
 
             case 'oracle':
                 self.record_action(None, action_trace, test_action)
                 self.perform_oracle(test_action['action'], driver)
 
-        driver.get_screenshot_as_file(str(screenshot_after_path))
-        xml_root_after = ET.fromstring(str(driver.page_source))
-        xml_tree_after = ET.ElementTree(xml_root_after)
-        xml_tree_after.write(xml_after_path)
+        self.get_device_io(driver).save_screenshot(screenshot_after_path)
+        # the after screen is also the before screen of the next action
+        screen_snapshot.write_xml(xml_after_path)
 
     def perform_oracle(self, action, driver):
         pass
 
+    @profiled('action')
     def perform_sys_event(self, action, driver):
         action_name = action[0]
         if action_name == 'KEY_BACK':
@@ -132,96 +141,51 @@ class TestExecutor:
         else:
             assert False, 'Unknown SYS_EVENT'
 
-    def get_child_node_list(self, root, child_node_list):
-        has_child = False
-        for child in root:
-            has_child = True
-            self.get_child_node_list(child, child_node_list)
-
-        if not has_child:
-            child_node_list.append(root)
-
-    def get_parent_node_list(self, root, parent_node_list):
-        has_child = False
-        for child in root:
-            has_child = True
-            self.get_parent_node_list(child, parent_node_list)
-        if has_child:
-            parent_node_list.append(root)
-
-    def find_element(self, id, clazz, text, content_desc, xml, driver):
-        el = None
-        root = ET.fromstring(xml)
+    @profiled('element_lookup')
+    def find_element(self, id, clazz, text, content_desc, screen_snapshot, driver):
         xml_node_list = []
-        child_xml_node_list = []
-        parent_xml_node_list = []
-        self.get_child_node_list(root, child_xml_node_list)
-        self.get_parent_node_list(root, parent_xml_node_list)
-        xml_node_list.extend(child_xml_node_list)
-        xml_node_list.extend(parent_xml_node_list)
-
-        candidate_elements = {}
-        for xml_node in xml_node_list:
-            node_id = xml_node.attrib['resource-id'] if 'resource-id' in xml_node.attrib else ''
-            node_clazz = xml_node.attrib['class'] if 'class' in xml_node.attrib else ''
-            node_text = xml_node.attrib['text'] if 'text' in xml_node.attrib else ''
-            node_content_desc = xml_node.attrib['content-desc'] if 'content-desc' in xml_node.attrib else ''
-
-            if (id, text) == (node_id, node_text) and id != '' and text != '' and clazz != 'android.widget.EditText':
-                ui_selector = f'new UiSelector().resourceId("{id}").text("{text}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                # set priority, the lower value, the higher priority
-                candidate_elements[el] = 0
-
-            elif (id, clazz) == (node_id, node_clazz) and id != '':
-                ui_selector = f'new UiSelector().resourceId("{id}").className("{clazz}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                candidate_elements[el] = 1
+        xml_node_list.extend(screen_snapshot.child_node_list)
+        xml_node_list.extend(screen_snapshot.parent_node_list)
+        el = locate_ranked_element(driver, screen_snapshot, xml_node_list,
+                                   lambda xml_node: self.rank_xml_node(xml_node, id, clazz, text, content_desc))
+        print(
+            f'el:(id:{el.get_attribute("resource-id")}, text:{el.get_attribute("text")}, content-desc:{el.get_attribute("content-desc")})')
+        print('================================================')
+        return el
 
-            elif (id, text) == (node_id, node_text) and id != '' and text != '':
-                ui_selector = f'new UiSelector().resourceId("{id}").text("{text}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                # set priority, the lower value, the higher priority
-                candidate_elements[el] = 0
+    def rank_xml_node(self, xml_node, id, clazz, text, content_desc):
+        node_id = xml_node.attrib['resource-id'] if 'resource-id' in xml_node.attrib else ''
+        node_clazz = xml_node.attrib['class'] if 'class' in xml_node.attrib else ''
+        node_text = xml_node.attrib['text'] if 'text' in xml_node.attrib else ''
+        node_content_desc = xml_node.attrib['content-desc'] if 'content-desc' in xml_node.attrib else ''
 
-            elif (id, clazz) == (node_id, node_clazz) and id == '':
-                if text == node_text and text != '':
-                    ui_selector = f'new UiSelector().className("{clazz}").text("{text}")'
-                    el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
+        if (id, text) == (node_id, node_text) and id != '' and text != '' and clazz != 'android.widget.EditText':
+            # set priority, the lower value, the higher priority
+            return 0, {'resource-id': id, 'text': text}
 
-                elif content_desc == node_content_desc and content_desc != '':
-                    ui_selector = f'new UiSelector().className("{clazz}").description("{content_desc}")'
-                    el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
+        elif (id, clazz) == (node_id, node_clazz) and id != '':
+            return 1, {'resource-id': id, 'class': clazz}
 
-                candidate_elements[el] = 2
+        elif (id, text) == (node_id, node_text) and id != '' and text != '':
+            return 0, {'resource-id': id, 'text': text}
 
-            elif (id, clazz) == (
-            node_id, node_clazz) and id == '' and text == '' and clazz == 'android.widget.EditText':
-                ui_selector = f'new UiSelector().className("{clazz}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                candidate_elements[el] = 3
+        elif (id, clazz) == (node_id, node_clazz) and id == '':
+            if text == node_text and text != '':
+                return 2, {'class': clazz, 'text': text}
 
-            elif (id, clazz) == (
-            node_id, node_clazz) and id == '' and text == '' and clazz == 'android.widget.EditText':
-                ui_selector = f'new UiSelector().className("{clazz}")'
-                el = driver.find_element(by=AppiumBy.ANDROID_UIAUTOMATOR, value=ui_selector)
-                candidate_elements[el] = 3
+            elif content_desc == node_content_desc and content_desc != '':
+                return 2, {'class': clazz, 'content-desc': content_desc}
 
-        candidate_elements = sorted(candidate_elements.items(), key=lambda x: x[1], reverse=False)
-        for candidate_element in candidate_elements:
-            if candidate_element[0] is not None:
-                el = candidate_element[0]
-                break
-        print(
-            f'el:(id:{el.get_attribute("resource-id")}, text:{el.get_attribute("text")}, content-desc:{el.get_attribute("content-desc")})')
-        print('================================================')
-        return el
+            elif text == '' and clazz == 'android.widget.EditText':
+                return 3, {'class': clazz}
+        return None
 
+    @profiled('action')
     def perform_gui_action(self, el, action, driver):
         action_name = action[0]
         if action_name == 'click':
             el.click()
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif 'send_keys' in action_name:
             # if the el is not edittext, click it to show the edittext, special for a15
@@ -250,7 +214,7 @@ class TestExecutor:
                 self.hide_keyboard(driver)
             elif action_name.endswith('enter'):
                 driver.press_keycode(66)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif action_name == 'swipe_right':
             # e.g., {'x': 202, 'y': 265, 'width': 878, 'height': 57}
@@ -258,7 +222,7 @@ class TestExecutor:
             start_x, start_y, end_x, end_y = rect['x'] + rect['width'] / 4, rect['y'] + rect['height'] / 2, \
                                              rect['x'] + rect['width'] * 3 / 4, rect['y'] + rect['height'] / 2
             driver.swipe(start_x, start_y, end_x, end_y, 500)
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         elif action_name == 'long_press':
             ac = ActionChains(driver)
@@ -266,7 +230,7 @@ class TestExecutor:
             ac.w3c_actions.pointer_action.pause(2)
             ac.w3c_actions.pointer_action.release()
             ac.perform()
-            time.sleep(self.ACTION_SLEEP_INTERVAL)
+            self.wait_for_idle(driver)
 
         else:
             assert False, "Unknown action to be performed"
@@ -278,20 +242,22 @@ class TestExecutor:
                 test_action['bounds'] = bounds
         action_trace.append(test_action)
 
+    @profiled('connect')
     def connect_device(self, desired_caps):
-        appium_server_url = 'http://localhost:4723'
-        driver = webdriver.Remote(appium_server_url, options=UiAutomator2Options().load_capabilities(desired_caps))
-        time.sleep(15)
+        # a warm session of the device is reused, the app state is reset instead
+        driver = self.driver_pool.acquire(self.appium_server_url, desired_caps)
+        self.invalidate_screen_snapshot()
+        self.wait_for_idle(driver, DEVICE_CONNECT_TIMEOUT)
         return driver
 
     def launch_app(self, driver, desired_caps):
         driver.activate_app(desired_caps['appPackage'])
-        time.sleep(20)
+        self.wait_for_idle(driver, APP_LAUNCH_TIMEOUT)
 
     def close_app(self, driver, desired_caps):
         try:
             driver.terminate_app(desired_caps['appPackage'])
-            time.sleep(5)
+            self.wait_for_idle(driver)
         except:
             driver.terminate_app(desired_caps['appPackage'])
 
@@ -310,7 +276,7 @@ class TestExecutor:
             method_trace_folder_path.mkdir()
         return method_trace_folder_path
 
-    def generate_desired_caps(self, app_config, env_config):
+    def generate_desired_caps(self, app_config, env_config, device=None):
         desired_caps = {'appium-version': env_config['appium-version'],
                         'platformName': env_config['platformName'],
                         'platformVersion': env_config['platformVersion'],
@@ -323,6 +289,8 @@ class TestExecutor:
             desired_caps['autoGrantPermissions'] = env_config['autoGrantPermissions']
         else:
             desired_caps['noReset'] = app_config['noReset']
+        if device is not None:
+            device.apply_to(desired_caps)
         return desired_caps
 
     def hide_keyboard(self, driver):
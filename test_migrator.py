@@ -1,17 +1,19 @@
 import json
 import shutil
-import time
 from pathlib import Path
 from typing import Tuple, List
 
-from appium import webdriver
-from appium.options.android import UiAutomator2Options
-from omegaconf import OmegaConf
-
 from gpt_client import GPTClient
+from profiler import PROFILER, profiled
+from test_case_catalog import get_test_case_catalog
+from transcript import TranscriptWriter
+from util import load_config
 
 
 class TestMigrator:
+    # not a test class of pytest
+    __test__ = False
+
     INTENTION_PATH = r'assets/Intention'
 
     RESULT_PATH = r'assets/Result'
@@ -24,12 +26,21 @@ class TestMigrator:
 
     ITeM_PATH = r'ITeM_Dataset'
 
-    def __init__(self):
-        self.gpt_client = GPTClient()
+    # the spans of every task are written to profile.jsonl, also in the chrome trace format if enabled
+    PROFILE_CHROME_TRACE = False
+
+    def __init__(self, gpt_client=None):
+        self.gpt_client = gpt_client if gpt_client is not None else GPTClient()
         # e.g. {a11_b12:[action_trace], a11_b12:[],...}
         self.app_func_to_action_trace = {}
-        self.test_cases = {}
-        self.load_test_cases()
+        # the test cases are loaded lazily
+        self.test_case_catalog = get_test_case_catalog(self.ITeM_PATH)
+        # the device of the device pool, None for the default device in config/env.yaml
+        self.device = None
+
+    def use_device(self, device):
+        self.device = device
+        self.gpt_client.appium_server_url = device.appium_server_url
 
     def get_action_trace(self, app_tag, func_tag):
         trace_path = Path(self.TRACE_PATH)
@@ -55,13 +66,17 @@ class TestMigrator:
         self.get_action_trace(app_tag, func_tag)
         action_trace = self.app_func_to_action_trace[f'{app_tag}_{func_tag}']
         screen_before_path_list, screen_after_path_list = self.get_screen_list(app_tag, func_tag)
-        responses, time = self.gpt_client.generate_test_intention(action_trace, screen_before_path_list,
-                                                                  screen_after_path_list)
-
         intention_path = Path(self.INTENTION_PATH)
         func_intention_path = intention_path / func_tag
-        if not func_intention_path.exists():
-            func_intention_path.mkdir()
+        # the tasks running at the same time may create it as well
+        func_intention_path.mkdir(exist_ok=True)
+        # e.g. Intention/b11/a11_messages.jsonl
+        app_intention_transcript_path = func_intention_path / f'{app_tag}_messages.jsonl'
+        with PROFILER.task(f'intention_{app_tag}_{func_tag}', *self.get_profile_path(func_intention_path, app_tag)):
+            with TranscriptWriter(app_intention_transcript_path) as transcript:
+                responses, time = self.gpt_client.generate_test_intention(action_trace, screen_before_path_list,
+                                                                          screen_after_path_list, transcript)
+
         app_intention_path = func_intention_path / f'{app_tag}.txt'
         if app_intention_path.exists():
             app_intention_path.unlink()
@@ -77,31 +92,7 @@ class TestMigrator:
             f.write(str(time))
 
     def connect_device(self, desired_caps):
-        appium_server_url = 'http://localhost:4723'
-        driver = webdriver.Remote(appium_server_url, options=UiAutomator2Options().load_capabilities(desired_caps))
-        time.sleep(15)
-        return driver
-
-    def load_test_cases(self):
-        item_path = Path(self.ITeM_PATH)
-        for category_json_path in item_path.glob('*'):
-            for functionality_path in category_json_path.glob('*'):
-                functionality_tag = functionality_path.stem
-                if functionality_tag == 'subject_apps' or not functionality_path.is_dir():
-                    continue
-                base_folder_path = functionality_path / 'base'
-                for json_path in base_folder_path.glob('*'):
-                    app_tag = json_path.stem
-                    if app_tag not in self.test_cases.keys():
-                        self.test_cases[app_tag] = {}
-                    app_test_cases = self.test_cases[app_tag]
-                    with open(json_path, mode='r', encoding='utf-8') as f:
-                        app_test_cases[functionality_tag] = json.load(f)
-        test_cases_json_path = item_path / 'test_cases.json'
-        if not test_cases_json_path.exists():
-            test_cases_json_path.touch()
-        with open(test_cases_json_path, mode='w', encoding='utf-8') as f:
-            json.dump(self.test_cases, f)
+        return self.gpt_client.connect_device(desired_caps)
 
     def migration_test_oracles(self, app_tag, func_tag, target_app_tag, execution=False):
         gpt_trace_path = Path(self.GPT_TRACE_PATH)
@@ -116,28 +107,28 @@ class TestMigrator:
         current_task_oracle_path = current_task_oracle_folder_path / 'oracle.txt'
         if not current_task_oracle_path.exists():
             current_task_oracle_path.touch()
-        current_task_messages_list_path = current_task_oracle_folder_path / 'messages_list.json'
-        if not current_task_messages_list_path.exists():
-            current_task_messages_list_path.touch()
-
-        test_case = self.test_cases[app_tag][func_tag]
-        if execution:
-            app_config = OmegaConf.load('config/app.yaml')[target_app_tag]
-            env_config = OmegaConf.load('config/env.yaml')['Appium']
-            desired_caps = self.generate_desired_caps(app_config, env_config)
-            driver = self.connect_device(desired_caps)
-            self.gpt_client.perform_gpt_guidance(driver, current_task_gpt_trace_folder_path)
-        oracle_list, messages_list = self.gpt_client.generate_oracle_from_gpt_trace(current_task_gpt_trace_folder_path,
-                                                                                    test_case,
-                                                                                    current_task_original_trace_folder_path,
-                                                                                    current_task_oracle_folder_path)
+        current_task_transcript_path = current_task_oracle_folder_path / 'messages.jsonl'
+
+        test_case = self.test_case_catalog.get_test_case(app_tag, func_tag)
+        with PROFILER.task(f'oracle_{current_task_oracle_folder_path.stem}',
+                           *self.get_profile_path(current_task_oracle_folder_path)):
+            if execution:
+                app_config = load_config('config/app.yaml')[target_app_tag]
+                env_config = load_config('config/env.yaml')['Appium']
+                desired_caps = self.generate_desired_caps(app_config, env_config, self.device)
+                driver = self.connect_device(desired_caps)
+                self.gpt_client.perform_gpt_guidance(driver, current_task_gpt_trace_folder_path)
+            with TranscriptWriter(current_task_transcript_path) as transcript:
+                oracle_list = self.gpt_client.generate_oracle_from_gpt_trace(current_task_gpt_trace_folder_path,
+                                                                             test_case,
+                                                                             current_task_original_trace_folder_path,
+                                                                             current_task_oracle_folder_path,
+                                                                             transcript)
 
         with open(current_task_oracle_path, mode='w', encoding='utf-8') as f:
             for oracle in oracle_list:
                 f.write(oracle + '\n')
 
-        self.store_json_file(messages_list, current_task_messages_list_path)
-
     def perform_test_intentions(self, intention_app_tag, intention_func_tag, target_app_tag):
         intention_path = Path(self.INTENTION_PATH)
         gpt_trace_path = Path(self.GPT_TRACE_PATH)
@@ -151,25 +142,35 @@ class TestMigrator:
             intention_list = f.readlines()
         intention_list = [x.strip() for x in intention_list]
 
-        app_config = OmegaConf.load('config/app.yaml')[target_app_tag]
-        env_config = OmegaConf.load('config/env.yaml')['Appium']
-        desired_caps = self.generate_desired_caps(app_config, env_config)
-        driver = self.connect_device(desired_caps)
-        action_trace, messages_list = self.gpt_client.perform_intention(intention_list, driver,
-                                                                        current_migration_task_trace, desired_caps)
-
-        current_intention_message_path = current_migration_task_trace / 'messages.json'
-        current_intention_action_trace_path = current_migration_task_trace / 'action_trace.json'
-        self.store_json_file(action_trace, current_intention_action_trace_path)
-        self.store_json_file(messages_list, current_intention_message_path)
-
+        app_config = load_config('config/app.yaml')[target_app_tag]
+        env_config = load_config('config/env.yaml')['Appium']
+        desired_caps = self.generate_desired_caps(app_config, env_config, self.device)
+        with PROFILER.task(current_migration_task_trace.stem, *self.get_profile_path(current_migration_task_trace)):
+            driver = self.connect_device(desired_caps)
+            # the conversations are streamed to the file while the intentions are performed
+            current_intention_transcript_path = current_migration_task_trace / 'messages.jsonl'
+            with TranscriptWriter(current_intention_transcript_path) as transcript:
+                action_trace = self.gpt_client.perform_intention(intention_list, driver, current_migration_task_trace,
+                                                                 desired_caps, transcript=transcript)
+
+            current_intention_action_trace_path = current_migration_task_trace / 'action_trace.json'
+            self.store_json_file(action_trace, current_intention_action_trace_path)
+        print(f'driver pool: {self.gpt_client.driver_pool.get_metrics()}')
+
+    def get_profile_path(self, folder_path: Path, app_tag=None):
+        # the intentions of the apps share the folder of the functionality, e.g. Intention/b11/a11_profile.jsonl
+        prefix = f'{app_tag}_' if app_tag is not None else ''
+        chrome_trace_path = folder_path / f'{prefix}profile_chrome.json' if self.PROFILE_CHROME_TRACE else None
+        return folder_path / f'{prefix}profile.jsonl', chrome_trace_path
+
+    @profiled('file_io.json')
     def store_json_file(self, obj, path):
         if not path.exists():
             path.touch()
         with open(path, mode='w', encoding='utf-8') as f:
             json.dump(obj, f)
 
-    def generate_desired_caps(self, app_config, env_config):
+    def generate_desired_caps(self, app_config, env_config, device=None):
         desired_caps = {'appium-version': env_config['appium-version'],
                         'platformName': env_config['platformName'],
                         'platformVersion': env_config['platformVersion'],
@@ -182,4 +183,6 @@ class TestMigrator:
             desired_caps['autoGrantPermissions'] = env_config['autoGrantPermissions']
         else:
             desired_caps['noReset'] = app_config['noReset']
+        if device is not None:
+            device.apply_to(desired_caps)
         return desired_caps
@@ -0,0 +1,60 @@
+import json
+
+from appium.webdriver.common.appiumby import AppiumBy
+
+from fake_driver import FakeDriver
+from llm_stub_server import ReplayAnswerProvider
+from transcript import TranscriptWriter
+
+
+def create_screen_xml(screen_index):
+    return (f'<hierarchy><node class="android.widget.TextView" text="Screen {screen_index}" resource-id="title"/>'
+            f'<node class="android.widget.Button" text="Go" resource-id="btn{screen_index}"/></hierarchy>')
+
+
+def create_trace_folder(trace_folder_path):
+    trace_folder_path.mkdir()
+    action_trace = []
+    for step_index in range(2):
+        (trace_folder_path / f'{step_index}_a.xml').write_text(create_screen_xml(step_index), encoding='utf-8')
+        (trace_folder_path / f'{step_index}_b.xml').write_text(create_screen_xml(step_index + 1), encoding='utf-8')
+        action_trace.append({'event_type': 'gui', 'action': ['click'], 'resource-id': f'btn{step_index}'})
+    (trace_folder_path / 'action_trace.json').write_text(json.dumps(action_trace), encoding='utf-8')
+
+
+def test_fake_driver_replays_the_screens_of_the_trace(tmp_path):
+    trace_folder_path = tmp_path / 'a11_b11_a12'
+    create_trace_folder(trace_folder_path)
+    driver = FakeDriver(trace_folder_path, 'com.android.browser')
+    assert 'Screen 0' in driver.page_source
+
+    for step_index in range(2):
+        driver.find_element(AppiumBy.ID, f'btn{step_index}').click()
+        # the screen changes when the hierarchy is read again
+        assert f'Screen {step_index + 1}' in driver.page_source
+    driver.back()
+    assert 'Screen 2' in driver.page_source
+    assert driver.action_count == 3
+
+    driver.activate_app('com.android.browser')
+    assert 'Screen 0' in driver.page_source
+    element = driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, 'new UiSelector().className("android.widget.Button")')
+    assert element.get_attribute('resource-id') == 'btn0'
+
+
+def test_replay_answers_the_recorded_questions_first(tmp_path):
+    transcript_path = tmp_path / 'messages.jsonl'
+    with TranscriptWriter(transcript_path) as transcript:
+        for question, answer in [('q0', 'a0'), ('q1', 'a1'), ('q0', 'a2')]:
+            transcript.record([{'role': 'user', 'content': question}, {'role': 'assistant', 'content': answer}])
+    answer_provider = ReplayAnswerProvider([transcript_path], 'default')
+
+    def ask(question):
+        return answer_provider([{'role': 'user', 'content': question}])
+
+    assert [ask('q1'), ask('q0'), ask('q0')] == ['a1', 'a0', 'a2']
+    assert answer_provider.hit_count == 3
+    # the changed questions get the answers not handed out yet, then the default answer
+    answer_provider = ReplayAnswerProvider([transcript_path], 'default')
+    assert [ask('q1'), ask('other'), ask('other'), ask('other')] == ['a1', 'a0', 'a2', 'default']
+    assert answer_provider.miss_count == 3
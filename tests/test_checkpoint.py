@@ -0,0 +1,95 @@
+from checkpoint import EmulatorSnapshotCheckpointer
+from fake_driver import FakeEmulatorDevice
+from gpt_client import GPTClient
+
+
+def test_save_keeps_only_the_latest_snapshot():
+    device = FakeEmulatorDevice()
+    checkpointer = EmulatorSnapshotCheckpointer(device, 'a11_b11_a12')
+    assert checkpointer.save(2)
+    # the same checkpoint is not saved twice
+    assert checkpointer.save(2)
+    assert checkpointer.save(5)
+
+    assert device.command_list == ['avd snapshot save item_a11_b11_a12_2', 'avd snapshot save item_a11_b11_a12_5',
+                                   'avd snapshot delete item_a11_b11_a12_2']
+    assert device.snapshot_set == {'item_a11_b11_a12_5'}
+
+
+def test_restore_loads_the_latest_snapshot():
+    device = FakeEmulatorDevice()
+    checkpointer = EmulatorSnapshotCheckpointer(device, 'a11_b11_a12')
+    assert checkpointer.restore() == -1
+    checkpointer.save(3)
+    assert checkpointer.restore() == 3
+    assert device.command_list[-1] == 'avd snapshot load item_a11_b11_a12_3'
+
+    checkpointer.clear()
+    assert device.snapshot_set == set()
+    assert checkpointer.restore() == -1
+
+
+def test_failed_save_keeps_the_previous_checkpoint():
+    device = FakeEmulatorDevice()
+    checkpointer = EmulatorSnapshotCheckpointer(device, 'a11_b11_a12')
+    checkpointer.save(1)
+    device.failing_command_list = ['avd snapshot save']
+    assert not checkpointer.save(4)
+    assert device.snapshot_set == {'item_a11_b11_a12_1'}
+    assert checkpointer.restore() == 1
+
+
+# Records how recover_app brings the app back instead of driving a device
+class RecoveryGPTClient(GPTClient):
+
+    def __init__(self):
+        self.call_list = []
+        self.performed_guidance_list = []
+
+    def hide_keyboard(self, driver):
+        pass
+
+    def connect_device(self, desired_caps, reset_app=True):
+        self.call_list.append('connect')
+        return 'new driver'
+
+    def reattach_device(self, driver, desired_caps):
+        self.call_list.append('reattach')
+        return driver
+
+    def generate_screenshot_and_xml_path(self, path, action_index):
+        return None, None, None, None
+
+    def record_screenshot_and_xml(self, screenshot_path, xml_path, driver):
+        pass
+
+    def capture_current_screen_widgets(self, driver):
+        return [], None
+
+    def parse_and_perform_gpt_guidance(self, guidance, driver, action_trace, widget_list):
+        self.performed_guidance_list.append(guidance)
+        return guidance
+
+
+def test_recover_app_replays_after_the_checkpoint():
+    gpt_client = RecoveryGPTClient()
+    checkpointer = EmulatorSnapshotCheckpointer(FakeEmulatorDevice(), 'a11_b11_a12')
+    checkpointer.save(2)
+    driver, action_index = gpt_client.recover_app(['g0', 'g1', 'g2', 'g3'], 'driver', {}, 10, None, [],
+                                                  checkpointer)
+    assert gpt_client.call_list == ['reattach']
+    assert gpt_client.performed_guidance_list == ['g2', 'g3']
+    assert (driver, action_index) == ('driver', 12)
+
+
+def test_recover_app_replays_everything_when_the_load_fails():
+    gpt_client = RecoveryGPTClient()
+    device = FakeEmulatorDevice(['avd snapshot load'])
+    checkpointer = EmulatorSnapshotCheckpointer(device, 'a11_b11_a12')
+    checkpointer.save(2)
+    driver, action_index = gpt_client.recover_app(['g0', 'g1', 'g2', 'g3'], 'driver', {}, 10, None, [],
+                                                  checkpointer)
+    assert device.command_list[-1] == 'avd snapshot load item_a11_b11_a12_2'
+    assert gpt_client.call_list == ['connect']
+    assert gpt_client.performed_guidance_list == ['g0', 'g1', 'g2', 'g3']
+    assert (driver, action_index) == ('new driver', 14)
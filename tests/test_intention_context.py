@@ -0,0 +1,73 @@
+from gpt_client import GPTClient
+
+
+# Answers the requests from a list instead of the LLM and keeps the requests
+class StubLLMClient:
+
+    def __init__(self, answer_list):
+        self.answer_list = answer_list
+        self.messages_list = []
+
+    def complete_many_sync(self, model, messages_batch):
+        self.messages_list.extend([list(messages) for messages in messages_batch])
+        return [self.answer_list.pop(0) for _ in messages_batch]
+
+
+class StubGPTClient(GPTClient):
+    INTENTION_WINDOW_SIZE = 2
+
+    PROMPT_COMPACTION = False
+
+    def __init__(self, mode, answer_list):
+        self.INTENTION_CONTEXT_MODE = mode
+        self.llm_client = StubLLMClient(answer_list)
+        self.prompt_token_count_list = []
+
+    def generate_gui_event_prompt(self, action_trace, screen_before_path_list, screen_after_path_list):
+        return [f'event {index}' for index in range(len(action_trace))]
+
+    def store_widget_list_cache(self):
+        pass
+
+
+def test_window_request_carries_the_summary_and_the_last_events():
+    event_count = 5
+    gpt_client = StubGPTClient('window', [f'<Intent: step {index}>' for index in range(event_count)])
+    responses, _ = gpt_client.generate_test_intention([{}] * event_count, [], [])
+
+    assert responses == [f'<Intent: step {index}>' for index in range(event_count)]
+    assert len(gpt_client.prompt_token_count_list) == event_count
+    for event_index, messages in enumerate(gpt_client.llm_client.messages_list):
+        event_list = [message['content'] for message in messages if message['content'].startswith('event')]
+        window_start = max(0, event_index - StubGPTClient.INTENTION_WINDOW_SIZE)
+        assert event_list == [f'event {index}' for index in range(window_start, event_index + 1)]
+        summary_list = [message for message in messages if message['content'].startswith('The intentions of')]
+        assert len(summary_list) == (1 if window_start > 0 else 0)
+        # the role, the task, the summary and at most INTENTION_WINDOW_SIZE answered events before the current one
+        assert len(messages) <= 3 + 2 * StubGPTClient.INTENTION_WINDOW_SIZE + 1
+
+
+def test_full_request_keeps_the_whole_conversation():
+    gpt_client = StubGPTClient('full', ['<Intent: a>', '<Intent: b>'])
+    responses, _ = gpt_client.generate_test_intention([{}, {}], [], [])
+
+    assert responses == ['<Intent: a>', '<Intent: b>']
+    assert [message['content'] for message in gpt_client.llm_client.messages_list[1][2:]] == [
+        'event 0', '<Intent: a>', 'event 1']
+
+
+def test_batched_answer_with_a_wrong_intention_count_falls_back_to_the_window():
+    gpt_client = StubGPTClient('batch', ['<Intent: a> <Intent: b>', '<Intent: a>', '<Intent: b>', '<Intent: c>'])
+    responses, _ = gpt_client.generate_test_intention([{}, {}, {}], [], [])
+
+    assert responses == ['<Intent: a>', '<Intent: b>', '<Intent: c>']
+    assert len(gpt_client.llm_client.messages_list) == 4
+    assert len(gpt_client.prompt_token_count_list) == 4
+
+
+def test_batched_answer_is_split_into_the_intentions():
+    gpt_client = StubGPTClient('batch', ['<Intent: a>\n<Intent: b>'])
+    responses, _ = gpt_client.generate_test_intention([{}, {}], [], [])
+
+    assert responses == ['<Intent: a>', '<Intent: b>']
+    assert len(gpt_client.llm_client.messages_list) == 1
@@ -0,0 +1,89 @@
+import pytest
+
+import llm_cache
+from llm_cache import LLMCacheMissError, LLMResponseCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(llm_cache, 'time', fake_clock)
+    return fake_clock
+
+
+def create_messages(content):
+    return [{'role': 'user', 'content': content}]
+
+
+def get_key_set(cache):
+    return {key for (key,) in cache.connection.execute('SELECT key FROM response')}
+
+
+def test_response_is_replayed_for_the_normalized_messages(tmp_path, clock):
+    cache = LLMResponseCache(tmp_path / 'cache.sqlite')
+    cache.put('model', create_messages('click the button'), 'answer')
+    assert cache.get('model', create_messages(' click the button\n')) == 'answer'
+    assert cache.get('other_model', create_messages('click the button')) is None
+    assert cache.get_stats() == {'hit': 1, 'miss': 1}
+
+
+def test_expired_response_is_a_miss(tmp_path, clock):
+    cache = LLMResponseCache(tmp_path / 'cache.sqlite', ttl=10)
+    cache.put('model', create_messages('a'), 'answer a')
+    clock.now += 5
+    assert cache.get('model', create_messages('a')) == 'answer a'
+    clock.now += 10
+    assert cache.get('model', create_messages('a')) is None
+    assert len(get_key_set(cache)) == 0
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, clock):
+    cache = LLMResponseCache(tmp_path / 'cache.sqlite', max_entry_count=2)
+    for content in ['a', 'b']:
+        cache.put('model', create_messages(content), f'answer {content}')
+        clock.now += 1
+    # the hit on a is written with the next insertion, so b is the least recently used one
+    assert cache.get('model', create_messages('a')) == 'answer a'
+    clock.now += 1
+    cache.put('model', create_messages('c'), 'answer c')
+    assert get_key_set(cache) == {cache.get_key('model', create_messages(content)) for content in ['a', 'c']}
+
+
+def test_responses_are_evicted_down_to_the_total_size(tmp_path, clock):
+    cache = LLMResponseCache(tmp_path / 'cache.sqlite', max_total_size=25)
+    for content in ['a', 'b', 'c']:
+        cache.put('model', create_messages(content), content * 10)
+        clock.now += 1
+    assert get_key_set(cache) == {cache.get_key('model', create_messages(content)) for content in ['b', 'c']}
+
+
+def test_access_time_is_written_on_close(tmp_path, clock):
+    cache_path = tmp_path / 'cache.sqlite'
+    cache = LLMResponseCache(cache_path)
+    cache.put('model', create_messages('a'), 'answer a')
+    clock.now += 1
+    cache.get('model', create_messages('a'))
+    cache.close()
+    cache = LLMResponseCache(cache_path)
+    assert cache.connection.execute('SELECT accessed_at FROM response').fetchone()[0] == clock.now
+
+
+def test_replay_only_miss_raises(tmp_path, clock):
+    cache_path = tmp_path / 'cache.sqlite'
+    LLMResponseCache(cache_path).put('model', create_messages('a'), 'answer a')
+    cache = LLMResponseCache(cache_path, LLMResponseCache.REPLAY_ONLY)
+    assert cache.get('model', create_messages('a')) == 'answer a'
+    with pytest.raises(LLMCacheMissError):
+        cache.get('model', create_messages('b'))
+    # the replayed responses are not stored again
+    cache.put('model', create_messages('b'), 'answer b')
+    assert len(get_key_set(cache)) == 1
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+from llm_client import AsyncLLMClient, SlotLimiter, get_thread_loop_state
+from llm_stub_server import LLMStubServer
+
+
+def test_clients_of_all_threads_share_the_concurrency_limit():
+    stub_server = LLMStubServer(lambda messages: messages[-1]['content'], delay=0.05)
+    stub_server.start()
+    answer_list_list = []
+    try:
+        def run(thread_index):
+            # every thread has its own client, like the migrators of the scheduler workers
+            llm_client = AsyncLLMClient('key', stub_server.api_base, max_concurrency=2)
+            answer_list_list.append(llm_client.complete_many_sync(
+                'model', [[{'role': 'user', 'content': f'{thread_index}-{index}'}] for index in range(4)]))
+
+        thread_list = [threading.Thread(target=run, args=(thread_index,)) for thread_index in range(3)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+    finally:
+        stub_server.stop()
+    assert sorted(answer for answer_list in answer_list_list for answer in answer_list) == sorted(
+        f'{thread_index}-{index}' for thread_index in range(3) for index in range(4))
+    assert stub_server.max_in_flight_count == 2
+
+
+def test_calls_of_a_thread_reuse_its_loop_and_session():
+    stub_server = LLMStubServer(lambda messages: 'answer')
+    stub_server.start()
+    try:
+        llm_client = AsyncLLMClient('key', stub_server.api_base)
+        llm_client.complete_sync('model', [{'role': 'user', 'content': 'a'}])
+        loop_state = dict(get_thread_loop_state())
+        AsyncLLMClient('key', stub_server.api_base).complete_sync('model', [{'role': 'user', 'content': 'b'}])
+    finally:
+        stub_server.stop()
+    assert get_thread_loop_state() == loop_state
+    assert loop_state['session'] is not None and not loop_state['session'].closed
+
+
+def test_cancelled_waiter_passes_the_slot_on():
+    slot_limiter = SlotLimiter(1)
+
+    async def run():
+        await slot_limiter.acquire()
+        cancelled_task = asyncio.create_task(slot_limiter.acquire())
+        waiting_task = asyncio.create_task(slot_limiter.acquire())
+        await asyncio.sleep(0)
+        cancelled_task.cancel()
+        slot_limiter.release()
+        await asyncio.wait_for(waiting_task, 1)
+        slot_limiter.release()
+
+    asyncio.run(run())
+    assert slot_limiter.used_count == 0
+    assert len(slot_limiter.waiter_deque) == 0
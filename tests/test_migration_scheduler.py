@@ -0,0 +1,124 @@
+import threading
+import time
+
+from migration_scheduler import (Device, MigrationScheduler, MigrationTask, PipelineScheduler, PipelineTask,
+                                 ProgressLedger)
+
+
+# Stand-in for TestMigrator, records the tasks run on every device and fails the tasks it is told to
+class FakeMigrator:
+
+    def __init__(self, device, log, fail_count_dict):
+        self.device = device
+        self.log = log
+        # task id -> number of the attempts that still fail
+        self.fail_count_dict = fail_count_dict
+
+    def use_device(self, device):
+        self.device = device
+
+    def run(self, task_id):
+        # the stages without device run on None
+        udid, platform_version = (self.device.udid, self.device.platform_version) if self.device else (None, None)
+        with self.log['lock']:
+            if udid is not None and udid in self.log['busy_device_set']:
+                self.log['overlap_count'] += 1
+            self.log['busy_device_set'].add(udid)
+        time.sleep(0.01)
+        with self.log['lock']:
+            self.log['busy_device_set'].discard(udid)
+            self.log['run_list'].append((task_id, udid, platform_version))
+            if self.fail_count_dict.get(task_id, 0) > 0:
+                self.fail_count_dict[task_id] -= 1
+                raise RuntimeError(f'{task_id} failed')
+
+    def perform_test_intentions(self, app_tag, func_tag, target_app_tag):
+        self.run(f'{app_tag}_{func_tag}_{target_app_tag}')
+
+    def migration_test_oracles(self, app_tag, func_tag, target_app_tag, execution):
+        pass
+
+    def generate_test_intentions(self, app_tag, func_tag):
+        self.run(f'intention_{app_tag}_{func_tag}')
+
+
+def create_log():
+    return {'lock': threading.Lock(), 'busy_device_set': set(), 'overlap_count': 0, 'run_list': []}
+
+
+def create_scheduler(tmp_path, log, fail_count_dict, scheduler_class=MigrationScheduler, **kwargs):
+    device_list = [Device('emulator-5554', 4723, '9'), Device('emulator-5556', 4725, '11'),
+                   Device('emulator-5558', 4727, '11')]
+    ledger = ProgressLedger(tmp_path / 'ledger.json')
+    return scheduler_class(device_list, ledger, lambda device: FakeMigrator(device, log, fail_count_dict), **kwargs)
+
+
+def test_tasks_run_on_leased_devices_of_their_version(tmp_path):
+    log = create_log()
+    task_list = [MigrationTask('a11', f'b1{index}', 'a12', '9') for index in range(3)] + \
+                [MigrationTask('a21', f'b2{index}', 'a22', '11') for index in range(4)]
+    records = create_scheduler(tmp_path, log, {}).run(task_list)
+
+    assert sorted(task_id for task_id, _, _ in log['run_list']) == sorted(task.task_id for task in task_list)
+    version_dict = {task.task_id: task.platform_version for task in task_list}
+    assert all(version_dict[task_id] == platform_version for task_id, _, platform_version in log['run_list'])
+    assert log['overlap_count'] == 0
+    assert all(record['status'] == ProgressLedger.DONE for record in records.values())
+
+
+def test_task_without_device_of_its_version_is_not_run(tmp_path):
+    log = create_log()
+    records = create_scheduler(tmp_path, log, {}).run([MigrationTask('a31', 'b31', 'a32', '7')])
+    assert log['run_list'] == []
+    assert records == {}
+
+
+def test_failed_task_is_retried_up_to_the_attempt_limit(tmp_path):
+    log = create_log()
+    task_list = [MigrationTask('a11', 'b11', 'a12', '9'), MigrationTask('a11', 'b12', 'a12', '9')]
+    records = create_scheduler(tmp_path, log, {'a11_b11_a12': 1, 'a11_b12_a12': 5}, max_attempt_count=3).run(
+        task_list)
+
+    assert records['a11_b11_a12']['status'] == ProgressLedger.DONE
+    assert records['a11_b11_a12']['attempt_count'] == 2
+    assert records['a11_b12_a12']['status'] == ProgressLedger.FAILED
+    assert records['a11_b12_a12']['attempt_count'] == 3
+
+
+def test_resume_skips_done_tasks_and_keeps_the_attempt_count(tmp_path):
+    log = create_log()
+    task_list = [MigrationTask('a11', 'b11', 'a12', '9'), MigrationTask('a11', 'b12', 'a12', '9')]
+    create_scheduler(tmp_path, log, {'a11_b12_a12': 5}, max_attempt_count=2).run(task_list)
+    assert [task_id for task_id, _, _ in log['run_list']].count('a11_b12_a12') == 2
+
+    # the next run starts from the ledger of the previous one
+    log = create_log()
+    task_list = [MigrationTask('a11', 'b11', 'a12', '9'), MigrationTask('a11', 'b12', 'a12', '9')]
+    records = create_scheduler(tmp_path, log, {}, max_attempt_count=3).run(task_list)
+    assert log['run_list'] == [('a11_b12_a12', 'emulator-5554', '9')]
+    assert records['a11_b12_a12']['status'] == ProgressLedger.DONE
+    assert records['a11_b12_a12']['attempt_count'] == 3
+
+
+def test_pipeline_resume_gives_up_the_stages_out_of_attempts(tmp_path):
+    log = create_log()
+    intention_task = PipelineTask(PipelineTask.INTENTION, 'a11', 'b11')
+    migration_task = PipelineTask(PipelineTask.MIGRATION, 'a11', 'b11', 'a12', '9', [intention_task])
+    create_scheduler(tmp_path, log, {'intention_a11_b11': 5}, PipelineScheduler, max_attempt_count=2).run(
+        [intention_task, migration_task])
+    assert [task_id for task_id, _, _ in log['run_list']] == ['intention_a11_b11'] * 2
+
+    log = create_log()
+    intention_task = PipelineTask(PipelineTask.INTENTION, 'a11', 'b11')
+    migration_task = PipelineTask(PipelineTask.MIGRATION, 'a11', 'b11', 'a12', '9', [intention_task])
+    records = create_scheduler(tmp_path, log, {}, PipelineScheduler, max_attempt_count=2).run(
+        [intention_task, migration_task], resume=True)
+    assert log['run_list'] == []
+    assert records[migration_task.task_id]['status'] == ProgressLedger.FAILED
+
+
+def test_device_overrides_the_default_device_of_the_desired_caps():
+    desired_caps = {'deviceName': 'emulator-5554', 'platformVersion': '6.0', 'appPackage': 'a'}
+    Device('emulator-5556', 4725, '11', 8201).apply_to(desired_caps)
+    assert desired_caps == {'deviceName': 'emulator-5556', 'udid': 'emulator-5556', 'platformVersion': '11',
+                            'systemPort': 8201, 'appPackage': 'a'}
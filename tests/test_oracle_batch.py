@@ -0,0 +1,43 @@
+from gpt_client import GPTClient
+
+
+# Answers the prompts from a list instead of the LLM
+class ScriptedGPTClient(GPTClient):
+
+    def __init__(self, answer_list_list):
+        self.answer_list_list = answer_list_list
+        self.prompt_count_list = []
+
+    def prompt_batch(self, messages_batch, transcript=None):
+        self.prompt_count_list.append(len(messages_batch))
+        return self.answer_list_list.pop(0)
+
+
+def create_oracle_job(resource_id, new_xml_path):
+    return {'event': {'action': ['wait_until_element_presence', 10, 'id', resource_id], 'resource-id': resource_id,
+                      'content-desc': '', 'text': ''},
+            'old_xml_path': 'old.xml', 'new_xml_path': new_xml_path}
+
+
+def create_oracle_job_list():
+    return [create_oracle_job('a', 'new_1.xml'), create_oracle_job('b', 'new_1.xml'), create_oracle_job('c', 'new_2.xml')]
+
+
+XML_PATH_TO_WIDGET_LIST = {'old.xml': [], 'new_1.xml': [], 'new_2.xml': []}
+
+
+def test_numbered_answers_are_assigned_to_their_assertions():
+    gpt_client = ScriptedGPTClient([[
+        'Assertion 1 may be <index:7>. Final: <assertion 2, index:4> <assertion 1, index:3>', '<index:5>']])
+    widget_index_list = gpt_client.migrate_oracles_in_batch(create_oracle_job_list(), XML_PATH_TO_WIDGET_LIST,
+                                                            None, None)
+    assert widget_index_list == [3, 4, 5]
+    assert gpt_client.prompt_count_list == [2]
+
+
+def test_incomplete_batched_answer_falls_back_to_one_prompt_per_oracle():
+    gpt_client = ScriptedGPTClient([['<index:1> <index:2>', '<index:5>'], ['<index:3>', '<index:-1>']])
+    widget_index_list = gpt_client.migrate_oracles_in_batch(create_oracle_job_list(), XML_PATH_TO_WIDGET_LIST,
+                                                            None, None)
+    assert widget_index_list == [3, -1, 5]
+    assert gpt_client.prompt_count_list == [2, 2]
@@ -0,0 +1,72 @@
+from prompt_compaction import count_message_tokens, encode_screen_diff, fit_messages
+
+
+def create_widget(text, clickable='true'):
+    return {'class': 'android.widget.TextView', 'resource-id': f'id/{text}', 'content-desc': '', 'text': text,
+            'clickable': clickable}
+
+
+def create_conversation(turn_count):
+    messages = [{'role': 'system', 'content': 'You are an expert in Android.'},
+                {'role': 'user', 'content': 'Realize the intention step by step. ' * 5}]
+    for turn in range(turn_count):
+        messages.append({'role': 'assistant', 'content': f'I will click it. <Exact, click, {turn}, Empty>'})
+        messages.append({'role': 'user', 'content': f'The screen after the operation {turn} displays widgets. ' * 10})
+    return messages
+
+
+def test_fitted_messages_are_within_the_budget():
+    messages = create_conversation(20)
+    for token_budget in [250, 400, 800]:
+        fitted_messages = fit_messages(messages, token_budget)
+        assert count_message_tokens(fitted_messages) <= token_budget
+        assert fitted_messages[-1] == messages[-1]
+
+
+def test_head_and_performed_operations_are_kept():
+    messages = create_conversation(20)
+    fitted_messages = fit_messages(messages, 800)
+    assert fitted_messages[:2] == messages[:2]
+    summary = fitted_messages[2]['content']
+    assert summary.startswith(f'({len(messages) - len(fitted_messages) + 1} earlier messages are omitted')
+    assert '<Exact, click, 0, Empty>' in summary
+    assert fitted_messages[3:] == messages[len(messages) - len(fitted_messages) + 3:]
+
+
+def test_messages_within_the_budget_are_not_changed():
+    messages = create_conversation(2)
+    assert fit_messages(messages, count_message_tokens(messages)) is messages
+
+
+def test_oldest_operations_are_left_out_of_the_summary():
+    messages = create_conversation(20)
+    fitted_messages = fit_messages(messages, 250)
+    assert len(fitted_messages) == 4
+    assert 'operations performed in them' in fitted_messages[2]['content']
+    assert '<Exact, click, 0, Empty>' not in fitted_messages[2]['content']
+    assert '<Exact, click, 19, Empty>' in fitted_messages[2]['content']
+
+
+def test_last_message_is_kept_over_the_budget():
+    messages = create_conversation(3)
+    fitted_messages = fit_messages(messages, 1)
+    assert len(fitted_messages) == 4
+    assert fitted_messages[-1] == messages[-1]
+
+
+def test_small_change_is_encoded_as_a_diff():
+    before_widget_list = [create_widget(f'item {index}') for index in range(10)]
+    after_widget_list = before_widget_list[:5] + [create_widget('new item')] + before_widget_list[5:]
+    diff = encode_screen_diff(before_widget_list, after_widget_list)
+    assert diff.startswith('the widgets before the operation, now at these indexes: 0-4 (was 0-4), 6-10 (was 5-9)')
+    assert '5|TextView|id/new item||new item|y' in diff
+    assert 'item 0' not in diff
+
+
+def test_large_change_falls_back_to_the_full_table():
+    before_widget_list = [create_widget('title'), create_widget('item')]
+    after_widget_list = [create_widget('title')] + [create_widget(f'other {index}') for index in range(5)]
+    assert encode_screen_diff(before_widget_list, after_widget_list).startswith('these widgets:\n')
+    assert encode_screen_diff(before_widget_list, before_widget_list) == 'the same widgets as before the operation'
+    new_widget_list = [create_widget('login', 'false')]
+    assert encode_screen_diff(before_widget_list, new_widget_list).startswith('a new screen with these widgets:\n')
@@ -0,0 +1,38 @@
+import json
+import os
+
+from test_case_catalog import TestCaseCatalog
+
+
+def create_test_case(item_path, category, functionality_tag, app_tag, test_case):
+    base_folder_path = item_path / category / functionality_tag / 'base'
+    base_folder_path.mkdir(parents=True, exist_ok=True)
+    json_path = base_folder_path / f'{app_tag}.json'
+    with open(json_path, mode='w', encoding='utf-8') as f:
+        json.dump(test_case, f)
+    return json_path
+
+
+def test_subject_apps_of_a_category_are_not_indexed(tmp_path):
+    create_test_case(tmp_path, 'a1', 'b11', 'a11', [{'action': 'click'}])
+    create_test_case(tmp_path, 'a1', 'subject_apps', 'a11', [])
+    catalog = TestCaseCatalog(tmp_path)
+    assert catalog.get_functionality_tag_list() == ['b11']
+    assert str(tmp_path / 'a1' / 'subject_apps') not in catalog.folder_mtime_dict
+
+
+def test_test_case_edited_in_place_updates_the_stored_test_cases(tmp_path):
+    json_path = create_test_case(tmp_path, 'a1', 'b11', 'a11', [{'action': 'click'}])
+    TestCaseCatalog(tmp_path)
+
+    with open(json_path, mode='w', encoding='utf-8') as f:
+        json.dump([{'action': 'swipe'}], f)
+    # the folder keeps its mtime, only the file changes
+    mtime = json_path.stat().st_mtime + 1
+    os.utime(json_path, (mtime, mtime))
+    catalog = TestCaseCatalog(tmp_path)
+    assert catalog.is_index_valid()
+    assert catalog.get_test_case('a11', 'b11') == [{'action': 'swipe'}]
+    with open(tmp_path / TestCaseCatalog.TEST_CASES_FILE_NAME, mode='r', encoding='utf-8') as f:
+        assert json.load(f) == {'a11': {'b11': [{'action': 'swipe'}]}}
+    assert TestCaseCatalog(tmp_path).index['a11']['b11']['mtime'] == mtime
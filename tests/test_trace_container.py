@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from trace_container import TraceContainerReader, convert_trace_folder, open_trace
+
+STEP_COUNT = 3
+
+
+def create_trace_folder(trace_folder_path):
+    # the screen after an action is the screen before the next one
+    trace_folder_path.mkdir()
+    for step_index in range(STEP_COUNT):
+        for side, screen_index in [('a', step_index), ('b', step_index + 1)]:
+            (trace_folder_path / f'{step_index}_{side}.xml').write_text(f'<hierarchy index="{screen_index}"/>',
+                                                                        encoding='utf-8')
+            (trace_folder_path / f'{step_index}_{side}.png').write_bytes(bytes([screen_index]) * 64)
+    action_trace = [{'event_type': 'gui', 'action': ['click']} for _ in range(STEP_COUNT)]
+    (trace_folder_path / 'action_trace.json').write_text(json.dumps(action_trace), encoding='utf-8')
+
+
+def test_container_reads_the_same_as_the_folder(tmp_path):
+    trace_folder_path = tmp_path / 'a11_b11_a12'
+    create_trace_folder(trace_folder_path)
+    container_path = tmp_path / 'a11_b11_a12.itrace'
+    raw_size, _ = convert_trace_folder(trace_folder_path, container_path)
+    assert raw_size == sum(file_path.stat().st_size for file_path in trace_folder_path.glob('*'))
+
+    folder_reader = open_trace(trace_folder_path)
+    container_reader = open_trace(container_path)
+    try:
+        assert isinstance(container_reader, TraceContainerReader)
+        assert container_reader.step_count == folder_reader.step_count == STEP_COUNT
+        for step_index in range(STEP_COUNT):
+            for side in ['a', 'b']:
+                assert container_reader.get_xml(step_index, side) == folder_reader.get_xml(step_index, side)
+                assert container_reader.get_screenshot(step_index, side) == \
+                       folder_reader.get_screenshot(step_index, side)
+        assert container_reader.read_action_trace() == folder_reader.read_action_trace()
+        # one xml and one png per distinct screen, plus the action trace
+        assert len(container_reader.blob_dict) == 2 * (STEP_COUNT + 1) + 1
+    finally:
+        container_reader.close()
+        folder_reader.close()
+
+
+@pytest.mark.parametrize('content', [b'', b'ITRACE01', b'ITRACE01' + b'\0' * 64])
+def test_file_with_a_bad_footer_is_not_a_container(tmp_path, content):
+    container_path = tmp_path / 'broken.itrace'
+    container_path.write_bytes(content)
+    with pytest.raises(ValueError):
+        TraceContainerReader(container_path)
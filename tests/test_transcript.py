@@ -0,0 +1,73 @@
+import json
+
+from transcript import TranscriptWriter, read_transcript
+
+
+def create_message(role, content):
+    return {'role': role, 'content': content}
+
+
+def read_record_list(transcript_path):
+    with open(transcript_path, mode='r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_only_the_new_messages_of_a_conversation_are_written(tmp_path):
+    transcript_path = tmp_path / 'messages.jsonl'
+    messages = [create_message('system', 'role'), create_message('user', 'q1')]
+    with TranscriptWriter(transcript_path) as transcript:
+        messages.append(create_message('assistant', 'a1'))
+        transcript.record(messages)
+        messages.extend([create_message('user', 'q2'), create_message('assistant', 'a2')])
+        transcript.record(messages)
+        # recorded again without new messages
+        transcript.record(messages)
+
+    record_list = read_record_list(transcript_path)
+    assert [(record['conversation'], record['turn'], len(record['messages'])) for record in record_list] == [
+        (0, 0, 3), (0, 1, 2)]
+
+
+def test_conversation_recorded_again_after_its_eviction_is_continued(tmp_path, monkeypatch):
+    monkeypatch.setattr(TranscriptWriter, 'MAX_OPEN_CONVERSATION_COUNT', 2)
+    transcript_path = tmp_path / 'messages.jsonl'
+    messages_list = [[create_message('user', f'q{index}')] for index in range(3)]
+    with TranscriptWriter(transcript_path) as transcript:
+        for messages in messages_list:
+            transcript.record(messages)
+        assert id(messages_list[0]) not in transcript.open_conversation_dict
+        messages_list[0].append(create_message('assistant', 'a0'))
+        transcript.record(messages_list[0])
+
+    record_list = read_record_list(transcript_path)
+    assert [(record['conversation'], record['turn']) for record in record_list] == [(0, 0), (1, 0), (2, 0), (0, 1)]
+    assert record_list[-1]['messages'] == [create_message('assistant', 'a0')]
+
+
+def test_reused_id_of_an_evicted_conversation_starts_a_new_one(tmp_path, monkeypatch):
+    monkeypatch.setattr(TranscriptWriter, 'MAX_OPEN_CONVERSATION_COUNT', 1)
+    transcript_path = tmp_path / 'messages.jsonl'
+    with TranscriptWriter(transcript_path) as transcript:
+        messages = [create_message('user', 'q0')]
+        transcript.record(messages)
+        transcript.record([create_message('user', 'q1')])
+        # another list with the id of the evicted one
+        messages[:] = [create_message('user', 'other')]
+        transcript.record(messages)
+
+    assert [record['conversation'] for record in read_record_list(transcript_path)] == [0, 1, 2]
+
+
+def test_read_transcript_rebuilds_the_conversations(tmp_path):
+    transcript_path = tmp_path / 'messages.jsonl'
+    first_messages = [create_message('user', 'q0'), create_message('assistant', 'a0')]
+    second_messages = [create_message('user', 'q1'), create_message('assistant', 'a1')]
+    with TranscriptWriter(transcript_path) as transcript:
+        transcript.record(first_messages)
+        transcript.record(second_messages)
+        first_messages.extend([create_message('user', 'q2'), create_message('assistant', 'a2')])
+        transcript.record(first_messages)
+        # appended after the last request
+        second_messages.append(create_message('user', 'q3'))
+
+    assert read_transcript(transcript_path) == [first_messages, second_messages]
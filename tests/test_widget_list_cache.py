@@ -0,0 +1,66 @@
+import os
+
+import widget_list_cache
+from widget_list_cache import SIDECAR_NAME, WidgetListCache
+
+XML = ('<hierarchy><node class="android.widget.FrameLayout"><node class="android.widget.Button" '
+       'resource-id="com.app:id/{name}" text="{name}" bounds="[0,0][10,10]" /></node></hierarchy>')
+
+
+def write_trace_folder(folder_path, name):
+    folder_path.mkdir()
+    (folder_path / '0_a.xml').write_text(XML.format(name=name), encoding='utf-8')
+    return folder_path / '0_a.xml'
+
+
+def load_text_list(xml_path):
+    return [line for line in xml_path.read_text(encoding='utf-8').split('"') if line.startswith('com.app')]
+
+
+def test_sidecar_is_reused_by_a_new_cache(tmp_path):
+    xml_path = write_trace_folder(tmp_path / 'a11', 'ok')
+    cache = WidgetListCache()
+    assert cache.get(xml_path, 'ids', load_text_list) == ['com.app:id/ok']
+    assert cache.get(xml_path, 'ids', load_text_list) == ['com.app:id/ok']
+    cache.flush()
+    assert (xml_path.parent / SIDECAR_NAME).exists()
+    assert cache.sidecar_dict == {}
+
+    cache = WidgetListCache()
+    assert cache.get(xml_path, 'ids', lambda path: None) == ['com.app:id/ok']
+    # a new mtime of the same content keeps the entry
+    os.utime(xml_path, ns=(0, 0))
+    cache = WidgetListCache()
+    assert cache.get(xml_path, 'ids', lambda path: None) == ['com.app:id/ok']
+    assert cache.get_stats() == {'hit': 0, 'sidecar_hit': 1, 'miss': 0}
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    xml_path = write_trace_folder(tmp_path / 'a11', 'old')
+    cache = WidgetListCache()
+    cache.get(xml_path, 'ids', load_text_list)
+    cache.flush()
+    xml_path.write_text(XML.format(name='new_name'), encoding='utf-8')
+    assert WidgetListCache().get(xml_path, 'ids', load_text_list) == ['com.app:id/new_name']
+
+
+def test_sidecars_are_evicted_over_the_limit(tmp_path):
+    cache = WidgetListCache(max_sidecar_count=2)
+    xml_path_list = [write_trace_folder(tmp_path / f'a1{index}', f'w{index}') for index in range(4)]
+    for xml_path in xml_path_list:
+        cache.get(xml_path, 'ids', load_text_list)
+    assert len(cache.sidecar_dict) == 2
+    # the evicted sidecars were stored
+    assert (xml_path_list[0].parent / SIDECAR_NAME).exists()
+    assert (xml_path_list[1].parent / SIDECAR_NAME).exists()
+
+
+def test_memory_mode_neither_hashes_nor_writes(tmp_path, monkeypatch):
+    xml_path = write_trace_folder(tmp_path / 'a11', 'ok')
+    monkeypatch.setattr(widget_list_cache, 'hash_file', lambda path: 1 / 0)
+    cache = WidgetListCache()
+    assert cache.get(xml_path, 'ids', load_text_list, use_sidecar=False) == ['com.app:id/ok']
+    assert cache.get(xml_path, 'ids', load_text_list, use_sidecar=False) == ['com.app:id/ok']
+    cache.flush()
+    assert not (xml_path.parent / SIDECAR_NAME).exists()
+    assert cache.get_stats() == {'hit': 1, 'sidecar_hit': 0, 'miss': 1}
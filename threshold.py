@@ -1 +1,18 @@
 EXPLORATION_LIMIT = 5
+
+# the screen is regarded as idle once its hierarchy stays unchanged for the quiet period (seconds)
+UI_IDLE_QUIET_PERIOD = 2
+UI_IDLE_POLL_INTERVAL = 0.5
+# 'hierarchy' or 'activity'
+UI_IDLE_FINGERPRINT = 'hierarchy'
+# upper bounds of the waits (seconds)
+DEVICE_CONNECT_TIMEOUT = 15
+APP_LAUNCH_TIMEOUT = 20
+
+# the cosine similarity of the intentions above which the guidance of another intention on the same screen is reused
+GUIDANCE_SIMILARITY_THRESHOLD = 0.8
+
+# the score of the best matching widget above which an oracle is migrated without the LLM, and its least lead over the
+# second best widget
+ORACLE_MATCH_THRESHOLD = 0.9
+ORACLE_MATCH_MARGIN = 0.15
@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import mmap
+import re
+import struct
+import zlib
+from pathlib import Path
+
+# e.g. 3_a.xml, 12_b.png
+STEP_FILE_PATTERN = re.compile(r'^(\d+)_([ab])\.(xml|png)$')
+
+
+# Single-file container of a trace folder, the screens are stored once by content hash and the xml is compressed
+# layout: magic | blob | blob | ... | compressed json index | index offset, index length, magic
+class TraceContainerWriter:
+    MAGIC = b'ITRACE01'
+
+    FOOTER_FORMAT = '<QQ8s'
+
+    def __init__(self, container_path: Path):
+        self.container_path = container_path
+        self.file = open(container_path, mode='wb')
+        self.file.write(self.MAGIC)
+        # {hash:[offset, length, compression]}
+        self.blob_dict = {}
+        # {step index:{'a_xml': hash, 'a_png': hash, 'b_xml': hash, 'b_png': hash}}
+        self.step_dict = {}
+        # {file name: hash}, e.g. action_trace.json
+        self.file_dict = {}
+        self.raw_size = 0
+
+    def add_blob(self, content: bytes, compress):
+        self.raw_size += len(content)
+        content_hash = hashlib.sha1(content).hexdigest()
+        if content_hash in self.blob_dict:
+            return content_hash
+        data = zlib.compress(content, 6) if compress else content
+        self.blob_dict[content_hash] = [self.file.tell(), len(data), 'zlib' if compress else 'raw']
+        self.file.write(data)
+        return content_hash
+
+    def add_step_file(self, step_index, side, file_type, content: bytes):
+        # png is already compressed, only the xml is compressed again
+        content_hash = self.add_blob(content, file_type == 'xml')
+        self.step_dict.setdefault(step_index, {})[f'{side}_{file_type}'] = content_hash
+
+    def add_file(self, file_name, content: bytes):
+        self.file_dict[file_name] = self.add_blob(content, True)
+
+    def close(self):
+        index = {'blobs': self.blob_dict,
+                 'steps': [self.step_dict.get(x, {}) for x in range(max(self.step_dict.keys(), default=-1) + 1)],
+                 'files': self.file_dict}
+        index_data = zlib.compress(json.dumps(index).encode('utf-8'))
+        index_offset = self.file.tell()
+        self.file.write(index_data)
+        self.file.write(struct.pack(self.FOOTER_FORMAT, index_offset, len(index_data), self.MAGIC))
+        self.file.close()
+
+
+# Random access to the steps of a trace container, the container is memory-mapped
+class TraceContainerReader:
+
+    def __init__(self, container_path: Path):
+        self.trace_path = container_path
+        self.file = open(container_path, mode='rb')
+        footer_size = struct.calcsize(TraceContainerWriter.FOOTER_FORMAT)
+        if container_path.stat().st_size < len(TraceContainerWriter.MAGIC) + footer_size:
+            self.file.close()
+            raise ValueError(f'{container_path} is not a trace container')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_length, magic = struct.unpack(TraceContainerWriter.FOOTER_FORMAT,
+                                                          self.buffer[-footer_size:])
+        if magic != TraceContainerWriter.MAGIC or self.buffer[:len(magic)] != magic:
+            self.close()
+            raise ValueError(f'{container_path} is not a trace container')
+        index = json.loads(zlib.decompress(self.buffer[index_offset:index_offset + index_length]).decode('utf-8'))
+        self.blob_dict = index['blobs']
+        self.step_list = index['steps']
+        self.file_dict = index['files']
+
+    @property
+    def step_count(self):
+        return len(self.step_list)
+
+    def read_blob(self, content_hash):
+        offset, length, compression = self.blob_dict[content_hash]
+        data = self.buffer[offset:offset + length]
+        return zlib.decompress(data) if compression == 'zlib' else data
+
+    def get_step_file(self, step_index, side, file_type):
+        content_hash = self.step_list[step_index].get(f'{side}_{file_type}')
+        return None if content_hash is None else self.read_blob(content_hash)
+
+    def get_xml(self, step_index, side):
+        content = self.get_step_file(step_index, side, 'xml')
+        return None if content is None else content.decode('utf-8')
+
+    def get_screenshot(self, step_index, side):
+        return self.get_step_file(step_index, side, 'png')
+
+    def get_file(self, file_name):
+        return self.read_blob(self.file_dict[file_name]) if file_name in self.file_dict else None
+
+    def get_file_name_list(self):
+        return list(self.file_dict.keys())
+
+    def read_action_trace(self):
+        content = self.get_file('action_trace.json')
+        return None if content is None else json.loads(content.decode('utf-8'))
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+
+# The same api on a trace folder of assets/Trace or assets/GPT_Trace
+class TraceFolderReader:
+
+    def __init__(self, trace_folder_path: Path):
+        self.trace_path = trace_folder_path
+        self.step_list = []
+        self.file_dict = {}
+        for file_path in trace_folder_path.glob('*'):
+            match = STEP_FILE_PATTERN.match(file_path.name)
+            if match is None:
+                if file_path.is_file():
+                    self.file_dict[file_path.name] = file_path
+                continue
+            step_index, side, file_type = int(match.group(1)), match.group(2), match.group(3)
+            while len(self.step_list) <= step_index:
+                self.step_list.append({})
+            self.step_list[step_index][f'{side}_{file_type}'] = file_path
+
+    @property
+    def step_count(self):
+        return len(self.step_list)
+
+    def get_step_file(self, step_index, side, file_type):
+        file_path = self.step_list[step_index].get(f'{side}_{file_type}')
+        return None if file_path is None else file_path.read_bytes()
+
+    def get_xml(self, step_index, side):
+        content = self.get_step_file(step_index, side, 'xml')
+        return None if content is None else content.decode('utf-8')
+
+    def get_screenshot(self, step_index, side):
+        return self.get_step_file(step_index, side, 'png')
+
+    def get_file(self, file_name):
+        return self.file_dict[file_name].read_bytes() if file_name in self.file_dict else None
+
+    def get_file_name_list(self):
+        return list(self.file_dict.keys())
+
+    def read_action_trace(self):
+        content = self.get_file('action_trace.json')
+        return None if content is None else json.loads(content.decode('utf-8'))
+
+    def close(self):
+        pass
+
+
+def open_trace(trace_path: Path):
+    if trace_path.is_dir():
+        return TraceFolderReader(trace_path)
+    return TraceContainerReader(trace_path)
+
+
+def convert_trace_folder(trace_folder_path: Path, container_path: Path):
+    folder_reader = TraceFolderReader(trace_folder_path)
+    writer = TraceContainerWriter(container_path)
+    for step_index in range(folder_reader.step_count):
+        for side in ['a', 'b']:
+            for file_type in ['xml', 'png']:
+                content = folder_reader.get_step_file(step_index, side, file_type)
+                if content is not None:
+                    writer.add_step_file(step_index, side, file_type, content)
+    for file_name in folder_reader.get_file_name_list():
+        writer.add_file(file_name, folder_reader.get_file(file_name))
+    writer.close()
+    return writer.raw_size, container_path.stat().st_size
+
+
+def find_trace_folder_list(root_path: Path):
+    # the folders that directly contain the step files
+    trace_folder_set = set()
+    for file_path in root_path.rglob('*'):
+        if STEP_FILE_PATTERN.match(file_path.name) is not None:
+            trace_folder_set.add(file_path.parent)
+    return sorted(trace_folder_set)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert the trace folders into single-file trace containers')
+    parser.add_argument('root', help='e.g. assets/Trace or assets/GPT_Trace')
+    parser.add_argument('--output', help='folder of the containers, next to the trace folders by default')
+    args = parser.parse_args()
+    root_path = Path(args.root)
+    total_raw_size, total_container_size = 0, 0
+    for trace_folder_path in find_trace_folder_list(root_path):
+        relative_name = '_'.join(trace_folder_path.relative_to(root_path).parts) or trace_folder_path.name
+        if args.output is not None:
+            output_path = Path(args.output)
+            output_path.mkdir(parents=True, exist_ok=True)
+            container_path = output_path / f'{relative_name}.itrace'
+        else:
+            container_path = trace_folder_path.with_suffix('.itrace')
+        raw_size, container_size = convert_trace_folder(trace_folder_path, container_path)
+        total_raw_size += raw_size
+        total_container_size += container_size
+        print(f'{trace_folder_path} -> {container_path}: {raw_size} -> {container_size} bytes')
+    print(f'total: {total_raw_size} -> {total_container_size} bytes')
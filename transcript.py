@@ -0,0 +1,91 @@
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+
+# Append-only JSONL log of the LLM conversations, one record per request with the messages added to the conversation
+# since its previous record, e.g. {"conversation": 0, "turn": 2, "messages": [...]}
+class TranscriptWriter:
+    # the conversations still growing, the older ones are written out and forgotten
+    MAX_OPEN_CONVERSATION_COUNT = 64
+
+    # the forgotten conversations that are continued when their messages are recorded again
+    MAX_CLOSED_CONVERSATION_COUNT = 4096
+
+    def __init__(self, transcript_path: Path):
+        self.transcript_path = transcript_path
+        self.file = open(transcript_path, mode='w', encoding='utf-8')
+        self.conversation_count = 0
+        # id(messages) -> [messages, conversation id, turn, written message count], the messages are referenced so
+        # that their id is not reused while they are open
+        self.open_conversation_dict = OrderedDict()
+        # id(messages) -> [conversation id, turn, written message count, digest of the written messages]
+        self.closed_conversation_dict = OrderedDict()
+
+    @staticmethod
+    def get_digest(messages):
+        return hashlib.sha1(json.dumps(messages, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def record(self, messages):
+        key = id(messages)
+        if key in self.open_conversation_dict:
+            self.open_conversation_dict.move_to_end(key)
+        else:
+            self.open_conversation_dict[key] = self.reopen_conversation(messages)
+            if len(self.open_conversation_dict) > self.MAX_OPEN_CONVERSATION_COUNT:
+                self.close_conversation(*self.open_conversation_dict.popitem(last=False))
+        self.write_pending(self.open_conversation_dict[key])
+        self.file.flush()
+
+    def reopen_conversation(self, messages):
+        closed_conversation = self.closed_conversation_dict.pop(id(messages), None)
+        # the id of a freed list is reused by another one, the written messages tell them apart
+        if closed_conversation is not None:
+            conversation_id, turn, written_count, digest = closed_conversation
+            if len(messages) >= written_count and self.get_digest(messages[:written_count]) == digest:
+                return [messages, conversation_id, turn, written_count]
+        self.conversation_count += 1
+        return [messages, self.conversation_count - 1, 0, 0]
+
+    def close_conversation(self, key, conversation):
+        self.write_pending(conversation)
+        messages, conversation_id, turn, written_count = conversation
+        self.closed_conversation_dict[key] = [conversation_id, turn, written_count, self.get_digest(messages)]
+        if len(self.closed_conversation_dict) > self.MAX_CLOSED_CONVERSATION_COUNT:
+            self.closed_conversation_dict.popitem(last=False)
+
+    def write_pending(self, conversation):
+        messages, conversation_id, turn, written_count = conversation
+        if len(messages) == written_count:
+            return
+        record = {'conversation': conversation_id, 'turn': turn, 'messages': messages[written_count:]}
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        conversation[2] = turn + 1
+        conversation[3] = len(messages)
+
+    def close(self):
+        # the messages appended after the last request of a conversation
+        for conversation in self.open_conversation_dict.values():
+            self.write_pending(conversation)
+        self.open_conversation_dict.clear()
+        self.closed_conversation_dict.clear()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_transcript(transcript_path: Path):
+    # rebuild the full conversations, in the order they were started
+    conversation_dict = {}
+    with open(transcript_path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip() == '':
+                continue
+            record = json.loads(line)
+            conversation_dict.setdefault(record['conversation'], []).extend(record['messages'])
+    return [conversation_dict[conversation_id] for conversation_id in sorted(conversation_dict)]
@@ -0,0 +1,45 @@
+import hashlib
+import time
+
+from threshold import UI_IDLE_QUIET_PERIOD, UI_IDLE_POLL_INTERVAL, UI_IDLE_FINGERPRINT
+
+
+# Wait until the GUI screen stays unchanged for a quiet period, instead of sleeping a fixed interval
+class UIIdleWaiter:
+
+    def __init__(self, quiet_period=UI_IDLE_QUIET_PERIOD, poll_interval=UI_IDLE_POLL_INTERVAL,
+                 fingerprint=UI_IDLE_FINGERPRINT):
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self.fingerprint = fingerprint
+        # the time actually spent in all the waits
+        self.total_wait_time = 0.0
+
+    def get_fingerprint(self, driver):
+        # returns (fingerprint, xml), the xml is None if the hierarchy is not fetched
+        if self.fingerprint == 'activity':
+            return driver.current_activity, None
+        xml = str(driver.page_source)
+        return hashlib.md5(xml.encode('utf-8')).hexdigest(), xml
+
+    def wait(self, driver, timeout):
+        # returns (wait time, xml of the idle screen)
+        start_time = time.time()
+        deadline = start_time + timeout
+        fingerprint, xml = self.get_fingerprint(driver)
+        stable_since = time.time()
+        while True:
+            now = time.time()
+            if now - stable_since >= self.quiet_period or now >= deadline:
+                break
+            time.sleep(max(0, min(self.poll_interval, deadline - now)))
+            current_fingerprint, xml = self.get_fingerprint(driver)
+            if current_fingerprint != fingerprint:
+                fingerprint = current_fingerprint
+                stable_since = time.time()
+        wait_time = time.time() - start_time
+        self.total_wait_time += wait_time
+        return wait_time, xml
+
+    def get_total_wait_time(self):
+        return self.total_wait_time
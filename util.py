@@ -1,4 +1,9 @@
+import os
+import re
 import subprocess
+import threading
+
+from omegaconf import OmegaConf
 
 
 def run_cmd(command):
@@ -6,11 +11,26 @@ def run_cmd(command):
     return res.stdout
 
 
-def get_current_package_name():
-    raw_content = run_cmd('adb shell dumpsys activity | findstr "mFocusedActivity"')
-    print(raw_content)
-    try:
-        result = raw_content.strip().split(': ')[1].split(' ')[2].split('/')[0]
-    except:
-        result = ''
-    return result
+def parse_focused_package(raw_content):
+    # e.g. mCurrentFocus=Window{2f3c u0 com.android.browser/com.android.browser.BrowserActivity}
+    # e.g. mFocusedApp=AppWindowToken{8c1 token=Token{3f2 ActivityRecord{a1b u0 com.android.browser/.BrowserActivity t5}}}
+    for pattern in [r'mCurrentFocus=Window\{\S+ u\d+ ([^/\s}]+)/', r'mFocusedApp=.*ActivityRecord\{\S+ u\d+ ([^/\s}]+)/']:
+        match = re.search(pattern, raw_content)
+        if match is not None:
+            return match.group(1)
+    return ''
+
+
+config_dict = {}
+config_lock = threading.Lock()
+
+
+def load_config(config_path):
+    # the yaml files are parsed once per process, and again when they are modified
+    mtime = os.stat(config_path).st_mtime
+    with config_lock:
+        config_entry = config_dict.get(config_path)
+        if config_entry is None or config_entry[0] != mtime:
+            config_entry = (mtime, OmegaConf.load(config_path))
+            config_dict[config_path] = config_entry
+        return config_entry[1]
@@ -0,0 +1,108 @@
+import sys
+
+# xml attribute -> slot of the widget
+ATTRIB_NAME_TO_SLOT = {
+    'class': 'clazz',
+    'resource-id': 'resource_id',
+    'content-desc': 'content_desc',
+    'text': 'text',
+    'clickable': 'clickable',
+    'index': 'index',
+}
+
+# the keys of the widgets captured from the current screen
+SCREEN_WIDGET_KEYS = ('class', 'resource-id', 'content-desc', 'text', 'clickable')
+
+# the keys of the widgets loaded from a recorded xml file
+XML_WIDGET_KEYS = ('class', 'resource-id', 'content-desc', 'text', 'index')
+
+
+# Compact widget record, it can be used like the dict of its keys and is represented like that dict in the prompts
+class Widget:
+    __slots__ = ('keys_', 'clazz', 'resource_id', 'content_desc', 'text', 'clickable', 'index', 'widget_id',
+                 'node_index', 'bounds')
+
+    def __init__(self, keys, clazz='', resource_id='', content_desc='', text='', clickable='', index=-1,
+                 widget_id=-1, node_index=-1, bounds=''):
+        self.keys_ = keys
+        # class and resource-id repeat a lot across the widgets, they are interned
+        self.clazz = sys.intern(clazz)
+        self.resource_id = sys.intern(resource_id)
+        self.content_desc = content_desc
+        self.text = text
+        self.clickable = clickable
+        self.index = index
+        # stable id of the widget, the index of its node in the document order of the hierarchy
+        self.widget_id = widget_id
+        # index of its node in the WidgetTree
+        self.node_index = node_index
+        self.bounds = bounds
+
+    @classmethod
+    def from_attrib(cls, keys, attrib, widget_id=-1, node_index=-1):
+        return cls(keys, attrib.get('class', ''), attrib.get('resource-id', ''), attrib.get('content-desc', ''),
+                   attrib.get('text', ''), attrib.get('clickable', ''), widget_id=widget_id, node_index=node_index,
+                   bounds=attrib.get('bounds', ''))
+
+    def __getitem__(self, key):
+        if key not in self.keys_:
+            raise KeyError(key)
+        return getattr(self, ATTRIB_NAME_TO_SLOT[key])
+
+    def __setitem__(self, key, value):
+        if key not in self.keys_:
+            raise KeyError(key)
+        setattr(self, ATTRIB_NAME_TO_SLOT[key], value)
+
+    def __contains__(self, key):
+        return key in self.keys_
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.keys_ else default
+
+    def keys(self):
+        return self.keys_
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys_]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return '{' + ', '.join(f'{key!r}: {self[key]!r}' for key in self.keys_) + '}'
+
+
+# Parent and child relationship of the nodes of a hierarchy, stored as index arrays in the document order
+class WidgetTree:
+    __slots__ = ('node_class_list', 'node_clickable_list', 'parent_index_list', 'child_index_list_list')
+
+    def __init__(self):
+        self.node_class_list = []
+        self.node_clickable_list = []
+        # -1 for the root
+        self.parent_index_list = []
+        self.child_index_list_list = []
+
+    def add_node(self, attrib, parent_index):
+        node_index = len(self.node_class_list)
+        self.node_class_list.append(sys.intern(attrib.get('class', '')))
+        self.node_clickable_list.append(attrib.get('clickable', '') == 'true')
+        self.parent_index_list.append(parent_index)
+        self.child_index_list_list.append([])
+        if parent_index != -1:
+            self.child_index_list_list[parent_index].append(node_index)
+        return node_index
+
+    def get_parent_index(self, node_index):
+        return self.parent_index_list[node_index] if node_index != -1 else -1
+
+    def get_node_class(self, node_index):
+        return self.node_class_list[node_index] if node_index != -1 else ''
+
+    def is_leaf(self, node_index):
+        return len(self.child_index_list_list[node_index]) == 0
+
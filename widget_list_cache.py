@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from widget import Widget
+
+# the index of the parsed xml files of a trace folder, stored in the folder
+SIDECAR_NAME = 'widget_list_index.json'
+
+# the slots of a widget stored in the sidecar, in the order of the arguments of Widget
+WIDGET_SLOT_LIST = ['clazz', 'resource_id', 'content_desc', 'text', 'clickable', 'index', 'widget_id', 'node_index',
+                    'bounds']
+
+
+def hash_file(file_path):
+    with open(file_path, mode='rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def encode_widget_list(widget_list):
+    if len(widget_list) == 0:
+        return {'keys': [], 'widgets': []}
+    return {'keys': list(widget_list[0].keys()),
+            'widgets': [[getattr(widget, slot) for slot in WIDGET_SLOT_LIST] for widget in widget_list]}
+
+
+def decode_widget_list(value):
+    keys = tuple(value['keys'])
+    return [Widget(keys, *slot_value_list) for slot_value_list in value['widgets']]
+
+
+# value name -> (encode, decode) of the values that are not plain json
+VALUE_CODEC_DICT = {
+    'widget_list': (encode_widget_list, decode_widget_list),
+}
+
+
+# The values extracted from the recorded xml files, e.g. the widget list, kept for the whole process in an LRU and in a
+# sidecar index of every trace folder. An xml file is known by its path, an entry of the index stays valid while the
+# file keeps its mtime and size or, if they changed, its content hash
+class WidgetListCache:
+
+    def __init__(self, max_entry_count=4096, max_sidecar_count=64):
+        self.max_entry_count = max_entry_count
+        self.max_sidecar_count = max_sidecar_count
+        self.lock = threading.Lock()
+        # xml path -> {stamp, values:{name:value}}, the least recently used first
+        self.entry_dict = OrderedDict()
+        # folder -> {file name:{stamp, hash, values:{name:encoded value}}}, the least recently used first, an evicted
+        # sidecar is stored first if it changed
+        self.sidecar_dict = OrderedDict()
+        self.dirty_folder_set = set()
+        self.hit_count = 0
+        self.sidecar_hit_count = 0
+        self.miss_count = 0
+
+    def get_sidecar(self, folder_path: Path):
+        key = str(folder_path)
+        if key not in self.sidecar_dict:
+            self.sidecar_dict[key] = {}
+            sidecar_path = folder_path / SIDECAR_NAME
+            if sidecar_path.exists():
+                try:
+                    with open(sidecar_path, mode='r', encoding='utf-8') as f:
+                        self.sidecar_dict[key] = json.load(f)
+                except (OSError, ValueError):
+                    print(f'ignore the broken widget list index {sidecar_path}')
+            while len(self.sidecar_dict) > self.max_sidecar_count:
+                self.evict_sidecar(next(iter(self.sidecar_dict)))
+        self.sidecar_dict.move_to_end(key)
+        return self.sidecar_dict[key]
+
+    def get_record(self, xml_path: Path, stamp):
+        # the sidecar record of the file, a record of another content is replaced
+        sidecar = self.get_sidecar(xml_path.parent)
+        record = sidecar.get(xml_path.name)
+        if record is not None and record['stamp'] == stamp:
+            return record
+        file_hash = hash_file(xml_path)
+        if record is None or record['hash'] != file_hash:
+            record = {'stamp': stamp, 'hash': file_hash, 'values': {}}
+        record['stamp'] = stamp
+        sidecar[xml_path.name] = record
+        self.dirty_folder_set.add(str(xml_path.parent))
+        return record
+
+    def add_record_value(self, xml_path: Path, record, name, encoded_value):
+        # the sidecar may have been evicted while the file was parsed, the record is put back into the current one
+        sidecar = self.get_sidecar(xml_path.parent)
+        current_record = sidecar.get(xml_path.name)
+        if current_record is None or current_record['hash'] != record['hash']:
+            current_record = record
+            sidecar[xml_path.name] = record
+        current_record['values'][name] = encoded_value
+        self.dirty_folder_set.add(str(xml_path.parent))
+
+    def get(self, xml_path, name, load, use_sidecar=True):
+        # the value of the xml file, load(xml_path) is only called if it is neither in memory nor in the sidecar
+        xml_path = Path(xml_path).resolve()
+        key = str(xml_path)
+        stat = xml_path.stat()
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        encode, decode = VALUE_CODEC_DICT.get(name, (lambda x: x, lambda x: x))
+        with self.lock:
+            entry = self.entry_dict.get(key)
+            if entry is not None and entry['stamp'] == stamp and name in entry['values']:
+                self.entry_dict.move_to_end(key)
+                self.hit_count += 1
+                return entry['values'][name]
+            # only the sidecar needs the content hash
+            record = self.get_record(xml_path, stamp) if use_sidecar else None
+            encoded_value = record['values'].get(name) if record is not None else None
+        if encoded_value is not None:
+            value = decode(encoded_value)
+            is_sidecar_hit = True
+        else:
+            # parsed without the lock, the same file may rarely be parsed twice at the same time
+            value = load(xml_path)
+            is_sidecar_hit = False
+        with self.lock:
+            if is_sidecar_hit:
+                self.sidecar_hit_count += 1
+            else:
+                self.miss_count += 1
+                if use_sidecar:
+                    self.add_record_value(xml_path, record, name, encode(value))
+            entry = self.entry_dict.get(key)
+            if entry is None or entry['stamp'] != stamp:
+                entry = {'stamp': stamp, 'values': {}}
+                self.entry_dict[key] = entry
+            entry['values'][name] = value
+            self.entry_dict.move_to_end(key)
+            while len(self.entry_dict) > self.max_entry_count:
+                self.entry_dict.popitem(last=False)
+        return value
+
+    def store_sidecar(self, folder):
+        self.dirty_folder_set.discard(folder)
+        sidecar_path = Path(folder) / SIDECAR_NAME
+        if not sidecar_path.parent.exists():
+            return
+        # write to a temporary file first, an interrupted write should not corrupt the index
+        temp_path = sidecar_path.with_suffix('.tmp')
+        with open(temp_path, mode='w', encoding='utf-8') as f:
+            json.dump(self.sidecar_dict[folder], f)
+        temp_path.replace(sidecar_path)
+
+    def evict_sidecar(self, folder):
+        if folder in self.dirty_folder_set:
+            self.store_sidecar(folder)
+        del self.sidecar_dict[folder]
+
+    def flush(self):
+        # store the changed sidecars, they are loaded again when needed
+        with self.lock:
+            for folder in list(self.sidecar_dict):
+                self.evict_sidecar(folder)
+
+    def get_stats(self):
+        with self.lock:
+            return {'hit': self.hit_count, 'sidecar_hit': self.sidecar_hit_count, 'miss': self.miss_count}
+
+
+widget_list_cache = WidgetListCache()
+
+
+def get_widget_list_cache():
+    # one cache is shared by the whole process, e.g. by the oracle migrations of all the target apps
+    return widget_list_cache
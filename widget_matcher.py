@@ -0,0 +1,145 @@
+import re
+
+import numpy as np
+
+# the classes that play the same role across apps
+CLASS_GROUP_LIST = [
+    ['android.widget.Button', 'android.widget.ImageButton', 'android.widget.ImageView'],
+    ['android.widget.TextView', 'android.widget.CheckedTextView'],
+    ['android.widget.EditText', 'android.widget.AutoCompleteTextView', 'android.widget.MultiAutoCompleteTextView'],
+    ['android.widget.CheckBox', 'android.widget.Switch', 'android.widget.ToggleButton', 'android.widget.RadioButton'],
+]
+
+# weight of each feature in the score, the features the original element does not have are left out
+FEATURE_WEIGHT_DICT = {
+    'resource-id': 0.35,
+    'text': 0.35,
+    'class': 0.15,
+    'position': 0.15,
+}
+
+
+def tokenize_resource_id(resource_id):
+    # e.g. com.app:id/searchBar_input ---> ['search', 'bar', 'input']
+    suffix = resource_id.split('/')[-1]
+    return [token.lower() for token in re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+', suffix)]
+
+
+def tokenize_text(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+
+def get_class_compatibility(clazz, other_clazz):
+    if clazz == other_clazz:
+        return 1.0
+    for class_group in CLASS_GROUP_LIST:
+        if clazz in class_group and other_clazz in class_group:
+            return 0.5
+    return 0.0
+
+
+def parse_bounds(bounds):
+    # e.g. [0,63][1080,147] ---> (0, 63, 1080, 147), None if there are no bounds
+    coordinate_list = re.findall(r'-?\d+', bounds or '')
+    if len(coordinate_list) != 4:
+        return None
+    return tuple(int(x) for x in coordinate_list)
+
+
+def get_screen_size(widget_list):
+    # the right and bottom edges of the widgets stand for the screen size
+    bounds_list = [parse_bounds(widget.bounds) for widget in widget_list]
+    bounds_list = [bounds for bounds in bounds_list if bounds is not None]
+    if len(bounds_list) == 0:
+        return None
+    return max(max(bounds[2] for bounds in bounds_list), 1), max(max(bounds[3] for bounds in bounds_list), 1)
+
+
+def get_center_array(widget_list):
+    # the centers of the widgets relative to the screen size, nan without bounds
+    center_array = np.full((len(widget_list), 2), np.nan, dtype=np.float32)
+    screen_size = get_screen_size(widget_list)
+    if screen_size is None:
+        return center_array
+    for row, widget in enumerate(widget_list):
+        bounds = parse_bounds(widget.bounds)
+        if bounds is not None:
+            center_array[row] = ((bounds[0] + bounds[2]) / 2 / screen_size[0],
+                                 (bounds[1] + bounds[3]) / 2 / screen_size[1])
+    return center_array
+
+
+def get_jaccard_array(token_list, token_list_list):
+    # the token overlap of one token list with every token list, as multi-hot vectors
+    vocabulary = {}
+    for token in token_list + [token for other_token_list in token_list_list for token in other_token_list]:
+        vocabulary.setdefault(token, len(vocabulary))
+    matrix = np.zeros((len(token_list_list), len(vocabulary)), dtype=np.float32)
+    for row, other_token_list in enumerate(token_list_list):
+        for token in other_token_list:
+            matrix[row, vocabulary[token]] = 1
+    vector = np.zeros(len(vocabulary), dtype=np.float32)
+    for token in token_list:
+        vector[vocabulary[token]] = 1
+    intersection_array = matrix @ vector
+    union_array = matrix.sum(axis=1) + vector.sum() - intersection_array
+    return np.divide(intersection_array, union_array, out=np.zeros_like(intersection_array), where=union_array > 0)
+
+
+def score_widgets(element, new_widget_list, old_center=None, new_center_array=None):
+    # element: {resource-id, content-desc, text, class} of the original element, the score of every new widget is in
+    # [0, 1]
+    feature_array_dict = {}
+    if element.get('resource-id', '') != '':
+        feature_array_dict['resource-id'] = get_jaccard_array(
+            tokenize_resource_id(element['resource-id']),
+            [tokenize_resource_id(widget['resource-id']) for widget in new_widget_list])
+    element_text = f'{element.get("text", "")} {element.get("content-desc", "")}'.strip()
+    if element_text != '':
+        new_text_list = [f'{widget["text"]} {widget["content-desc"]}'.strip() for widget in new_widget_list]
+        text_array = get_jaccard_array(tokenize_text(element_text), [tokenize_text(x) for x in new_text_list])
+        # the same normalized text counts in full even if it has no word, e.g. a symbol
+        exact_array = np.array([' '.join(tokenize_text(x)) == ' '.join(tokenize_text(element_text)) and x != ''
+                                for x in new_text_list], dtype=np.float32)
+        feature_array_dict['text'] = np.maximum(text_array, exact_array)
+    if element.get('class', '') != '':
+        feature_array_dict['class'] = np.array([get_class_compatibility(element['class'], widget['class'])
+                                                for widget in new_widget_list], dtype=np.float32)
+    if old_center is not None and not np.isnan(old_center).any() and new_center_array is not None:
+        distance_array = np.linalg.norm(new_center_array - old_center, axis=1) / np.sqrt(2)
+        feature_array_dict['position'] = np.nan_to_num(1 - distance_array, nan=0.0)
+
+    score_array = np.zeros(len(new_widget_list), dtype=np.float32)
+    weight_sum = sum(FEATURE_WEIGHT_DICT[name] for name in feature_array_dict)
+    if weight_sum == 0:
+        return score_array
+    for name, feature_array in feature_array_dict.items():
+        score_array += FEATURE_WEIGHT_DICT[name] / weight_sum * feature_array
+    return score_array
+
+
+def find_old_widget_index(element, old_widget_list):
+    # the widget of the original element on the original screen, -1 if it is not there
+    for index, widget in enumerate(old_widget_list):
+        if all(widget[key] == element.get(key, '') for key in ['resource-id', 'content-desc', 'text']):
+            return index
+    return -1
+
+
+def match_widget(element, old_widget_list, new_widget_list, threshold, margin):
+    # (index of the new widget, confidence), the index is None if the best match is not clearly above the others
+    if len(new_widget_list) == 0:
+        return None, 0.0
+    old_widget_index = find_old_widget_index(element, old_widget_list)
+    old_center = None
+    if old_widget_index != -1:
+        old_center = get_center_array(old_widget_list)[old_widget_index]
+        if element.get('class', '') == '':
+            element = dict(element, **{'class': old_widget_list[old_widget_index]['class']})
+    score_array = score_widgets(element, new_widget_list, old_center, get_center_array(new_widget_list))
+    order = np.argsort(-score_array)
+    confidence = float(score_array[order[0]])
+    second_score = float(score_array[order[1]]) if len(order) > 1 else 0.0
+    if confidence < threshold or confidence - second_score < margin:
+        return None, confidence
+    return int(order[0]), confidence